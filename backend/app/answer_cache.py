@@ -0,0 +1,155 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Cache configuration
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Minimum cosine similarity of questions
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # Seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# Namespace versions are shared through SQLite so a write in one gunicorn worker invalidates all of them
+ANSWER_CACHE_VERSIONS_PATH = os.getenv("ANSWER_CACHE_VERSIONS_PATH", "answer_cache_versions.db")
+
+
+class AnswerCache:
+    """
+    In-memory semantic cache of /query answers.
+
+    An entry matches a new question when the retrieved vector ids are identical and the
+    question embeddings have cosine similarity at or above `similarity_threshold`.
+    Entries expire after `ttl` seconds, are evicted least-recently-used beyond
+    `max_entries`, and are dropped when their namespace is written to.
+    """
+
+    def __init__(self, similarity_threshold=ANSWER_CACHE_SIMILARITY, ttl=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, versions_path=ANSWER_CACHE_VERSIONS_PATH):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.versions_path = versions_path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._init_versions()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.versions_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_versions(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS namespace_versions (
+                    namespace TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _namespace_version(self, namespace):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT version FROM namespace_versions WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, namespace, embedding, vector_ids):
+        """Return a cached answer for a near-duplicate question with the same retrieved vectors, or None."""
+        version = self._namespace_version(namespace)
+        query = self._normalize(embedding)
+        vector_ids = frozenset(vector_ids)
+        now = time.time()
+
+        with self._lock:
+            best_key, best_similarity = None, self.similarity_threshold
+            for key, entry in list(self.entries.items()):
+                if now - entry['created_at'] > self.ttl:
+                    del self.entries[key]
+                    continue
+                if entry['namespace'] != namespace or entry['vector_ids'] != vector_ids:
+                    continue
+                if entry['version'] != version:
+                    del self.entries[key]
+                    continue
+                similarity = float(np.dot(entry['embedding'], query))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            return self.entries[best_key]['answer']
+
+    def put(self, namespace, embedding, vector_ids, answer):
+        version = self._namespace_version(namespace)
+        with self._lock:
+            self.entries[self._next_key] = {
+                'namespace': namespace,
+                'version': version,
+                'embedding': self._normalize(embedding),
+                'vector_ids': frozenset(vector_ids),
+                'answer': answer,
+                'created_at': time.time()
+            }
+            self._next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, namespace):
+        """Drop cached answers for a namespace in every worker by bumping its version."""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT INTO namespace_versions (namespace, version) VALUES (?, 1)
+                ON CONFLICT(namespace) DO UPDATE SET version = version + 1
+            ''', (namespace,))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            for key in [k for k, entry in self.entries.items() if entry['namespace'] == namespace]:
+                del self.entries[key]
+        logging.debug(f"Invalidated cached answers for namespace {namespace}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+answer_cache = None
+if ANSWER_CACHE_ENABLED:
+    try:
+        answer_cache = AnswerCache()
+    except Exception as e:
+        logging.error(f"Error initializing answer cache, continuing without it: {str(e)}")
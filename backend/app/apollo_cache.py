@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+
+# Apollo search cache configuration
+APOLLO_CACHE_ENABLED = os.getenv("APOLLO_CACHE_ENABLED", "true").lower() == "true"
+APOLLO_CACHE_PATH = os.getenv("APOLLO_CACHE_PATH", "apollo_cache.db")
+APOLLO_CACHE_TTL = int(os.getenv("APOLLO_CACHE_TTL", "21600"))  # Seconds a search result is reused
+
+
+def canonical_payload(value):
+    """
+    Normalize a search payload so equivalent filters compare equal: keys sorted, empty
+    filters dropped, strings trimmed, and list filters lowercased, de-duplicated and sorted
+    (Apollo matches them case-insensitively and in any order).
+    """
+    if isinstance(value, dict):
+        canonical = {}
+        for key in sorted(value):
+            item = canonical_payload(value[key])
+            if item not in (None, "", [], {}):
+                canonical[key] = item
+        return canonical
+    if isinstance(value, (list, tuple)):
+        items = {json.dumps(canonical_payload(item.lower() if isinstance(item, str) else item), sort_keys=True)
+                 for item in value}
+        return [json.loads(item) for item in sorted(items)]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def payload_key(endpoint, payload):
+    canonical = json.dumps(canonical_payload(payload), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{endpoint}:{canonical}".encode('utf-8')).hexdigest()
+
+
+class ApolloSearchCache:
+    """
+    Apollo search responses keyed by endpoint and canonicalized payload, stored in SQLite so
+    every gunicorn worker shares them and they survive worker recycling. Hit, miss and
+    credits-saved counters are stored alongside.
+    """
+
+    def __init__(self, path=APOLLO_CACHE_PATH, ttl=APOLLO_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    credits_used REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS counters (
+                    endpoint TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    credits_saved REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, conn, endpoint, hits=0, misses=0, credits_saved=0):
+        conn.execute('''
+            INSERT INTO counters (endpoint, hits, misses, credits_saved) VALUES (?, ?, ?, ?)
+            ON CONFLICT(endpoint) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses,
+                credits_saved = credits_saved + excluded.credits_saved
+        ''', (endpoint, hits, misses, credits_saved))
+        return conn.execute(
+            "SELECT hits, misses, credits_saved FROM counters WHERE endpoint = ?", (endpoint,)
+        ).fetchone()
+
+    @staticmethod
+    def _cache_info(hit, counters, age_seconds=None, credits_saved=0):
+        hits, misses, total_credits_saved = counters
+        info = {"hit": hit, "hits": hits, "misses": misses, "credits_saved": credits_saved,
+                "total_credits_saved": total_credits_saved}
+        if age_seconds is not None:
+            info["age_seconds"] = round(age_seconds, 1)
+        return info
+
+    def get(self, endpoint, payload):
+        """
+        Return (response, cache_info) for a fresh cached search, or (None, cache_info) on a
+        miss. Either way the endpoint's hit/miss counters are updated.
+        """
+        key = payload_key(endpoint, payload)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response, credits_used, created_at FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+            age = time.time() - row[2] if row else None
+            if row is None or age > self.ttl:
+                counters = self._count(conn, endpoint, misses=1)
+                conn.commit()
+                return None, self._cache_info(False, counters)
+            counters = self._count(conn, endpoint, hits=1, credits_saved=row[1])
+            conn.commit()
+        finally:
+            conn.close()
+        return json.loads(row[0]), self._cache_info(True, counters, age, row[1])
+
+    def put(self, endpoint, payload, response, credits_used=0):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, endpoint, response, credits_used, created_at) VALUES (?, ?, ?, ?, ?)",
+                (payload_key(endpoint, payload), endpoint, json.dumps(response), credits_used or 0, now)
+            )
+            conn.execute("DELETE FROM searches WHERE created_at < ?", (now - self.ttl,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            entries = dict(conn.execute("SELECT endpoint, COUNT(*) FROM searches GROUP BY endpoint").fetchall())
+            counters = conn.execute("SELECT endpoint, hits, misses, credits_saved FROM counters").fetchall()
+        finally:
+            conn.close()
+        return {
+            "enabled": True,
+            "ttl_seconds": self.ttl,
+            "endpoints": {
+                endpoint: {"entries": entries.get(endpoint, 0), "hits": hits, "misses": misses,
+                           "credits_saved": credits_saved}
+                for endpoint, hits, misses, credits_saved in counters
+            }
+        }
+
+
+apollo_cache = None
+if APOLLO_CACHE_ENABLED:
+    try:
+        apollo_cache = ApolloSearchCache()
+    except Exception as e:
+        logging.error(f"Error initializing Apollo search cache, continuing without it: {str(e)}")
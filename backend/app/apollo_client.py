@@ -0,0 +1,365 @@
+import os
+import time
+import sqlite3
+import logging
+from app.http_client import http_client, RETRY_STATUSES
+from app.rate_limit import RateLimiter, AdaptiveBackoff
+
+# Apollo client configuration
+APOLLO_REQUESTS_PER_MINUTE = int(os.getenv("APOLLO_REQUESTS_PER_MINUTE", "50"))  # Assumed until Apollo reports its limit
+APOLLO_QUOTA_PATH = os.getenv("APOLLO_QUOTA_PATH", "apollo_quota.db")
+APOLLO_QUOTA_HEADROOM = float(os.getenv("APOLLO_QUOTA_HEADROOM", "0.9"))  # Share of the per-minute limit we pace to
+APOLLO_QUOTA_LOW = float(os.getenv("APOLLO_QUOTA_LOW", "0.2"))  # Below this share of an hourly or daily quota, stretch the rest
+APOLLO_MAX_QUEUE_WAIT = float(os.getenv("APOLLO_MAX_QUEUE_WAIT", "60"))  # Longest a request waits for a slot
+APOLLO_MAX_RETRIES = int(os.getenv("APOLLO_MAX_RETRIES", "3"))  # Retries after a 429, each through the queue
+APOLLO_BACKOFF_INITIAL = 2.0  # Seconds the queue pauses after a 429 without Retry-After, doubled on each one
+APOLLO_BACKOFF_MAX = 60.0
+APOLLO_QUOTA_PROBE = 300.0  # Apollo doesn't report when a window resets, so a spent one is re-checked this often
+APOLLO_TIMEOUT = 30
+
+# Apollo's names for its quota windows, and their length in seconds
+QUOTA_WINDOWS = {'minute': 60, 'hourly': 3600, '24-hour': 86400}
+# 429s come back to the client so the whole queue backs off, not just one request
+TRANSPORT_RETRY_STATUSES = RETRY_STATUSES - {429}
+
+
+class ApolloQuotaExceeded(Exception):
+    """No Apollo request slot is available within APOLLO_MAX_QUEUE_WAIT."""
+
+    def __init__(self, retry_after):
+        self.retry_after = round(retry_after, 1)
+        super().__init__(f"Apollo rate limit reached, retry in {self.retry_after:.0f}s")
+
+
+def apollo_headers(api_key):
+    return {
+        'Content-Type': 'application/json',
+        'Cache-Control': 'no-cache',
+        'X-Api-Key': api_key,
+        'Accept': 'application/json'
+    }
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_quota(headers, body=None):
+    """
+    Apollo's quota as {window: (limit, remaining)}, read from the x-rate-limit-<window>,
+    x-<window>-usage and x-<window>-requests-left headers, or from the same fields in the
+    body's rate_limit object when the headers don't carry them.
+    """
+    sources = [headers]
+    if isinstance(body, dict) and isinstance(body.get('rate_limit'), dict):
+        sources.append(body['rate_limit'])
+
+    for source in sources:
+        fields = {}
+        for key, value in source.items():
+            key = key.lower().replace('_', '-')
+            fields[key[2:] if key.startswith('x-') else key] = value
+
+        quota = {}
+        for window in QUOTA_WINDOWS:
+            limit = _int(fields.get(f'rate-limit-{window}'))
+            remaining = _int(fields.get(f'{window}-requests-left'))
+            usage = _int(fields.get(f'{window}-usage'))
+            if remaining is None and limit is not None and usage is not None:
+                remaining = limit - usage
+            if limit is not None and remaining is not None:
+                quota[window] = (limit, max(0, remaining))
+        if quota:
+            return quota
+    return {}
+
+
+def _retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get('retry-after') or 0))
+    except ValueError:
+        return 0.0
+
+
+class ApolloQuota:
+    """
+    Apollo quota readings and one request schedule, shared by every gunicorn worker and
+    thread through SQLite. Requests take evenly spaced slots sized to stay just under the
+    per-minute limit; the spacing stretches when an hourly or daily quota runs low, and the
+    schedule pauses after a 429. Readings come from Apollo's responses, so they cover the
+    whole account rather than this host alone.
+    """
+
+    def __init__(self, path=APOLLO_QUOTA_PATH, requests_per_minute=APOLLO_REQUESTS_PER_MINUTE,
+                 headroom=APOLLO_QUOTA_HEADROOM, low_quota=APOLLO_QUOTA_LOW, max_wait=APOLLO_MAX_QUEUE_WAIT):
+        self.path = path
+        self.requests_per_minute = requests_per_minute
+        self.headroom = headroom
+        self.low_quota = low_quota
+        self.max_wait = max_wait
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS quota (
+                    name TEXT PRIMARY KEY,
+                    quota_limit INTEGER NOT NULL,
+                    remaining INTEGER NOT NULL,
+                    observed_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pacer (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    next_slot REAL NOT NULL DEFAULT 0,
+                    blocked_until REAL NOT NULL DEFAULT 0,
+                    backoff REAL NOT NULL DEFAULT 0,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    throttled INTEGER NOT NULL DEFAULT 0,
+                    rejected INTEGER NOT NULL DEFAULT 0,
+                    waited_seconds REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO pacer (id) VALUES (1)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _windows(self, conn, now):
+        """Readings still inside their window: {window: (limit, remaining, observed_at)}."""
+        windows = {}
+        for window, limit, remaining, observed_at in conn.execute(
+                "SELECT name, quota_limit, remaining, observed_at FROM quota"):
+            if window in QUOTA_WINDOWS and now - observed_at < QUOTA_WINDOWS[window]:
+                windows[window] = (limit, remaining, observed_at)
+        return windows
+
+    def _interval(self, windows):
+        """Seconds between request slots."""
+        limit = windows['minute'][0] if 'minute' in windows else self.requests_per_minute
+        interval = 60.0 / max(1.0, limit * self.headroom)
+        for window, (limit, remaining, _) in windows.items():
+            if window != 'minute' and remaining < limit * self.low_quota:
+                # Spread what is left over a whole window rather than run dry early, but keep
+                # the next slot within max_wait so requests slow down instead of all being refused
+                stretched = min(QUOTA_WINDOWS[window] / max(1, remaining), self.max_wait)
+                interval = max(interval, stretched)
+        return interval
+
+    def reserve(self):
+        """
+        Take the next request slot and return how many seconds to wait before sending.
+        Raises ApolloQuotaExceeded when the slot is more than max_wait away.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            windows = self._windows(conn, now)
+            next_slot, blocked_until = conn.execute(
+                "SELECT next_slot, blocked_until FROM pacer WHERE id = 1"
+            ).fetchone()
+            start = max(now, next_slot, blocked_until)
+            spent = [window for window, (_, remaining, _) in windows.items() if remaining <= 0]
+            for window in spent:
+                # One request goes out per probe period to see whether the window has reset
+                start = max(start, windows[window][2] + min(QUOTA_WINDOWS[window], APOLLO_QUOTA_PROBE))
+
+            if start - now > self.max_wait:
+                conn.execute("UPDATE pacer SET rejected = rejected + 1 WHERE id = 1")
+                conn.commit()
+                raise ApolloQuotaExceeded(start - now)
+
+            conn.execute(
+                "UPDATE pacer SET next_slot = ?, requests = requests + 1, waited_seconds = waited_seconds + ? WHERE id = 1",
+                (start + self._interval(windows), start - now)
+            )
+            # Count the request against every window until Apollo's next reading replaces it
+            conn.execute("UPDATE quota SET remaining = MAX(0, remaining - 1)")
+            conn.executemany("UPDATE quota SET observed_at = ? WHERE name = ?", [(start, window) for window in spent])
+            conn.commit()
+        finally:
+            conn.close()
+        return start - now
+
+    def observe(self, quota):
+        """Record the {window: (limit, remaining)} reading from an Apollo response."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO quota (name, quota_limit, remaining, observed_at) VALUES (?, ?, ?, ?)",
+                [(window, limit, remaining, now) for window, (limit, remaining) in quota.items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def throttled(self, retry_after=0.0):
+        """Pause the whole schedule after a 429, for Retry-After or a doubling backoff."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            backoff = conn.execute("SELECT backoff FROM pacer WHERE id = 1").fetchone()[0]
+            backoff = min(APOLLO_BACKOFF_MAX, max(APOLLO_BACKOFF_INITIAL, backoff * 2))
+            conn.execute(
+                "UPDATE pacer SET backoff = ?, blocked_until = MAX(blocked_until, ?), throttled = throttled + 1 WHERE id = 1",
+                (backoff, now + max(retry_after, backoff))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def succeeded(self):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE pacer SET backoff = CASE WHEN backoff > ? THEN backoff / 2 ELSE 0 END WHERE id = 1",
+                (APOLLO_BACKOFF_INITIAL,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def state(self):
+        now = time.time()
+        conn = self._connect()
+        try:
+            windows = self._windows(conn, now)
+            next_slot, blocked_until, backoff, requests, throttled, rejected, waited = conn.execute(
+                "SELECT next_slot, blocked_until, backoff, requests, throttled, rejected, waited_seconds FROM pacer WHERE id = 1"
+            ).fetchone()
+        finally:
+            conn.close()
+        return {
+            "shared": True,
+            "windows": {
+                window: {
+                    "limit": limit,
+                    "remaining": remaining,
+                    "used": limit - remaining,
+                    "used_pct": round(100.0 * (limit - remaining) / limit, 1) if limit else 0.0,
+                    "age_seconds": round(now - observed_at, 1)
+                }
+                for window, (limit, remaining, observed_at) in windows.items()
+            },
+            "interval_seconds": round(self._interval(windows), 3),
+            "queue_seconds": round(max(0.0, next_slot - now), 1),
+            "paused_seconds": round(max(0.0, blocked_until - now), 1),
+            "backoff_seconds": backoff,
+            "requests": requests,
+            "throttled": throttled,
+            "rejected": rejected,
+            "avg_wait_seconds": round(waited / requests, 3) if requests else 0.0
+        }
+
+
+class ApolloClient:
+    """
+    Apollo API calls paced by the shared quota schedule. A 429 pauses the schedule for
+    every caller and the request is retried through the queue. Without the shared quota
+    (it failed to initialize) requests are paced per worker instead.
+    """
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.limiter = RateLimiter(APOLLO_REQUESTS_PER_MINUTE * APOLLO_QUOTA_HEADROOM)
+        self.backoff = AdaptiveBackoff(APOLLO_BACKOFF_INITIAL, APOLLO_BACKOFF_MAX)
+        self.last_quota = {}
+
+    def _wait_for_slot(self):
+        if self.quota is None:
+            self.backoff.wait()
+            self.limiter.acquire()
+            return
+        delay = self.quota.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _observe(self, response):
+        quota = parse_quota(response.headers)
+        if not quota and response.status_code == 200:
+            try:
+                quota = parse_quota({}, response.json())
+            except ValueError:
+                pass
+        if not quota:
+            return
+        self.last_quota = quota
+        if self.quota is not None:
+            try:
+                self.quota.observe(quota)
+            except Exception as e:
+                logging.error(f"Error recording Apollo quota: {str(e)}")
+
+    def _throttled(self, response):
+        if self.quota is None:
+            self.backoff.throttled()
+        else:
+            self.quota.throttled(_retry_after(response))
+
+    def _succeeded(self):
+        if self.quota is None:
+            self.backoff.succeeded()
+        else:
+            self.quota.succeeded()
+
+    def request(self, method, url, api_key, json=None, timeout=APOLLO_TIMEOUT, idempotent=False):
+        """
+        Send an Apollo request once a slot is free. Raises ApolloQuotaExceeded if none is.
+        5xx responses are not retried, since searches that reveal contact info spend credits;
+        pass idempotent=True for a call that only reads.
+        """
+        for attempt in range(APOLLO_MAX_RETRIES + 1):
+            self._wait_for_slot()
+            response = http_client.request(
+                method, url, json=json, headers=apollo_headers(api_key), timeout=timeout,
+                extensions={"retry_statuses": TRANSPORT_RETRY_STATUSES, "idempotent": idempotent}
+            )
+            self._observe(response)
+            if response.status_code != 429:
+                self._succeeded()
+                return response
+            logging.warning(f"Apollo returned 429 (attempt {attempt + 1}), pausing the request queue")
+            self._throttled(response)
+        return response
+
+    def post(self, url, api_key, payload, timeout=APOLLO_TIMEOUT, idempotent=False):
+        return self.request('POST', url, api_key, json=payload, timeout=timeout, idempotent=idempotent)
+
+    def metrics(self):
+        """Current quota usage and queue state."""
+        if self.quota is not None:
+            try:
+                return self.quota.state()
+            except Exception as e:
+                logging.error(f"Error reading Apollo quota: {str(e)}")
+        return {
+            "shared": False,
+            "windows": {
+                window: {"limit": limit, "remaining": remaining, "used": limit - remaining}
+                for window, (limit, remaining) in self.last_quota.items()
+            },
+            "backoff_seconds": self.backoff.delay
+        }
+
+
+apollo_quota = None
+try:
+    apollo_quota = ApolloQuota()
+except Exception as e:
+    logging.error(f"Error initializing shared Apollo quota, pacing per worker instead: {str(e)}")
+
+# Every Apollo call in this worker goes through this client
+apollo_client = ApolloClient(apollo_quota)
@@ -0,0 +1,185 @@
+import os
+import json
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.apollo_client import apollo_client
+from app.apollo_cache import apollo_cache, payload_key
+
+# Apollo search configuration
+APOLLO_PAGE_CONCURRENCY = int(os.getenv("APOLLO_PAGE_CONCURRENCY", "4"))  # Pages fetched at once per worker
+APOLLO_MAX_PAGES = int(os.getenv("APOLLO_MAX_PAGES", "10"))  # Pages per paginated request
+
+# Endpoint, result key and page size for each search type
+APOLLO_SEARCHES = {
+    'people': ('https://api.apollo.io/api/v1/mixed_people/search', 'contacts', 100),
+    'companies': ('https://api.apollo.io/api/v1/mixed_companies/search', 'organizations', 50),
+}
+PEOPLE_FILTERS = ['person_titles', 'person_seniorities', 'person_locations',
+                  'organization_locations', 'contact_email_status',
+                  'organization_num_employees_ranges', 'q_organization_keyword_tags', 'departments']
+COMPANY_FILTERS = ['q_organization_name', 'organization_locations', 'organization_num_employees_ranges',
+                   'q_organization_keyword_tags', 'currently_using_any_of_technology_uids']
+
+# Shared by every paginated search in this worker; the Apollo client paces the requests
+page_pool = ThreadPoolExecutor(max_workers=APOLLO_PAGE_CONCURRENCY, thread_name_prefix="apollo")
+
+
+class ApolloSearchError(Exception):
+    """Apollo rejected a search request."""
+
+
+def people_payload(data):
+    """Apollo people search payload for the filters in a request, first page."""
+    payload = {
+        'page': 1,
+        'per_page': APOLLO_SEARCHES['people'][2],
+        'reveal_contact_info': True,  # This will use credits but reveal actual contact details
+    }
+    for key in PEOPLE_FILTERS:
+        if data.get(key):  # Only add if not empty
+            payload[key] = data[key]
+    return payload
+
+
+def company_payload(data):
+    """Apollo company search payload for the filters in a request, first page."""
+    payload = {
+        'page': 1,
+        'per_page': APOLLO_SEARCHES['companies'][2],
+        'reveal_contact_info': True,  # Reveal organization contact details
+    }
+    for key in COMPANY_FILTERS:
+        if data.get(key):  # Only add if not empty
+            payload[key] = data[key]
+
+    # Handle revenue range specially
+    revenue_range = data.get('revenue_range') or {}
+    if revenue_range.get('min'):
+        payload['revenue_range[min]'] = revenue_range['min']
+    if revenue_range.get('max'):
+        payload['revenue_range[max]'] = revenue_range['max']
+    return payload
+
+
+def fetch_page(search, payload, page, api_key):
+    """
+    Fetch one page of an Apollo search, from the search cache when possible.
+    Returns {"results", "pagination", "credits_used", "cached"}. Raises ApolloSearchError.
+    """
+    url, result_key, _ = APOLLO_SEARCHES[search]
+    page_payload = {**payload, 'page': page}
+
+    if apollo_cache is not None:
+        try:
+            cached, _ = apollo_cache.get(search, page_payload)
+            if cached is not None:
+                return {"results": cached.get(result_key, []), "pagination": cached.get('pagination', {}),
+                        "credits_used": cached.get('credits_used', 0), "cached": True}
+        except Exception as e:
+            logging.error(f"Error reading Apollo search cache: {str(e)}")
+
+    response = apollo_client.post(url, api_key, page_payload)
+    if response.status_code != 200:
+        try:
+            message = response.json().get('error') or f"Apollo API error: {response.status_code}"
+        except ValueError:
+            message = response.text or f"Apollo API error: {response.status_code}"
+        raise ApolloSearchError(message)
+
+    data = response.json()
+    # Same shape the single-page search routes cache, so both share entries
+    body = {
+        result_key: data.get(result_key, []),
+        f"total_{result_key}": data.get(f"total_{result_key}", 0),
+        "pagination": data.get('pagination', {}),
+        "credits_used": data.get('credits_used', 0)
+    }
+    # Matches without results usually mean a credit or permission problem, so don't keep them
+    if apollo_cache is not None and (body[result_key] or not body['pagination'].get('total_entries')):
+        try:
+            apollo_cache.put(search, page_payload, body, body['credits_used'])
+        except Exception as e:
+            logging.error(f"Error writing Apollo search cache: {str(e)}")
+    return {"results": body[result_key], "pagination": body['pagination'],
+            "credits_used": body['credits_used'], "cached": False}
+
+
+def encode_cursor(search, payload, next_page):
+    """Opaque resume token: the next page to fetch, tied to the search's filters."""
+    state = {"search": search, "filters": payload_key(search, {**payload, 'page': None}), "page": next_page}
+    return base64.urlsafe_b64encode(json.dumps(state).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, search, payload):
+    """Return the page a cursor resumes from. Raises ValueError if it belongs to another search."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if state.get('search') != search or state.get('filters') != payload_key(search, {**payload, 'page': None}):
+        raise ValueError("Cursor does not match these search filters")
+    return int(state['page'])
+
+
+def iter_search_pages(search, payload, api_key, start_page=1, max_pages=APOLLO_MAX_PAGES):
+    """
+    Fetch up to `max_pages` pages of a search from `start_page`, concurrently within the
+    Apollo rate limit, and yield one dict per page in page order. Results already seen on
+    an earlier page (by Apollo id) are dropped. The final item has type "done" and carries
+    the cursor for the next page; a failed page ends the stream with an "error" item.
+    """
+    seen = set()
+
+    def page_item(page, fetched):
+        unique = []
+        for result in fetched['results']:
+            result_id = result.get('id')
+            if result_id is None:
+                unique.append(result)  # Nothing to dedupe an id-less result on
+            elif result_id not in seen:
+                seen.add(result_id)
+                unique.append(result)
+        return {"type": "page", "page": page, "results": unique,
+                "duplicates": len(fetched['results']) - len(unique),
+                "credits_used": fetched['credits_used'], "cached": fetched['cached']}
+
+    # The first page tells us how many pages there are
+    try:
+        first = fetch_page(search, payload, start_page, api_key)
+    except Exception as e:
+        yield {"type": "error", "page": start_page, "error": str(e),
+               "cursor": encode_cursor(search, payload, start_page)}
+        return
+    yield page_item(start_page, first)
+
+    total_pages = first['pagination'].get('total_pages') or start_page
+    last_page = min(total_pages, start_page + max_pages - 1)
+    futures = {page: page_pool.submit(fetch_page, search, payload, page, api_key)
+               for page in range(start_page + 1, last_page + 1)}
+
+    next_page = start_page + 1
+    try:
+        for page in range(start_page + 1, last_page + 1):
+            try:
+                fetched = futures[page].result()
+            except Exception as e:
+                logging.error(f"Apollo {search} search page {page} failed: {str(e)}")
+                yield {"type": "error", "page": page, "error": str(e),
+                       "cursor": encode_cursor(search, payload, page)}
+                return
+            yield page_item(page, fetched)
+            next_page = page + 1
+    finally:
+        # Stop pages that haven't started if the client went away or a page failed
+        for future in futures.values():
+            future.cancel()
+
+    yield {
+        "type": "done",
+        "pages_fetched": next_page - start_page,
+        "total_pages": total_pages,
+        "total_entries": first['pagination'].get('total_entries', 0),
+        "unique_results": len(seen),
+        "cursor": encode_cursor(search, payload, next_page) if next_page <= total_pages else None
+    }
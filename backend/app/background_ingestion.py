@@ -1,9 +1,15 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 import logging
-from app.scraping import extract_text_from_file, chunk_text, get_embedding
+from app.scraping import extract_text_from_file
+from app.chunking import split_paragraphs, iter_chunks
 from app.llm import generate_source_summary
-from app.pinecone_client import store_in_pinecone, index  # Import index from pinecone_client
+from app.pinecone_client import store_in_pinecone, delete_from_pinecone, list_vector_ids, index  # Import index from pinecone_client
+from app.sync_manifest import SyncManifest
 import os
+import time
+import shutil
+import hashlib
+import tempfile
 
 # Define bucket mappings
 url_buckets = {
@@ -29,60 +35,107 @@ class BackgroundIngestion:
         self.supabase = app.supabase
         self.monitored_buckets = list(url_buckets.values()) + list(file_buckets.values())
         self.index = index  # Store reference to Pinecone index
+        self.manifest = SyncManifest()
+        self.namespace = "global_knowledge_base"
+        self.last_run_stats = None
 
-    def get_bucket_contents(self, bucket_name):
-        """Get files and their metadata from a Supabase bucket."""
+    def get_bucket_contents(self, bucket_name, page_size=1000):
+        """Get files and their version metadata from a Supabase bucket."""
         try:
-            files = self.supabase.storage.from_(bucket_name).list()
-            return {
-                file['name']: file.get('metadata', {}).get('last_modified', '')
-                for file in files if 'name' in file
-            }
+            contents = {}
+            offset = 0
+            while True:
+                # Storage listings are paginated (100 objects by default)
+                files = self.supabase.storage.from_(bucket_name).list(
+                    '', {'limit': page_size, 'offset': offset}
+                )
+                for file in files:
+                    if 'name' not in file or file.get('id') is None:
+                        continue  # Folders have no id
+                    metadata = file.get('metadata') or {}
+                    contents[file['name']] = {
+                        'last_modified': metadata.get('lastModified') or file.get('updated_at') or '',
+                        'etag': metadata.get('eTag'),
+                        'size': metadata.get('size')
+                    }
+                if len(files) < page_size:
+                    break
+                offset += page_size
+            return contents
         except Exception as e:
             logging.error(f"Error getting contents of bucket {bucket_name}: {str(e)}")
-            return {}
+            return None
 
-    def get_existing_vectors(self, filename, namespace="global_knowledge_base"):
-        """Check if vectors already exist in Pinecone for this file."""
+    def get_existing_vectors(self, source_id, namespace="global_knowledge_base"):
+        """Return the ids of vectors already stored in Pinecone for this source."""
         try:
-            fetch_response = self.index.fetch(
-                ids=[f"{filename}_*"],
-                namespace=namespace
-            )
-            return bool(fetch_response.vectors)
+            return list_vector_ids(f"{source_id}_chunk_", namespace=namespace)
         except Exception as e:
-            logging.error(f"Error checking Pinecone vectors for {filename}: {str(e)}")
-            return False
+            logging.error(f"Error checking Pinecone vectors for {source_id}: {str(e)}")
+            return []
 
     def get_existing_summary(self, source_id):
-        """Check if summary already exists for this file."""
+        """Return the id of the summary already stored for this file, if any."""
         try:
             response = self.supabase.table('source_summaries')\
-                .select('*')\
+                .select('id')\
                 .eq('source_id', source_id)\
                 .execute()
-            return bool(response.data)
+            return response.data[0]['id'] if response.data else None
         except Exception as e:
             logging.error(f"Error checking summary for {source_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def is_unchanged(entry, file_info):
+        """Compare the listed object version with the version recorded in the manifest."""
+        if entry is None:
             return False
+        if file_info.get('etag') and entry.get('etag'):
+            return file_info['etag'] == entry['etag'] and file_info.get('size') == entry.get('size')
+        return bool(file_info.get('last_modified')) and file_info['last_modified'] == entry.get('last_modified')
 
-    def process_file(self, bucket_name, filename, file_info):
-        """Process a single file if it hasn't been processed before."""
-        temp_path = f"/tmp/{filename}"
-        try:
-            # Check if this file is already processed in both Pinecone and summaries
-            vectors_exist = self.get_existing_vectors(filename)
-            summary_exists = self.get_existing_summary(filename)
-            
-            if vectors_exist and summary_exists:
-                logging.info(f"File {filename} already fully processed. Skipping.")
-                return True
+    def adopt_existing(self, bucket_name, filename, file_info):
+        """
+        Record a file processed before the manifest existed, so it isn't re-ingested.
+        Files ingested before source ids included the bucket are stored under the bare
+        filename; those are adopted as they are unless another bucket's file already has them.
+        Returns True if both vectors and a summary were found.
+        """
+        source_id = SyncManifest.source_id(bucket_name, filename)
+        vector_ids = self.get_existing_vectors(source_id, namespace=self.namespace)
+        summary_id = self.get_existing_summary(source_id)
+        if not vector_ids and not self.manifest.buckets_with(filename):
+            vector_ids = self.get_existing_vectors(filename, namespace=self.namespace)
+            summary_id = self.get_existing_summary(filename)
+        if not vector_ids or summary_id is None:
+            return False
+
+        self.manifest.record(bucket_name, filename, vector_ids=vector_ids, summary_id=summary_id, **file_info)
+        logging.info(f"File {filename} already fully processed. Recorded in manifest.")
+        return True
 
+    def process_file(self, bucket_name, filename, file_info, entry=None):
+        """
+        Ingest a new or changed file and record it in the manifest.
+        Returns 'processed', 'skipped' (content unchanged) or 'failed'.
+        """
+        source_id = SyncManifest.source_id(bucket_name, filename)
+        temp_dir = tempfile.mkdtemp()
+        temp_path = os.path.join(temp_dir, filename)
+        try:
             # Download and process file
+            file_data = self.supabase.storage.from_(bucket_name).download(filename)
+            content_hash = hashlib.sha256(file_data).hexdigest()
             with open(temp_path, 'wb') as f:
-                file_data = self.supabase.storage.from_(bucket_name).download(filename)
                 f.write(file_data)
 
+            # Metadata changed but the bytes didn't: just refresh the manifest entry
+            if entry and entry.get('content_hash') == content_hash:
+                self.manifest.record(bucket_name, filename, content_hash=content_hash,
+                                     vector_ids=entry['vector_ids'], summary_id=entry['summary_id'], **file_info)
+                return 'skipped'
+
             file_extension = filename.split('.')[-1].lower()
             category = next(
                 (k for k, v in {**url_buckets, **file_buckets}.items() 
@@ -94,55 +147,108 @@ class BackgroundIngestion:
             text = extract_text_from_file(temp_path, file_extension)
             if not text:
                 logging.error(f"Could not extract text from {filename}")
-                return False
-
-            # Generate and store summary if needed
-            if not summary_exists:
-                logging.info(f"Generating summary for {filename}")
-                summary = generate_source_summary(text, category)
-                if summary:
-                    self.supabase.table('source_summaries').insert({
-                        'source_id': filename,
+                return 'failed'
+
+            # Generate and store (or refresh) the summary
+            summary_id = (entry or {}).get('summary_id') or self.get_existing_summary(source_id)
+            logging.info(f"Generating summary for {filename}")
+            summary = generate_source_summary(text, category)
+            if summary:
+                if summary_id is not None:
+                    self.supabase.table('source_summaries')\
+                        .update({'source_id': source_id, 'summary': summary, 'category': category})\
+                        .eq('id', summary_id)\
+                        .execute()
+                else:
+                    response = self.supabase.table('source_summaries').insert({
+                        'source_id': source_id,
                         'category': category,
                         'summary': summary
                     }).execute()
-                    logging.info(f"Generated and stored summary for {filename}")
+                    summary_id = response.data[0]['id'] if response.data else None
+                logging.info(f"Generated and stored summary for {filename}")
 
-            # Process for Pinecone if needed
-            if not vectors_exist:
-                logging.info(f"Processing vectors for {filename}")
-                chunks = chunk_text(text)
-                store_in_pinecone(filename, chunks, namespace="global_knowledge_base")
-                logging.info(f"Processed and stored vectors for {filename}")
+            # Store vectors, then remove any left over from a longer previous version
+            logging.info(f"Processing vectors for {filename}")
+            chunks = list(iter_chunks(split_paragraphs(text)))
+            vector_ids = store_in_pinecone(source_id, chunks, namespace=self.namespace)
+            if not vector_ids:
+                logging.error(f"No vectors stored for {filename}")
+                return 'failed'
+            # Adopted vectors stored under the bare filename are replaced here too
+            previous_ids = entry['vector_ids'] if entry else self.get_existing_vectors(source_id, self.namespace)
+            delete_from_pinecone(sorted(set(previous_ids) - set(vector_ids)), namespace=self.namespace)
+            logging.info(f"Processed and stored vectors for {filename}")
 
-            return True
+            self.manifest.record(bucket_name, filename, content_hash=content_hash,
+                                 vector_ids=vector_ids, summary_id=summary_id, **file_info)
+            return 'processed'
 
         except Exception as e:
             logging.error(f"Failed to process {filename}: {str(e)}")
-            return False
+            return 'failed'
         finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def remove_deleted_file(self, bucket_name, filename, entry):
+        """Delete the vectors of a file that is no longer in its bucket."""
+        try:
+            delete_from_pinecone(entry['vector_ids'], namespace=self.namespace)
+            self.manifest.remove(bucket_name, filename)
+            logging.info(f"Removed vectors for deleted file {filename} from {bucket_name}")
+            return True
+        except Exception as e:
+            logging.error(f"Error removing vectors for deleted file {filename}: {str(e)}")
+            return False
 
     def check_and_process_buckets(self):
-        """Check all monitored buckets and process new or updated files."""
+        """Sync all monitored buckets, processing only new or changed files."""
+        started_at = time.time()
+        stats = {'skipped': 0, 'processed': 0, 'failed': 0, 'deleted': 0}
         with self.app.app_context():
             try:
                 for bucket_name in self.monitored_buckets:
                     logging.info(f"Checking bucket: {bucket_name}")
                     current_files = self.get_bucket_contents(bucket_name)
+                    if current_files is None:
+                        continue  # Listing failed; don't treat every file as deleted
+                    known_files = self.manifest.entries(bucket_name)
                     
-                    for filename, metadata in current_files.items():
+                    for filename, file_info in current_files.items():
                         try:
+                            entry = known_files.get(filename)
+                            if self.is_unchanged(entry, file_info):
+                                stats['skipped'] += 1
+                                continue
+                            if entry is None and self.adopt_existing(bucket_name, filename, file_info):
+                                stats['skipped'] += 1
+                                continue
+
                             logging.info(f"Processing file: {filename}")
-                            self.process_file(bucket_name, filename, {'metadata': {'last_modified': metadata}})
+                            stats[self.process_file(bucket_name, filename, file_info, entry)] += 1
                         except Exception as e:
                             logging.error(f"Error processing {filename} from {bucket_name}: {str(e)}")
+                            stats['failed'] += 1
                             continue
 
+                    for filename in set(known_files) - set(current_files):
+                        if self.remove_deleted_file(bucket_name, filename, known_files[filename]):
+                            stats['deleted'] += 1
+
             except Exception as e:
                 logging.error(f"Error in background ingestion: {str(e)}")
 
+        logging.info(
+            f"Bucket sync finished: {stats['processed']} processed, {stats['skipped']} skipped, "
+            f"{stats['failed']} failed, {stats['deleted']} deleted"
+        )
+        self.last_run_stats = stats
+        try:
+            self.manifest.record_run(started_at, stats)
+        except Exception as e:
+            logging.error(f"Error recording sync run: {str(e)}")
+        return stats
+
     def start(self):
         """Start the background scheduler."""
         self.scheduler.add_job(
@@ -0,0 +1,154 @@
+import os
+import zlib
+import sqlite3
+import hashlib
+import logging
+
+# Chunk store configuration
+# Off by default: while enabled, chunk text lives only here, so CHUNK_STORE_PATH must be on a persistent disk
+CHUNK_STORE_ENABLED = os.getenv("CHUNK_STORE_ENABLED", "false").lower() == "true"
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "chunk_store.db")
+SQLITE_MAX_VARIABLES = 900  # Stay under SQLite's bound-parameter limit in IN (...) queries
+
+
+class ChunkStore:
+    """
+    Chunk text keyed by vector id, so Pinecone only carries ids and small metadata.
+    Texts are zlib-compressed and stored once per distinct content (sha256), which also
+    lets chunks be re-written without re-upserting their vectors.
+    """
+
+    def __init__(self, path=CHUNK_STORE_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    namespace TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (namespace, vector_id)
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def put_many(self, namespace, items):
+        """Store (vector_id, text) pairs, replacing the text of ids already stored."""
+        rows = []
+        blobs = {}
+        for vector_id, text in items:
+            data = text.encode('utf-8')
+            content_hash = hashlib.sha256(data).hexdigest()
+            blobs.setdefault(content_hash, data)
+            rows.append((namespace, vector_id, content_hash))
+
+        conn = self._connect()
+        try:
+            replaced = self._hashes(conn, namespace, [vector_id for _, vector_id, _ in rows])
+            # Compress only content we don't already have
+            existing = self._existing_blobs(conn, list(blobs))
+            conn.executemany(
+                "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+                [(content_hash, zlib.compress(data)) for content_hash, data in blobs.items()
+                 if content_hash not in existing]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (namespace, vector_id, hash) VALUES (?, ?, ?)", rows
+            )
+            self._collect_garbage(conn, replaced - set(blobs))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_many(self, namespace, vector_ids):
+        """Return {vector_id: text} for the ids that are stored."""
+        texts = {}
+        conn = self._connect()
+        try:
+            for i in range(0, len(vector_ids), SQLITE_MAX_VARIABLES):
+                batch = vector_ids[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(f'''
+                    SELECT chunks.vector_id, blobs.data FROM chunks JOIN blobs ON blobs.hash = chunks.hash
+                    WHERE chunks.namespace = ? AND chunks.vector_id IN ({placeholders})
+                ''', (namespace, *batch)).fetchall()
+                for vector_id, data in rows:
+                    texts[vector_id] = zlib.decompress(data).decode('utf-8')
+        finally:
+            conn.close()
+        return texts
+
+    def delete(self, namespace, vector_ids):
+        conn = self._connect()
+        try:
+            hashes = self._hashes(conn, namespace, vector_ids)
+            conn.executemany(
+                "DELETE FROM chunks WHERE namespace = ? AND vector_id = ?",
+                [(namespace, vector_id) for vector_id in vector_ids]
+            )
+            self._collect_garbage(conn, hashes)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _hashes(self, conn, namespace, vector_ids):
+        hashes = set()
+        for i in range(0, len(vector_ids), SQLITE_MAX_VARIABLES):
+            batch = vector_ids[i:i + SQLITE_MAX_VARIABLES]
+            placeholders = ','.join('?' * len(batch))
+            hashes.update(content_hash for (content_hash,) in conn.execute(
+                f"SELECT hash FROM chunks WHERE namespace = ? AND vector_id IN ({placeholders})",
+                (namespace, *batch)
+            ))
+        return hashes
+
+    def _existing_blobs(self, conn, hashes):
+        existing = set()
+        for i in range(0, len(hashes), SQLITE_MAX_VARIABLES):
+            batch = hashes[i:i + SQLITE_MAX_VARIABLES]
+            placeholders = ','.join('?' * len(batch))
+            existing.update(content_hash for (content_hash,) in conn.execute(
+                f"SELECT hash FROM blobs WHERE hash IN ({placeholders})", batch
+            ))
+        return existing
+
+    def _collect_garbage(self, conn, hashes):
+        """Drop blobs that no chunk refers to any more."""
+        conn.executemany(
+            "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM chunks WHERE chunks.hash = blobs.hash)",
+            [(content_hash,) for content_hash in hashes]
+        )
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            blobs, compressed_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        finally:
+            conn.close()
+        return {"enabled": True, "chunks": chunks, "distinct_texts": blobs, "compressed_bytes": compressed_bytes}
+
+
+chunk_store = None
+if CHUNK_STORE_ENABLED:
+    try:
+        chunk_store = ChunkStore()
+    except Exception as e:
+        logging.error(f"Error initializing chunk store, continuing without it: {str(e)}")
@@ -0,0 +1,106 @@
+import re
+import logging
+from app.embeddings import tokenizer
+
+# Chunking configuration
+MAX_TOKENS = 1500  # Set a fixed max tokens per chunk
+OVERLAP_TOKENS = 100
+ALIGN_MIN_FRACTION = 0.5  # Aligned chunks are never cut shorter than this fraction of max_tokens
+
+ALIGN_LEVELS = {None: 0, 'sentence': 1, 'paragraph': 2}
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+
+
+def split_paragraphs(text):
+    """Yield the paragraphs of `text`, each with its trailing blank lines, so they join back to `text`."""
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        yield text[start:match.end()]
+        start = match.end()
+    if start < len(text):
+        yield text[start:]
+
+
+def _boundary_level(text, offset):
+    """How strong a boundary lies just before `offset` in `text`: 2 paragraph, 1 sentence, 0 none."""
+    if offset <= 0:
+        return 0
+    if text.endswith('\n\n', 0, offset):
+        return 2
+    previous = text[offset - 1]
+    if previous == '\n':
+        return 1
+    if previous in '.!?' and (offset == len(text) or text[offset].isspace()):
+        return 1
+    return 0
+
+
+def iter_chunks(pieces, max_tokens=MAX_TOKENS, overlap_tokens=OVERLAP_TOKENS, align=None):
+    """
+    Chunk a stream of text pieces (paragraphs, pages) into windows of at most `max_tokens`
+    tokens, overlapping by `overlap_tokens`.
+
+    Each piece is encoded once and chunk text is sliced from the source rather than
+    decoded, so memory stays proportional to one chunk plus one piece. Yields dicts with
+    the chunk `text`, its `start_char`/`end_char` offsets into the concatenated pieces and
+    its `tokens` count. With `align='sentence'` or `'paragraph'`, chunks end on the last such
+    boundary in the window when there is one in its second half.
+    """
+    if align not in ALIGN_LEVELS:
+        raise ValueError(f"Unsupported chunk alignment: {align}")
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    required_level = ALIGN_LEVELS[align]
+    min_cut = max(overlap_tokens + 1, int(max_tokens * ALIGN_MIN_FRACTION))
+
+    text = ""      # Source text from the first buffered token onwards
+    base = 0       # Offset of `text` in the whole document
+    starts = []    # Document offset of each buffered token
+    levels = []    # Boundary level before each buffered token
+    carried = 0    # Tokens carried over as overlap from the last chunk
+    count = 0
+
+    def on_character(j):
+        # Tokens that split a multi-byte character share its offset; never cut between them
+        while j > 1 and starts[j] == starts[j - 1]:
+            j -= 1
+        return j
+
+    def cut_at():
+        if required_level:
+            for j in range(max_tokens, min_cut - 1, -1):
+                if levels[j] >= required_level:
+                    return on_character(j)
+        return on_character(max_tokens)
+
+    for piece in pieces:
+        if not piece:
+            continue
+        piece_base = base + len(text)
+        text += piece
+        _, offsets = tokenizer.decode_with_offsets(tokenizer.encode(piece))
+        for offset in offsets:
+            start = piece_base + offset
+            starts.append(start)
+            levels.append(_boundary_level(text, start - base))
+
+        while len(starts) > max_tokens:
+            cut = cut_at()
+            start_char, end_char = starts[0], starts[cut]
+            yield {"text": text[start_char - base:end_char - base], "start_char": start_char,
+                   "end_char": end_char, "tokens": cut}
+            count += 1
+
+            keep_from = on_character(cut - overlap_tokens)
+            del starts[:keep_from]
+            del levels[:keep_from]
+            text = text[starts[0] - base:]
+            base = starts[0]
+            carried = overlap_tokens
+
+    # After a full chunk, a buffer holding only the overlap adds nothing new
+    if len(starts) > carried:
+        yield {"text": text, "start_char": base, "end_char": base + len(text), "tokens": len(starts)}
+        count += 1
+
+    logging.debug(f"Total chunks created: {count}")
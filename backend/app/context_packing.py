@@ -0,0 +1,213 @@
+import os
+import re
+import logging
+from app.embeddings import tokenizer
+from app.chunking import split_paragraphs
+
+# Context packing configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))  # Tokens of DocHub text per prompt, about the old 2000-char cap
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, 0.0 = pure diversity
+CONTEXT_PIECE_TOKENS = 200  # Segments are packed in paragraph pieces of at most this many tokens
+MIN_TRUNCATED_TOKENS = 100  # Don't bother adding a truncated piece smaller than this
+CONTEXT_SEPARATOR = "\n\n"
+MAX_OVERLAP_CHARS = 2000  # Longest overlap looked for between chunks without offsets
+
+_CHUNK_ID = re.compile(r'^(?P<source>.*)_chunk_(?P<index>\d+)$')
+
+
+def _source_and_index(match):
+    parsed = _CHUNK_ID.match(match.get('id', ''))
+    if not parsed:
+        return match.get('source_id'), None
+    return match.get('source_id', parsed.group('source')), int(parsed.group('index'))
+
+
+def _text_overlap(left, right):
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_pair(left, right):
+    """Merge `right` into `left` when they are overlapping or adjacent pieces of one source, else None."""
+    if 'start_char' in left and 'start_char' in right:
+        if right['start_char'] > left['end_char']:
+            return None
+        text = left['text'] + right['text'][left['end_char'] - right['start_char']:]
+        return {**left, 'text': text, 'end_char': max(left['end_char'], right['end_char'])}
+    if right['index'] != left['last_index'] + 1:
+        return None
+    overlap = _text_overlap(left['text'], right['text'])
+    return {**left, 'text': left['text'] + right['text'][overlap:]}
+
+
+def merge_adjacent(matches):
+    """
+    Merge matches that are neighbouring chunks of the same source, so their overlapping
+    tokens are sent once, and drop texts already contained in a better-ranked segment.
+    Each merged segment keeps the best score of its parts.
+    """
+    by_source = {}
+    passthrough = []
+    for rank, match in enumerate(matches):
+        source, index = _source_and_index(match)
+        if source is None or index is None:
+            passthrough.append({**match, 'rank': rank})
+            continue
+        by_source.setdefault(source, []).append(
+            {**match, 'rank': rank, 'index': index, 'last_index': index, 'parts': 1}
+        )
+
+    segments = []
+    for parts in by_source.values():
+        parts.sort(key=lambda part: part['index'])
+        current = parts[0]
+        for part in parts[1:]:
+            merged = _merge_pair(current, part)
+            if merged is None:
+                segments.append(current)
+                current = part
+                continue
+            merged.update(
+                score=max(current['score'], part['score']),
+                rank=min(current['rank'], part['rank']),
+                last_index=part['index'],
+                parts=current['parts'] + 1,
+                ids=current.get('ids', [current['id']]) + [part['id']]
+            )
+            current = merged
+        segments.append(current)
+    segments.extend(passthrough)
+
+    unique = []
+    for segment in sorted(segments, key=lambda segment: segment['rank']):
+        if any(segment['text'] in kept['text'] for kept in unique):
+            continue
+        unique.append(segment)
+    return unique
+
+
+def _similarity(tokens_a, tokens_b):
+    """Jaccard similarity of two token sets, a cheap stand-in for embedding similarity."""
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def split_pieces(text, max_tokens=CONTEXT_PIECE_TOKENS):
+    """
+    Split a segment into consecutive pieces of whole paragraphs, at most `max_tokens` each.
+    A paragraph longer than a piece is cut by tokens, topping up the current piece first.
+    Yields (text, tokens), skipping whitespace-only pieces.
+    """
+    current, current_tokens = "", []
+
+    def flush():
+        nonlocal current, current_tokens
+        piece = (current, current_tokens)
+        current, current_tokens = "", []
+        return piece if piece[0].strip() else None
+
+    for paragraph in split_paragraphs(text):
+        tokens = tokenizer.encode(paragraph)
+        if len(current_tokens) + len(tokens) <= max_tokens:
+            current += paragraph
+            current_tokens = current_tokens + tokens
+            continue
+        if len(tokens) <= max_tokens:
+            piece = flush()
+            if piece:
+                yield piece
+            current, current_tokens = paragraph, tokens
+            continue
+        while tokens:
+            room = max_tokens - len(current_tokens)
+            current += tokenizer.decode(tokens[:room])
+            current_tokens = current_tokens + tokens[:room]
+            tokens = tokens[room:]
+            if len(current_tokens) >= max_tokens:
+                piece = flush()
+                if piece:
+                    yield piece
+    piece = flush()
+    if piece:
+        yield piece
+
+
+def pack_context(matches, budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """
+    Pack retrieved matches into at most `budget` tokens of context.
+
+    Overlapping neighbours are merged first and each segment is split into paragraph pieces,
+    so a budget smaller than a chunk still draws on several sources. Pieces are picked
+    greedily by maximal marginal relevance (their segment's score against similarity to what
+    is already picked) while they fit the budget, truncating a pick that only partly fits.
+    Picked pieces are put back together per segment in document order. Returns
+    {"context", "texts", "usage"} where usage reports the token budget and how it was spent.
+    """
+    segments = merge_adjacent(matches)
+    pieces = []
+    candidate_tokens = 0
+    for number, segment in enumerate(segments):
+        for position, (text, tokens) in enumerate(split_pieces(segment['text'])):
+            pieces.append({"segment": number, "position": position, "text": text, "tokens": tokens,
+                           "token_set": set(tokens), "score": segment.get('score') or 0.0})
+            candidate_tokens += len(tokens)
+
+    scores = [piece['score'] for piece in pieces]
+    top_score = max(scores, default=0.0) or 1.0
+    separator_tokens = len(tokenizer.encode(CONTEXT_SEPARATOR))
+
+    selected = []
+
+    def mmr(i):
+        redundancy = max((_similarity(pieces[i]['token_set'], pieces[j]['token_set']) for j in selected),
+                         default=0.0)
+        return mmr_lambda * scores[i] / top_score - (1 - mmr_lambda) * redundancy
+
+    used = 0
+    truncated = False
+    remaining = list(range(len(pieces)))
+    while remaining and budget - used >= MIN_TRUNCATED_TOKENS:
+        best = max(remaining, key=mmr)
+        remaining.remove(best)
+        cost = len(pieces[best]['tokens']) + (separator_tokens if selected else 0)
+        available = budget - used
+        if cost <= available:
+            selected.append(best)
+            used += cost
+        elif available - separator_tokens >= MIN_TRUNCATED_TOKENS:
+            # Keep as much of the piece as fits
+            piece = pieces[best]
+            piece['tokens'] = piece['tokens'][:available - (separator_tokens if selected else 0)]
+            piece['text'] = tokenizer.decode(piece['tokens'])
+            selected.append(best)
+            used = budget
+            truncated = True
+
+    # One text per segment, in the order segments were first picked, pieces in document order
+    texts = []
+    for number in dict.fromkeys(pieces[i]['segment'] for i in selected):
+        picked = sorted((pieces[i] for i in selected if pieces[i]['segment'] == number),
+                        key=lambda piece: piece['position'])
+        text = picked[0]['text']
+        for previous, piece in zip(picked, picked[1:]):
+            text += ("" if piece['position'] == previous['position'] + 1 else CONTEXT_SEPARATOR) + piece['text']
+        texts.append(text)
+
+    usage = {
+        "budget_tokens": budget,
+        "used_tokens": used,
+        "candidates": len(matches),
+        "segments": len(segments),
+        "pieces": len(pieces),
+        "selected": len(selected),
+        "sources": len(texts),
+        "candidate_tokens": candidate_tokens,
+        "truncated": truncated
+    }
+    logging.debug(f"Packed {len(selected)} of {len(pieces)} context pieces from {len(texts)} segments "
+                  f"into {used}/{budget} tokens")
+    return {"context": CONTEXT_SEPARATOR.join(texts), "texts": texts, "usage": usage}
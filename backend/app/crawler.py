@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urldefrag, urlparse
+import httpx
+from bs4 import BeautifulSoup
+from app.http_client import http_client
+
+# Crawler configuration
+CRAWLER_CONCURRENCY = int(os.getenv("CRAWLER_CONCURRENCY", "8"))  # Pages fetched at once per crawl
+CRAWLER_PER_HOST_CONCURRENCY = int(os.getenv("CRAWLER_PER_HOST_CONCURRENCY", "2"))
+CRAWLER_PER_HOST_DELAY = float(os.getenv("CRAWLER_PER_HOST_DELAY", "0.25"))  # Seconds between requests to one host
+CRAWLER_TIMEOUT = float(os.getenv("CRAWLER_TIMEOUT", "5"))
+CRAWLER_MAX_PAGES = int(os.getenv("CRAWLER_MAX_PAGES", "50"))  # Hard cap on pages fetched per crawl
+
+
+class HostPolicy:
+    """Per-host politeness: a concurrency cap plus a minimum delay between request starts."""
+
+    def __init__(self, concurrency, delay):
+        self.slots = threading.Semaphore(concurrency)
+        self.delay = delay
+        self.next_request_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait_turn(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_request_at)
+            self.next_request_at = start_at + self.delay
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+class Crawler:
+    """
+    Breadth-first website crawler with a bounded pool of concurrent fetchers.
+    Fetches through the shared keep-alive client with per-host politeness, and
+    enforces page and chunk budgets across the whole crawl.
+    """
+
+    def __init__(self, max_workers=CRAWLER_CONCURRENCY, per_host_concurrency=CRAWLER_PER_HOST_CONCURRENCY,
+                 per_host_delay=CRAWLER_PER_HOST_DELAY, timeout=CRAWLER_TIMEOUT):
+        self.max_workers = max_workers
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.policies = {}
+        self._lock = threading.Lock()
+
+    def _host_policy(self, host):
+        with self._lock:
+            if host not in self.policies:
+                self.policies[host] = HostPolicy(self.per_host_concurrency, self.per_host_delay)
+            return self.policies[host]
+
+    def fetch(self, url):
+        """Fetch a page and return (final_url, html), or None on failure."""
+        policy = self._host_policy(urlparse(url).netloc)
+        with policy.slots:
+            policy.wait_turn()
+            try:
+                response = http_client.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                return str(response.url), response.text
+            except httpx.HTTPError as e:
+                logging.error(f"Error scraping {url}: {str(e)}")
+                return None
+
+    def _parse(self, url, depth, max_depth, chunker, link_filter, visited):
+        """Fetch and parse one page, returning its chunks and candidate links."""
+        fetched = self.fetch(url)
+        if fetched is None:
+            return None
+        final_url, html = fetched
+
+        soup = BeautifulSoup(html, 'html.parser')
+        page_text = soup.get_text(separator=' ', strip=True)
+
+        links = []
+        if depth < max_depth:
+            base_url = "{0.scheme}://{0.netloc}".format(urlparse(final_url))
+            for link in soup.find_all('a', href=True):
+                link_url = urldefrag(urljoin(final_url, link['href']))[0]
+                if link_filter(link_url, base_url, visited):
+                    links.append(link_url)
+        return chunker(page_text), links
+
+    def crawl(self, start_url, chunker, max_depth=2, max_chunks=10, max_pages=CRAWLER_MAX_PAGES,
+              link_filter=None, visited_urls=None):
+        """
+        Crawl from `start_url` breadth-first up to `max_depth` link hops.
+        `chunker` turns page text into chunks; the crawl stops once `max_chunks` chunks or
+        `max_pages` pages have been collected. Chunks are returned in BFS page order.
+        """
+        if link_filter is None:
+            link_filter = lambda link_url, base_url, visited: urlparse(link_url).netloc == urlparse(base_url).netloc
+        visited = set(visited_urls or ())
+        if start_url in visited:
+            return []
+
+        visited.add(start_url)
+        # Order keys are (depth, parent key, link position) so results sort breadth-first
+        # regardless of which fetch finishes first
+        frontier = deque([((0,), start_url, 0)])  # (order, url, depth)
+        pages = {}
+        chunk_count = 0
+        pages_scheduled = 0
+        in_flight = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while frontier or in_flight:
+                # Keep the pool busy while there is budget left
+                while frontier and len(in_flight) < self.max_workers \
+                        and pages_scheduled < max_pages and chunk_count < max_chunks:
+                    order, url, depth = frontier.popleft()
+                    future = executor.submit(self._parse, url, depth, max_depth, chunker, link_filter, visited)
+                    in_flight[future] = (order, depth)
+                    pages_scheduled += 1
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    order, depth = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f"Error processing page during crawl of {start_url}: {str(e)}")
+                        continue
+                    if result is None:
+                        continue
+
+                    page_chunks, links = result
+                    page_chunks = page_chunks[:max_chunks]
+                    pages[order] = page_chunks
+                    chunk_count += len(page_chunks)
+
+                    for position, link_url in enumerate(links):
+                        if link_url not in visited:
+                            visited.add(link_url)
+                            frontier.append(((depth + 1, order, position), link_url, depth + 1))
+
+                if chunk_count >= max_chunks:
+                    break
+        finally:
+            # Once the budget is reached, don't wait on pages we no longer need
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        logging.debug(f"Crawled {len(pages)} pages from {start_url} for {chunk_count} chunks")
+        chunks = []
+        for order in sorted(pages):
+            chunks.extend(pages[order])
+        return chunks[:max_chunks]
+
+
+crawler = Crawler()
@@ -0,0 +1,279 @@
+import re
+from bisect import bisect_left
+
+# Words, runs of whitespace and single punctuation marks; together they cover every character
+_TOKEN = re.compile(r'\w+|\s+|[^\w\s]')
+_SENTENCE_END = frozenset('.!?')
+
+
+def tokenize(text):
+    """Split text into word, whitespace and punctuation tokens that join back to `text`."""
+    return _TOKEN.findall(text)
+
+
+def _bisect(a, b):
+    """
+    Find the middle of an optimal edit path between sequences `a` and `b` (Myers 1986,
+    linear space): walk forward from the start and backward from the end until the paths
+    meet. Returns the split point (x, y), or None when the sequences share nothing.
+    """
+    n, m = len(a), len(b)
+    max_d = (n + m + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    # With an odd delta the forward path detects the overlap, otherwise the reverse one does
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2  # Ran off the right of the grid
+            elif y1 > m:
+                k1start += 2  # Ran off the bottom of the grid
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                    return x1, y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[n - x2 - 1] == b[m - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    if x1 >= n - x2:
+                        return x1, v_offset + x1 - k1_offset
+    return None
+
+
+def _unique_anchors(a, a0, a1, b, b0, b1):
+    """
+    Patience anchors: tokens occurring exactly once in a[a0:a1] and once in b[b0:b1],
+    reduced to their longest run in the same order on both sides. Returns [(i, j)].
+    """
+    counts = {}
+    for i in range(a0, a1):
+        entry = counts.get(a[i])
+        counts[a[i]] = [i, None, 1, 0] if entry is None else [entry[0], None, entry[2] + 1, 0]
+    for j in range(b0, b1):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] = j
+            entry[3] += 1
+    pairs = sorted((i, j) for i, j, a_count, b_count in counts.values() if a_count == 1 and b_count == 1)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of the b positions, by patience sorting
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile:
+            previous[index] = tail_index[pile - 1]
+        if pile == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pile] = j
+            tail_index[pile] = index
+    anchors = []
+    index = tail_index[-1]
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    return anchors[::-1]
+
+
+def matching_blocks(a, b):
+    """
+    Return (i, j, size) runs where a[i:i+size] == b[j:j+size], in order, between `a` and `b`.
+
+    Ranges are split on patience anchors (tokens unique to both sides) while there are any,
+    and the remaining gaps are diffed with Myers' linear-space bisection, so a long document
+    with scattered edits costs about as much as its edited stretches. Common prefixes and
+    suffixes are trimmed from every range, and ranges are processed from an explicit stack.
+    """
+    blocks = []
+    stack = [('range', (0, len(a), 0, len(b)))]
+    while stack:
+        kind, item = stack.pop()
+        if kind == 'block':
+            blocks.append(item)
+            continue
+        a0, a1, b0, b1 = item
+
+        prefix = 0
+        while a0 + prefix < a1 and b0 + prefix < b1 and a[a0 + prefix] == b[b0 + prefix]:
+            prefix += 1
+        if prefix:
+            blocks.append((a0, b0, prefix))
+            a0 += prefix
+            b0 += prefix
+
+        suffix = 0
+        while a0 < a1 - suffix and b0 < b1 - suffix and a[a1 - suffix - 1] == b[b1 - suffix - 1]:
+            suffix += 1
+        if suffix:
+            # Emitted after everything between prefix and suffix
+            stack.append(('block', (a1 - suffix, b1 - suffix, suffix)))
+            a1 -= suffix
+            b1 -= suffix
+
+        if a0 == a1 or b0 == b1:
+            continue  # Pure insertion or deletion
+
+        anchors = _unique_anchors(a, a0, a1, b, b0, b1)
+        if anchors:
+            # Pushed in reverse so the gaps and anchors are emitted in order
+            end_a, end_b = a1, b1
+            for i, j in reversed(anchors):
+                stack.append(('range', (i + 1, end_a, j + 1, end_b)))
+                stack.append(('block', (i, j, 1)))
+                end_a, end_b = i, j
+            stack.append(('range', (a0, end_a, b0, end_b)))
+            continue
+
+        split = _bisect(a[a0:a1], b[b0:b1])
+        if split is None:
+            continue  # Nothing in common: one replacement
+        x, y = split
+        stack.append(('range', (a0 + x, a1, b0 + y, b1)))
+        stack.append(('range', (a0, a0 + x, b0, b0 + y)))
+    return blocks
+
+
+def _segments(tokens):
+    """Split tokens into sentences and lines: contiguous (start, end) index ranges covering them all."""
+    segments = []
+    start = 0
+    for k, token in enumerate(tokens):
+        if token.isspace() and ('\n' in token or (k and tokens[k - 1] in _SENTENCE_END)):
+            segments.append((start, k + 1))
+            start = k + 1
+    if start < len(tokens):
+        segments.append((start, len(tokens)))
+    return segments
+
+
+def _token_blocks(a, a_tokens, b, b_tokens):
+    """
+    Matching token blocks in two passes: whole sentences and lines first, then word-level
+    matching only inside the stretches of segments that changed.
+    """
+    a_segments, b_segments = _segments(a_tokens), _segments(b_tokens)
+    ids = {}
+    a_keys = [ids.setdefault(tuple(a[start:end]), len(ids)) for start, end in a_segments]
+    b_keys = [ids.setdefault(tuple(b[start:end]), len(ids)) for start, end in b_segments]
+
+    def token_start(segments, k, total):
+        return segments[k][0] if k < len(segments) else total
+
+    blocks = []
+    i = j = 0
+    for si, sj, size in matching_blocks(a_keys, b_keys) + [(len(a_keys), len(b_keys), 0)]:
+        a0, a1 = token_start(a_segments, i, len(a)), token_start(a_segments, si, len(a))
+        b0, b1 = token_start(b_segments, j, len(b)), token_start(b_segments, sj, len(b))
+        if a0 < a1 and b0 < b1:
+            blocks.extend((a0 + x, b0 + y, n) for x, y, n in matching_blocks(a[a0:a1], b[b0:b1]))
+        if size:
+            start_a, start_b = a_segments[si][0], b_segments[sj][0]
+            blocks.append((start_a, start_b, a_segments[si + size - 1][1] - start_a))
+        i, j = si + size, sj + size
+    return blocks
+
+
+def _token_opcodes(blocks, a_length, b_length):
+    """SequenceMatcher-style (tag, i1, i2, j1, j2) opcodes over token indices."""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks + [(a_length, b_length, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(['replace', i, ai, j, bj])
+        elif i < ai:
+            opcodes.append(['delete', i, ai, j, bj])
+        elif j < bj:
+            opcodes.append(['insert', i, ai, j, bj])
+        if size:
+            if opcodes and opcodes[-1][0] == 'equal':
+                opcodes[-1][2], opcodes[-1][4] = ai + size, bj + size
+            else:
+                opcodes.append(['equal', ai, ai + size, bj, bj + size])
+        i, j = ai + size, bj + size
+    return opcodes
+
+
+def _absorb_whitespace(opcodes, tokens):
+    """Merge edits separated only by whitespace into one replacement, so a rewritten phrase is one change."""
+    merged = []
+    for opcode in opcodes:
+        if (opcode[0] != 'equal' and len(merged) >= 2 and merged[-2][0] != 'equal'
+                and merged[-1][0] == 'equal'
+                and all(token.isspace() for token in tokens[merged[-1][1]:merged[-1][2]])):
+            merged.pop()
+            previous = merged[-1]
+            merged[-1] = ['replace', previous[1], opcode[2], previous[3], opcode[4]]
+        else:
+            merged.append(opcode)
+    return merged
+
+
+def _offsets(tokens):
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token))
+    return offsets
+
+
+def diff_opcodes(original, revised, merge_whitespace=True):
+    """
+    Word-level diff of two strings as SequenceMatcher-style opcodes.
+
+    Returns (tag, i1, i2, j1, j2) tuples with tag in 'equal', 'replace', 'delete' and
+    'insert', where original[i1:i2] became revised[j1:j2] as exact character offsets.
+    Edits are whole words, whitespace runs or punctuation marks rather than single
+    characters. With `merge_whitespace`, edits separated only by whitespace are combined.
+    """
+    a_tokens, b_tokens = tokenize(original), tokenize(revised)
+    # Compare small ints rather than strings in the inner loops
+    ids = {}
+    a = [ids.setdefault(token, len(ids)) for token in a_tokens]
+    b = [ids.setdefault(token, len(ids)) for token in b_tokens]
+
+    opcodes = _token_opcodes(_token_blocks(a, a_tokens, b, b_tokens), len(a), len(b))
+    if merge_whitespace:
+        opcodes = _absorb_whitespace(opcodes, a_tokens)
+
+    a_offsets, b_offsets = _offsets(a_tokens), _offsets(b_tokens)
+    return [
+        (tag, a_offsets[i1], a_offsets[i2], b_offsets[j1], b_offsets[j2])
+        for tag, i1, i2, j1, j2 in opcodes
+    ]
@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+# Cache configuration
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies of a chunk share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(model, text):
+    """Content address for an embedding: the model plus a hash of the normalized text."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite.
+    Entries are keyed by (model, sha256(normalized text)) and evicted least-recently-used
+    once the cache grows past `max_entries`.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_many(self, model, texts):
+        """Return cached embeddings for `texts` in order, with None for misses."""
+        keys = [make_cache_key(model, text) for text in texts]
+        found = {}
+        conn = self._connect()
+        try:
+            unique_keys = list(set(keys))
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                conn.commit()
+        finally:
+            conn.close()
+
+        results = [found.get(key) for key in keys]
+        with self._lock:
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def set_many(self, model, texts, embeddings):
+        """Store embeddings for `texts`, skipping failed (None) entries, then enforce the size limit."""
+        now = time.time()
+        rows = [
+            (make_cache_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        ]
+        if not rows:
+            return
+
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)", rows
+            )
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                # Evict down to 90% of capacity so we don't evict on every write
+                excess = count - int(self.max_entries * 0.9)
+                conn.execute('''
+                    DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+                    )
+                ''', (excess,))
+                with self._lock:
+                    self.evictions += excess
+                logging.debug(f"Evicted {excess} entries from embedding cache")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Return hit/miss counters for this process plus the current cache size."""
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+embedding_cache = None
+if EMBEDDING_CACHE_ENABLED:
+    try:
+        embedding_cache = EmbeddingCache()
+    except Exception as e:
+        logging.error(f"Error initializing embedding cache, continuing without it: {str(e)}")
@@ -0,0 +1,119 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import tiktoken
+from app.embedding_cache import embedding_cache
+from app.http_client import create_openai_client
+
+# Load environment variables and initialize the OpenAI client
+load_dotenv()
+client = create_openai_client()
+
+# Tokenizer and embedding model shared by the chunking and embedding code
+tokenizer = tiktoken.get_encoding("cl100k_base")
+MODEL = "text-embedding-3-small"
+
+# Request limits for the embeddings endpoint
+MAX_INPUT_TOKENS = 8191  # Per-input limit for text-embedding-3-small
+MAX_BATCH_INPUTS = 2048  # Maximum number of inputs OpenAI accepts per request
+MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "60000"))  # Tokens packed into one request
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Batches in flight at once
+
+
+def _prepare_input(text):
+    """Return the text and its token count, truncating inputs that exceed the model limit."""
+    tokens = tokenizer.encode(text)
+    if len(tokens) > MAX_INPUT_TOKENS:
+        tokens = tokens[:MAX_INPUT_TOKENS]
+        text = tokenizer.decode(tokens)
+    return text, len(tokens)
+
+
+def _pack_batches(texts, max_batch_tokens=MAX_BATCH_TOKENS, max_batch_inputs=MAX_BATCH_INPUTS):
+    """
+    Group texts into token-bounded batches.
+    Each batch is a list of (position, text) pairs so results can be put back in order.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for position, text in enumerate(texts):
+        if not text or not text.strip():
+            continue  # The API rejects empty inputs
+        text, token_count = _prepare_input(text)
+        if current and (current_tokens + token_count > max_batch_tokens or len(current) >= max_batch_inputs):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append((position, text))
+        current_tokens += token_count
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(batch, model):
+    """Send one batch to the embeddings endpoint and return (position, embedding) pairs."""
+    try:
+        response = client.embeddings.create(input=[text for _, text in batch], model=model)
+        # Results carry the index of the input they belong to
+        return [(batch[item.index][0], item.embedding) for item in response.data]
+    except Exception as e:
+        logging.error(f"Error generating embeddings for batch of {len(batch)} inputs: {str(e)}")
+        return []
+
+
+def get_embeddings(texts, model=MODEL, max_concurrency=EMBEDDING_CONCURRENCY):
+    """
+    Generate embeddings for a list of texts using batched, concurrent requests.
+    Texts already in the embedding cache are not sent to the API.
+    Returns a list in the same order as `texts`; entries that failed are None.
+    """
+    texts = list(texts)
+    if embedding_cache is not None:
+        try:
+            embeddings = embedding_cache.get_many(model, texts)
+        except Exception as e:
+            logging.error(f"Error reading embedding cache: {str(e)}")
+            embeddings = [None] * len(texts)
+    else:
+        embeddings = [None] * len(texts)
+
+    # Only request embeddings for cache misses, and only once per distinct text
+    missing = {}
+    for position, (text, embedding) in enumerate(zip(texts, embeddings)):
+        if embedding is None:
+            missing.setdefault(text, []).append(position)
+    if not missing:
+        return embeddings
+
+    missing_texts = list(missing)
+    fetched = [None] * len(missing_texts)
+    batches = _pack_batches(missing_texts)
+    if batches:
+        logging.debug(f"Embedding {len(missing_texts)} of {len(texts)} texts in {len(batches)} batches")
+        workers = max(1, min(max_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for results in executor.map(lambda batch: _embed_batch(batch, model), batches):
+                for position, embedding in results:
+                    fetched[position] = embedding
+
+    for text, embedding in zip(missing_texts, fetched):
+        for position in missing[text]:
+            embeddings[position] = embedding
+
+    if embedding_cache is not None:
+        try:
+            embedding_cache.set_many(model, missing_texts, fetched)
+        except Exception as e:
+            logging.error(f"Error writing embedding cache: {str(e)}")
+
+    return embeddings
+
+
+def get_embedding(text):
+    """Generate an embedding for a text using OpenAI's model."""
+    return get_embeddings([text])[0]
@@ -1,10 +1,10 @@
 import os
-from supabase import create_client
+from app.http_client import create_supabase_client
 
 # Initialize Supabase client
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_SECRET")
-supabase = create_client(supabase_url, supabase_key)
+supabase = create_supabase_client(supabase_url, supabase_key)
 
 def save_text_to_file(text, filename="file.txt", category="general"):
     # Save text to a temporary file
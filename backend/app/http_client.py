@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+import httpx
+
+# Outbound HTTP configuration, shared by every client in this worker
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))  # Long completions can take minutes to read
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection is kept
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = 0.5  # Seconds before the first retry, doubled on each attempt
+HTTP_BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# The request never reached the server, so retrying can't duplicate it
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+if HTTP2_ENABLED:
+    try:
+        import h2  # noqa: F401 - httpx needs it for HTTP/2
+    except ImportError:
+        logging.warning("HTTP2_ENABLED is set but the h2 package is not installed; using HTTP/1.1")
+        HTTP2_ENABLED = False
+
+
+class HostMetrics:
+    """Per-host request counters and latency for outbound calls from this worker."""
+
+    def __init__(self):
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        return self.hosts.setdefault(host, {
+            "requests": 0, "retries": 0, "errors": 0, "statuses": {}, "total_seconds": 0.0
+        })
+
+    def record(self, host, status, seconds):
+        with self._lock:
+            entry = self._host(host)
+            entry["requests"] += 1
+            entry["total_seconds"] += seconds
+            if status is None:
+                entry["errors"] += 1
+            else:
+                entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+
+    def record_retry(self, host):
+        with self._lock:
+            self._host(host)["retries"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                host: {
+                    **{key: value for key, value in entry.items() if key != "total_seconds"},
+                    "statuses": dict(entry["statuses"]),
+                    "avg_latency_ms": round(1000 * entry["total_seconds"] / entry["requests"], 1)
+                    if entry["requests"] else 0.0
+                }
+                for host, entry in self.hosts.items()
+            }
+
+
+def _retry_delay(attempt, response=None):
+    """Honour Retry-After when the server sends it, otherwise back off exponentially with jitter."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(HTTP_BACKOFF_MAX, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    return min(HTTP_BACKOFF_MAX, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                except (TypeError, ValueError):
+                    pass
+    return min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    Pooled transport that retries 429 responses and connection failures with backoff, and
+    records per-host metrics. 5xx responses are only retried for idempotent methods, or for
+    requests that opt in with the "idempotent" extension (e.g. read-only POST searches), since
+    a retry could repeat a write the server already applied. Failures after the request was
+    sent (read timeouts, dropped connections) are only retried for idempotent methods: the
+    server may still be doing billed work for the first attempt. Requests whose body can't be
+    replayed (streamed uploads) are sent once.
+    A request can narrow the retried statuses with the "retry_statuses" extension, e.g. to
+    handle 429s itself.
+    """
+
+    def __init__(self, metrics, max_retries=HTTP_MAX_RETRIES, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        self.max_retries = max_retries
+
+    def handle_request(self, request):
+        host = request.url.host
+        replayable = isinstance(request.stream, httpx.ByteStream)
+        retry_statuses = request.extensions.get("retry_statuses", RETRY_STATUSES)
+        idempotent_method = request.method in IDEMPOTENT_METHODS
+        idempotent = idempotent_method or request.extensions.get("idempotent", False)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError as e:
+                self.metrics.record(host, None, time.monotonic() - started)
+                can_retry = isinstance(e, UNSENT_ERRORS) or idempotent_method
+                if not (replayable and can_retry and attempt < self.max_retries):
+                    raise
+                delay = _retry_delay(attempt)
+                logging.warning(f"Request to {host} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            else:
+                self.metrics.record(host, response.status_code, time.monotonic() - started)
+                can_retry = response.status_code in retry_statuses and (response.status_code == 429 or idempotent)
+                if not (replayable and can_retry and attempt < self.max_retries):
+                    return response
+                delay = _retry_delay(attempt, response)
+                logging.warning(f"Request to {host} returned {response.status_code}, retrying in {delay:.1f}s")
+                response.close()
+
+            self.metrics.record_retry(host)
+            time.sleep(delay)
+            attempt += 1
+
+    def open_connections(self):
+        """Open pooled connections per host. Reads httpcore's pool, so it is best effort."""
+        counts = {}
+        try:
+            for connection in list(self._pool.connections):
+                host = connection._origin.host.decode()
+                counts[host] = counts.get(host, 0) + 1
+        except Exception as e:
+            logging.debug(f"Could not read connection pool state: {str(e)}")
+        return counts
+
+
+host_metrics = HostMetrics()
+transport = RetryTransport(
+    host_metrics,
+    http2=HTTP2_ENABLED,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+)
+
+# The one outbound HTTP client: OpenAI, Supabase, Apollo, HubSpot and scraping all share its pools
+http_client = httpx.Client(
+    transport=transport,
+    timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    follow_redirects=True
+)
+
+
+def _mark_idempotent(request):
+    request.extensions["idempotent"] = True
+
+
+def create_openai_client():
+    """
+    OpenAI client on the shared transport, with OPENAI_TIMEOUT for reads since completions
+    stream back slowly. Retries happen in the transport, not the SDK: 5xx responses and
+    unsent requests are retried, but a read timeout isn't, as the completion is still billed.
+    """
+    from openai import OpenAI
+    openai_http_client = httpx.Client(
+        transport=transport,
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        follow_redirects=True,
+        event_hooks={"request": [_mark_idempotent]}
+    )
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=openai_http_client, max_retries=0)
+
+
+def create_supabase_client(url=None, key=None):
+    """Supabase client on the shared transport."""
+    from supabase import create_client, ClientOptions
+    return create_client(
+        url or os.getenv("SUPABASE_URL"),
+        key or os.getenv("SUPABASE_SERVICE_ROLE_SECRET"),
+        options=ClientOptions(httpx_client=http_client)
+    )
+
+
+def http_metrics():
+    """Per-host request metrics plus currently open pooled connections."""
+    connections = transport.open_connections()
+    hosts = host_metrics.snapshot()
+    for host, count in connections.items():
+        hosts.setdefault(host, {})["open_connections"] = count
+    return {"http2": HTTP2_ENABLED, "hosts": hosts}
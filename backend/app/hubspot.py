@@ -0,0 +1,457 @@
+import os
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from app.http_client import http_client
+from app.rate_limit import TokenBucket
+from app.hubspot_index import hubspot_index
+
+# HubSpot configuration
+HUBSPOT_API = "https://api.hubapi.com"
+HUBSPOT_BATCH_SIZE = 100  # Most inputs HubSpot accepts in one batch read or IN filter
+HUBSPOT_BATCH_CONCURRENCY = int(os.getenv("HUBSPOT_BATCH_CONCURRENCY", "4"))  # HubSpot calls in flight per batch check
+HUBSPOT_SEARCHES_PER_SECOND = float(os.getenv("HUBSPOT_SEARCHES_PER_SECOND", "4"))  # Across all workers; the search API allows 5 per account
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))  # gunicorn workers, as in gunicorn_config.py
+HUBSPOT_SEARCH_PAGE_SIZE = 200
+HUBSPOT_SEARCH_MAX_RESULTS = 10000  # Search paging stops here; later results need a narrower filter
+HUBSPOT_INDEX_OVERLAP_MS = 60000  # Incremental syncs re-read the last minute, as search indexing lags writes
+
+CONTACT_PROPERTIES = ['email', 'firstname', 'lastname', 'jobtitle', 'company', 'createdate']
+COMPANY_PROPERTIES = ['name', 'domain', 'industry', 'numberofemployees', 'createdate']
+# Apollo's placeholder for an email that hasn't been revealed
+LOCKED_EMAIL = 'email_not_unlocked@domain.com'
+# Indexed object types: the property each is known by, and its last-modified property
+INDEX_OBJECTS = {
+    'contacts': ('email', 'lastmodifieddate'),
+    'companies': ('domain', 'hs_lastmodifieddate'),
+}
+
+# Shared by every HubSpot search in this worker, which gets an equal share of the account's
+# pace so all workers together stay under it; 429s are retried by the HTTP transport
+worker_searches_per_second = HUBSPOT_SEARCHES_PER_SECOND / max(1, WEB_CONCURRENCY)
+search_limit = TokenBucket(worker_searches_per_second, max(1.0, worker_searches_per_second))
+batch_pool = ThreadPoolExecutor(max_workers=HUBSPOT_BATCH_CONCURRENCY, thread_name_prefix="hubspot")
+
+
+# HubSpot Integration Functions
+def hubspot_request(url, payload=None, method='POST'):
+    """Make HubSpot API request using Personal Access Key with Bearer authentication"""
+    hubspot_api_key = os.environ.get('HUBSPOT_API_KEY')
+    if not hubspot_api_key:
+        return None, {'error': 'HubSpot API key not configured'}
+
+    # Strip any whitespace or quotes that might have been added
+    hubspot_api_key = hubspot_api_key.strip().strip('"').strip("'")
+
+    # Debug key format
+    logging.info(f"HubSpot key first 10 chars: {hubspot_api_key[:10]}...")
+    logging.info(f"HubSpot key last 4 chars: ...{hubspot_api_key[-4:]}")
+    logging.info(f"HubSpot key length: {len(hubspot_api_key)}")
+
+    # HubSpot Personal Access Keys can have different formats:
+    # - Older format: starts with 'pat-'
+    # - Newer format: starts with 'CiRu' or other prefixes (100+ chars)
+    # Both use Bearer authentication
+
+    # Use Bearer authentication for all HubSpot API keys
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {hubspot_api_key}'
+    }
+
+    if hubspot_api_key.startswith('pat-'):
+        logging.info("Using Bearer authentication with older Personal Access Key format")
+    elif hubspot_api_key.startswith('CiRu'):
+        logging.info("Using Bearer authentication with newer Personal Access Key format")
+    else:
+        logging.info("Using Bearer authentication with HubSpot API key")
+
+    try:
+        logging.info(f"Making HubSpot request to: {url}")
+        logging.info(f"Authorization header being sent: Bearer {hubspot_api_key[:10]}...{hubspot_api_key[-4:]}")
+
+        # The search API has its own, lower per-second limit
+        if url.endswith('/search'):
+            search_limit.acquire()
+
+        if method == 'POST':
+            # Searches and batch reads only read, so the transport may retry their 5xx responses
+            read_only = url.endswith(('/search', '/batch/read'))
+            response = http_client.post(url, json=payload, headers=headers, timeout=15,
+                                        extensions={"idempotent": read_only})
+        else:
+            response = http_client.get(url, headers=headers, timeout=15)
+
+        logging.info(f"HubSpot API response: {response.status_code}")
+
+        # Batch reads answer 207 when some inputs weren't found
+        if response.status_code in (200, 207):
+            logging.info("HubSpot request successful")
+            return response, None
+        else:
+            error_text = response.text[:500]
+            logging.error(f"HubSpot API failed: {response.status_code} - {error_text}")
+            return None, {'error': f'HubSpot API error: {response.status_code} - {error_text}'}
+
+    except Exception as e:
+        logging.error(f"HubSpot request exception: {str(e)}")
+        return None, {'error': f'Request failed: {str(e)}'}
+
+
+def clean_domain(domain):
+    """Bare host for a website or domain: no protocol, www or path."""
+    return domain.strip().lower().replace('https://', '').replace('http://', '').replace('www.', '').split('/')[0]
+
+
+def contact_result(contact):
+    properties = contact.get('properties', {})
+    return {
+        'exists': True,
+        'contact_id': contact.get('id'),
+        'email': properties.get('email'),
+        'first_name': properties.get('firstname'),
+        'last_name': properties.get('lastname'),
+        'job_title': properties.get('jobtitle'),
+        'company': properties.get('company'),
+        'created_date': properties.get('createdate'),
+        'hubspot_url': f"https://app.hubspot.com/contacts/{contact.get('id')}"
+    }
+
+
+def company_result(company):
+    properties = company.get('properties', {})
+    return {
+        'exists': True,
+        'company_id': company.get('id'),
+        'name': properties.get('name'),
+        'domain': properties.get('domain'),
+        'industry': properties.get('industry'),
+        'employee_count': properties.get('numberofemployees'),
+        'created_date': properties.get('createdate'),
+        'hubspot_url': f"https://app.hubspot.com/contacts/{company.get('id')}/company"
+    }
+
+
+def indexed(kind, key):
+    """The local index's answer for a key: True, False, or None when it can't say."""
+    if hubspot_index is None:
+        return None
+    try:
+        return hubspot_index.contains(kind, key)
+    except Exception as e:
+        logging.error(f"Error reading HubSpot index: {str(e)}")
+        return None
+
+
+def index_live_result(kind, key, result):
+    """Keep the index in step with a live lookup: add what it missed, drop what HubSpot no longer has."""
+    if hubspot_index is None or result.get('error'):
+        return
+    try:
+        if result['exists']:
+            record_id = result.get('contact_id') or result.get('company_id')
+            if not indexed(kind, key):
+                hubspot_index.upsert(kind, [(record_id, key)])
+        elif indexed(kind, key):
+            hubspot_index.remove(kind, key)
+            hubspot_index.count('stale')
+    except Exception as e:
+        logging.error(f"Error updating HubSpot index: {str(e)}")
+
+
+def check_hubspot_contact_by_email(email):
+    """Check if a contact exists in HubSpot by email, ruling out unknown emails from the local index"""
+    email = email.strip().lower()
+    known = indexed('contacts', email)
+    if known is False:
+        hubspot_index.count('answered')
+        return {'exists': False}
+    if known:
+        hubspot_index.count('confirmed')
+    result = live_contact_by_email(email)
+    index_live_result('contacts', email, result)
+    return result
+
+
+def check_hubspot_company_by_domain(domain):
+    """Check if a company exists in HubSpot by domain, ruling out unknown domains from the local index"""
+    domain = clean_domain(domain)
+    known = indexed('companies', domain)
+    if known is False:
+        hubspot_index.count('answered')
+        return {'exists': False}
+    if known:
+        hubspot_index.count('confirmed')
+    result = live_company_by_domain(domain)
+    index_live_result('companies', domain, result)
+    return result
+
+
+def live_contact_by_email(email):
+    """Check if a contact exists in HubSpot by email"""
+    try:
+        # HubSpot API endpoint to search for contacts
+        url = f"{HUBSPOT_API}/crm/v3/objects/contacts/search"
+
+        # Search for contact by email
+        search_payload = {
+            'filterGroups': [
+                {
+                    'filters': [
+                        {
+                            'propertyName': 'email',
+                            'operator': 'EQ',
+                            'value': email
+                        }
+                    ]
+                }
+            ],
+            'properties': CONTACT_PROPERTIES,
+            'limit': 1
+        }
+
+        response, error = hubspot_request(url, search_payload, 'POST')
+
+        if error:
+            return {'exists': False, 'error': error.get('error')}
+
+        results = response.json().get('results', [])
+        return contact_result(results[0]) if results else {'exists': False}
+
+    except Exception as e:
+        logging.error(f"Error checking HubSpot contact: {str(e)}")
+        return {'exists': False, 'error': str(e)}
+
+
+def live_company_by_domain(domain):
+    """Check if a company exists in HubSpot by domain"""
+    try:
+        # HubSpot API endpoint to search for companies
+        url = f"{HUBSPOT_API}/crm/v3/objects/companies/search"
+
+        # Search for company by domain
+        search_payload = {
+            'filterGroups': [
+                {
+                    'filters': [
+                        {
+                            'propertyName': 'domain',
+                            'operator': 'EQ',
+                            'value': clean_domain(domain)
+                        }
+                    ]
+                }
+            ],
+            'properties': COMPANY_PROPERTIES,
+            'limit': 1
+        }
+
+        response, error = hubspot_request(url, search_payload, 'POST')
+
+        if error:
+            return {'exists': False, 'error': error.get('error')}
+
+        results = response.json().get('results', [])
+        return company_result(results[0]) if results else {'exists': False}
+
+    except Exception as e:
+        logging.error(f"Error checking HubSpot company: {str(e)}")
+        return {'exists': False, 'error': str(e)}
+
+
+def read_contacts_by_email(emails):
+    """Batch-read up to HUBSPOT_BATCH_SIZE contacts by email. Returns {email: result} for those found."""
+    payload = {
+        'idProperty': 'email',
+        'inputs': [{'id': email} for email in emails],
+        'properties': CONTACT_PROPERTIES
+    }
+    response, error = hubspot_request(f"{HUBSPOT_API}/crm/v3/objects/contacts/batch/read", payload, 'POST')
+    if error:
+        raise RuntimeError(error.get('error'))
+
+    found = {}
+    for contact in response.json().get('results', []):
+        email = (contact.get('properties', {}).get('email') or '').lower()
+        found[email] = contact_result(contact)
+    return found
+
+
+def search_companies_by_domain(domains):
+    """Find companies for up to HUBSPOT_BATCH_SIZE domains with one IN filter. Returns {domain: result}."""
+    payload = {
+        'filterGroups': [{'filters': [{'propertyName': 'domain', 'operator': 'IN', 'values': domains}]}],
+        'properties': COMPANY_PROPERTIES,
+        'limit': HUBSPOT_SEARCH_PAGE_SIZE
+    }
+    found = {}
+    while True:
+        response, error = hubspot_request(f"{HUBSPOT_API}/crm/v3/objects/companies/search", payload, 'POST')
+        if error:
+            raise RuntimeError(error.get('error'))
+        data = response.json()
+        for company in data.get('results', []):
+            domain = (company.get('properties', {}).get('domain') or '').lower()
+            # Keep the first match, as the single-domain check does
+            found.setdefault(domain, company_result(company))
+        after = data.get('paging', {}).get('next', {}).get('after')
+        if not after:
+            return found
+        payload['after'] = after
+
+
+def batch_check_prospects(prospects):
+    """
+    Check many prospects at once. Emails are batch-read and domains searched with IN
+    filters, HUBSPOT_BATCH_SIZE per call with the calls running concurrently, and each
+    answer is mapped back to every prospect id that shares the email or domain.
+    Returns {prospect_id: result} in the shape of the single-prospect checks.
+    """
+    results = {}
+    emails, domains = {}, {}
+    for prospect in prospects:
+        prospect_id = prospect.get('id')
+        prospect_type = prospect.get('type', 'person')
+        prospect_data = prospect.get('data')
+
+        if not prospect_id or not prospect_data:
+            continue
+
+        if prospect_type == 'person':
+            email = (prospect_data.get('email') or '').strip().lower()
+            if email and email != LOCKED_EMAIL:
+                emails.setdefault(email, []).append(prospect_id)
+            else:
+                results[prospect_id] = {'exists': False, 'error': 'No valid email'}
+
+        elif prospect_type == 'company':
+            domain = prospect_data.get('website_url') or prospect_data.get('primary_domain')
+            if domain:
+                domains.setdefault(clean_domain(domain), []).append(prospect_id)
+            else:
+                results[prospect_id] = {'exists': False, 'error': 'No domain available'}
+
+    lookups = []
+    for kind, lookup, owners in (('contacts', read_contacts_by_email, emails),
+                                 ('companies', search_companies_by_domain, domains)):
+        # Only keys the index knows (or can't rule out) need a HubSpot call
+        keys = []
+        for key in owners:
+            known = indexed(kind, key)
+            if known is False:
+                hubspot_index.count('answered')
+                for prospect_id in owners[key]:
+                    results[prospect_id] = {'exists': False}
+                continue
+            if known:
+                hubspot_index.count('confirmed')
+            keys.append(key)
+        for start in range(0, len(keys), HUBSPOT_BATCH_SIZE):
+            chunk = keys[start:start + HUBSPOT_BATCH_SIZE]
+            lookups.append((batch_pool.submit(lookup, chunk), kind, chunk, owners))
+
+    for future, kind, chunk, owners in lookups:
+        try:
+            found, error = future.result(), None
+        except Exception as e:
+            logging.error(f"Error in HubSpot batch lookup: {str(e)}")
+            found, error = {}, str(e)
+        for key in chunk:
+            result = {'exists': False, 'error': error} if error else found.get(key, {'exists': False})
+            index_live_result(kind, key, result)
+            for prospect_id in owners[key]:
+                results[prospect_id] = result
+    return results
+
+
+def _modified_ms(record):
+    """A record's last-modified time in epoch milliseconds, from its updatedAt."""
+    updated_at = record.get('updatedAt')
+    if not updated_at:
+        return 0
+    return int(datetime.fromisoformat(updated_at.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+def _index_record(kind, record):
+    key = (record.get('properties', {}).get(INDEX_OBJECTS[kind][0]) or '').strip()
+    return record.get('id'), clean_domain(key) if kind == 'companies' and key else key.lower()
+
+
+def list_index_records(kind):
+    """Every record of `kind` as (id, key), paged through the objects API (search can't page past 10,000)."""
+    url = f"{HUBSPOT_API}/crm/v3/objects/{kind}?limit=100&archived=false&properties={INDEX_OBJECTS[kind][0]}"
+    records, after = [], None
+    while True:
+        response, error = hubspot_request(url + (f"&after={after}" if after else ''), None, 'GET')
+        if error:
+            raise RuntimeError(error.get('error'))
+        data = response.json()
+        records.extend(_index_record(kind, record) for record in data.get('results', []))
+        after = data.get('paging', {}).get('next', {}).get('after')
+        if not after:
+            return records
+
+
+def search_modified_since(kind, since_ms):
+    """Records of `kind` modified at or after `since_ms`, as ([(id, key)], newest modified time in ms)."""
+    key_property, modified_property = INDEX_OBJECTS[kind]
+    payload = {
+        'filterGroups': [{'filters': [{'propertyName': modified_property, 'operator': 'GTE', 'value': str(since_ms)}]}],
+        'sorts': [{'propertyName': modified_property, 'direction': 'ASCENDING'}],
+        'properties': [key_property],
+        'limit': HUBSPOT_SEARCH_PAGE_SIZE
+    }
+    records, watermark = [], since_ms
+    while True:
+        response, error = hubspot_request(f"{HUBSPOT_API}/crm/v3/objects/{kind}/search", payload, 'POST')
+        if error:
+            raise RuntimeError(error.get('error'))
+        data = response.json()
+        for record in data.get('results', []):
+            records.append(_index_record(kind, record))
+            watermark = max(watermark, _modified_ms(record))
+        after = data.get('paging', {}).get('next', {}).get('after')
+        if not after:
+            return records, watermark
+        if int(after) + HUBSPOT_SEARCH_PAGE_SIZE > HUBSPOT_SEARCH_MAX_RESULTS:
+            # Start a new search from the newest change seen, since paging can't go further
+            filter_value = payload['filterGroups'][0]['filters'][0]
+            if filter_value['value'] == str(watermark):
+                raise RuntimeError(f"Over {HUBSPOT_SEARCH_MAX_RESULTS} {kind} share one modified time; run a full sync")
+            filter_value['value'] = str(watermark)
+            payload.pop('after', None)
+        else:
+            payload['after'] = after
+
+
+def sync_hubspot_index(full=False):
+    """
+    Bring the local HubSpot index up to date. Each kind is fully reloaded the first time,
+    when `full` is set, or once its last full load is older than the full-sync interval
+    (which is how deleted records drop out); otherwise only records modified since the
+    last sync are fetched.
+    """
+    if hubspot_index is None:
+        raise ValueError("HubSpot index is not enabled")
+
+    summary = {}
+    for kind in INDEX_OBJECTS:
+        started_ms = int(time.time() * 1000)
+        if full or hubspot_index.sync_mode(kind) == 'full':
+            records = list_index_records(kind)
+            # Changes made while listing are picked up by the next incremental sync
+            hubspot_index.replace(kind, records, started_ms)
+            summary[kind] = {"mode": "full", "records": len(records)}
+        else:
+            previous = hubspot_index.watermark(kind)
+            records, watermark = search_modified_since(kind, max(0, previous - HUBSPOT_INDEX_OVERLAP_MS))
+            hubspot_index.upsert(kind, records, max(previous, watermark))
+            summary[kind] = {"mode": "incremental", "records": len(records)}
+        logging.info(f"HubSpot index {summary[kind]['mode']} sync of {kind}: {len(records)} records")
+    return summary
+
+
+def run_hubspot_index_sync(payload, progress):
+    """Job handler for HubSpot index syncs."""
+    return progress.run('sync', sync_hubspot_index, payload.get('full', False))
@@ -0,0 +1,236 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+# HubSpot existence index configuration
+HUBSPOT_INDEX_ENABLED = os.getenv("HUBSPOT_INDEX_ENABLED", "true").lower() == "true"
+HUBSPOT_INDEX_PATH = os.getenv("HUBSPOT_INDEX_PATH", "hubspot_index.db")
+HUBSPOT_INDEX_SYNC_INTERVAL = int(os.getenv("HUBSPOT_INDEX_SYNC_INTERVAL", "300"))  # Seconds between incremental syncs
+HUBSPOT_INDEX_FULL_SYNC_INTERVAL = int(os.getenv("HUBSPOT_INDEX_FULL_SYNC_INTERVAL", "86400"))  # Full reloads drop deleted records
+HUBSPOT_INDEX_RELOAD_CHECK = 5  # Seconds between checks for another worker's writes
+
+
+class HubSpotIndex:
+    """
+    Every HubSpot contact email and company domain, keyed by record id, so existence checks
+    can rule out unknown prospects without calling HubSpot. Records and sync state live in
+    SQLite, shared by all gunicorn workers; each worker answers from an in-memory set per
+    kind and reloads it when the kind's version changes.
+    """
+
+    def __init__(self, path=HUBSPOT_INDEX_PATH):
+        self.path = path
+        self.keys = {}
+        self.versions = {}
+        self.checked_at = {}
+        self.counters = {"answered": 0, "confirmed": 0, "stale": 0}
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS records (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS records_key ON records (kind, key)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    kind TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    watermark INTEGER NOT NULL DEFAULT 0,
+                    full_synced_at REAL,
+                    synced_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_claim (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    claimed_at REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO sync_claim (id) VALUES (1)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _bump(self, conn, kind, changed=True, **state):
+        """Set any sync state columns, bump the kind's version if records `changed`, and return the version."""
+        conn.execute("INSERT OR IGNORE INTO sync_state (kind) VALUES (?)", (kind,))
+        assignments = ''.join(f", {column} = ?" for column in state)
+        conn.execute(f"UPDATE sync_state SET version = version + ?{assignments} WHERE kind = ?",
+                     (int(changed), *state.values(), kind))
+        return conn.execute("SELECT version FROM sync_state WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def _applied(self, kind, version, add=(), remove=()):
+        """Apply this worker's own write to its set, or force a reload if another worker also wrote."""
+        with self._lock:
+            keys = self.keys.get(kind)
+            if keys is not None and self.versions.get(kind) == version - 1:
+                keys.difference_update(remove)
+                keys.update(add)
+                self.versions[kind] = version
+            else:
+                self.checked_at[kind] = 0
+
+    def _refresh(self, kind):
+        now = time.monotonic()
+        with self._lock:
+            if now - self.checked_at.get(kind, 0) < HUBSPOT_INDEX_RELOAD_CHECK:
+                return
+            self.checked_at[kind] = now
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT version, full_synced_at FROM sync_state WHERE kind = ?", (kind,)).fetchone()
+            if row is None or row[1] is None:
+                return  # Not fully loaded yet, so it can't rule anything out
+            if row[0] == self.versions.get(kind):
+                return
+            keys = {key for (key,) in conn.execute("SELECT key FROM records WHERE kind = ?", (kind,))}
+        finally:
+            conn.close()
+        with self._lock:
+            self.keys[kind] = keys
+            self.versions[kind] = row[0]
+
+    def contains(self, kind, key):
+        """Whether `key` is known for `kind`, or None until the kind has been fully loaded."""
+        self._refresh(kind)
+        with self._lock:
+            keys = self.keys.get(kind)
+        return None if keys is None else key in keys
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def replace(self, kind, records, watermark):
+        """Full load: make [(id, key)] the kind's only records."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM records WHERE kind = ?", (kind,))
+            conn.executemany("INSERT OR REPLACE INTO records (kind, id, key) VALUES (?, ?, ?)",
+                             [(kind, record_id, key) for record_id, key in records if key])
+            self._bump(conn, kind, watermark=watermark, full_synced_at=now, synced_at=now)
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.checked_at[kind] = 0
+
+    def upsert(self, kind, records, watermark=None):
+        """Add or update [(id, key)] records; a record whose key is now empty is dropped."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM records WHERE kind = ? AND id = ?",
+                             [(kind, record_id) for record_id, key in records if not key])
+            conn.executemany("INSERT OR REPLACE INTO records (kind, id, key) VALUES (?, ?, ?)",
+                             [(kind, record_id, key) for record_id, key in records if key])
+            if watermark is None:
+                version = self._bump(conn, kind)
+            else:
+                version = self._bump(conn, kind, bool(records), watermark=watermark, synced_at=time.time())
+            conn.commit()
+        finally:
+            conn.close()
+        if not records:
+            return
+        if len(records) == 1 and records[0][1]:
+            self._applied(kind, version, add=[records[0][1]])
+        else:
+            # Changed keys need the old value removed, which only a reload does
+            with self._lock:
+                self.checked_at[kind] = 0
+
+    def remove(self, kind, key):
+        """Drop a key HubSpot no longer has."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM records WHERE kind = ? AND key = ?", (kind, key))
+            version = self._bump(conn, kind)
+            conn.commit()
+        finally:
+            conn.close()
+        self._applied(kind, version, remove=[key])
+
+    def sync_mode(self, kind):
+        """'full' when the kind has never been loaded or its last full load is too old, else 'incremental'."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT full_synced_at FROM sync_state WHERE kind = ?", (kind,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[0] is None or time.time() - row[0] > HUBSPOT_INDEX_FULL_SYNC_INTERVAL:
+            return 'full'
+        return 'incremental'
+
+    def watermark(self, kind):
+        """Epoch milliseconds up to which the kind's changes have been synced."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT watermark FROM sync_state WHERE kind = ?", (kind,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+
+    def claim_sync(self, interval=HUBSPOT_INDEX_SYNC_INTERVAL):
+        """True for exactly one caller across workers once `interval` seconds have passed since the last claim."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            claimed_at = conn.execute("SELECT claimed_at FROM sync_claim WHERE id = 1").fetchone()[0]
+            if now - claimed_at < interval:
+                conn.commit()
+                return False
+            conn.execute("UPDATE sync_claim SET claimed_at = ? WHERE id = 1", (now,))
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            state = conn.execute('''
+                SELECT s.kind, s.version, s.watermark, s.full_synced_at, s.synced_at,
+                       (SELECT COUNT(*) FROM records r WHERE r.kind = s.kind)
+                FROM sync_state s
+            ''').fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            return {
+                "enabled": True,
+                "kinds": {
+                    kind: {"records": records, "version": version, "watermark": watermark,
+                           "full_synced_at": full_synced_at, "synced_at": synced_at,
+                           "loaded_in_worker": kind in self.keys}
+                    for kind, version, watermark, full_synced_at, synced_at, records in state
+                },
+                **self.counters
+            }
+
+
+hubspot_index = None
+if HUBSPOT_INDEX_ENABLED:
+    try:
+        hubspot_index = HubSpotIndex()
+    except Exception as e:
+        logging.error(f"Error initializing HubSpot index, continuing without it: {str(e)}")
@@ -0,0 +1,266 @@
+import os
+import time
+import shutil
+import logging
+import hashlib
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.scraping import scrape_website, iter_text_from_file, store_in_supabase, supabase
+from app.chunking import iter_chunks
+from app.embeddings import get_embeddings
+from app.pinecone_client import store_in_pinecone
+from app.llm import generate_source_summary, generate_file_summary
+from app.sync_manifest import SyncManifest
+
+# Uploaded files are kept here until their ingestion job has run
+INGESTION_UPLOAD_DIR = os.getenv("INGESTION_UPLOAD_DIR", "/tmp/ingestion_jobs")
+# Files are embedded and upserted in windows of this many chunks while extraction continues
+INGESTION_CHUNK_WINDOW = int(os.getenv("INGESTION_CHUNK_WINDOW", "64"))
+INGESTION_MAX_PENDING_WINDOWS = 2  # Windows extracted but not yet upserted
+
+
+def save_upload(file, filename):
+    """Persist an uploaded file for a queued job and return its path."""
+    os.makedirs(INGESTION_UPLOAD_DIR, exist_ok=True)
+    job_dir = tempfile.mkdtemp(dir=INGESTION_UPLOAD_DIR)
+    file_path = os.path.join(job_dir, filename)
+    file.save(file_path)
+    return file_path
+
+
+def _embed_and_upsert(progress, source_id, chunks):
+    """Run the embed and upsert stages for a list of chunks."""
+    progress.start('embed', chunks=len(chunks))
+    embeddings = get_embeddings(chunks)
+    embedded = sum(1 for embedding in embeddings if embedding is not None)
+    progress.complete('embed', embedded=embedded, failed=len(chunks) - embedded)
+    if not embedded:
+        raise ValueError("Failed to generate embeddings for any chunk")
+
+    progress.start('upsert')
+    started = time.monotonic()
+    try:
+        stored_ids = store_in_pinecone(source_id, chunks, namespace="global_knowledge_base", embeddings=embeddings)
+    except Exception as e:
+        progress.fail('upsert', str(e))
+        raise
+    progress.complete('upsert', vectors=len(stored_ids),
+                      vectors_per_second=_throughput(len(stored_ids), time.monotonic() - started))
+    return stored_ids
+
+
+def _store_summary(source_id, text, category, summarize=generate_source_summary):
+    """
+    Generate the source's summary and store it, replacing any summary it already has.
+    `summarize(text, category)` may be given a file path instead, e.g. generate_file_summary.
+    Returns the summary's id.
+    """
+    summary = summarize(text, category)
+    if not summary:
+        return None
+    existing = supabase.table('source_summaries')\
+        .select('id')\
+        .eq('source_id', source_id)\
+        .execute()
+    if existing.data:
+        summary_id = existing.data[0]['id']
+        supabase.table('source_summaries')\
+            .update({'category': category, 'summary': summary})\
+            .eq('id', summary_id)\
+            .execute()
+    else:
+        response = supabase.table('source_summaries').insert({
+            'source_id': source_id,
+            'category': category,
+            'summary': summary
+        }).execute()
+        summary_id = response.data[0]['id'] if response.data else None
+    logging.debug(f"Successfully stored summary for {source_id}")
+    return summary_id
+
+
+def _record_in_manifest(progress, bucket_name, filename, file_path, vector_ids, summary_id):
+    """
+    Record a source stored in a monitored bucket in the sync manifest, so the bucket sync
+    recognises it by content hash instead of embedding and summarizing it a second time.
+    """
+    if progress.stages.get('store_file', {}).get('status') != 'completed':
+        return  # Not in the bucket, so the sync would only drop the entry and its vectors
+    try:
+        with open(file_path, 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        if summary_id is None:
+            summary_id = (SyncManifest().entries(bucket_name).get(filename) or {}).get('summary_id')
+        SyncManifest().record(bucket_name, filename, content_hash=content_hash,
+                              vector_ids=vector_ids, summary_id=summary_id)
+    except Exception as e:
+        logging.error(f"Error recording {filename} in the sync manifest: {str(e)}")
+
+
+def _run_optional(progress, stage, func, *args):
+    """
+    Run a stage whose failure should not fail the whole job (storage and summaries), and
+    return its result or None. A recovered job re-running from the start skips it if an
+    earlier run completed it.
+    """
+    if progress.stages.get(stage, {}).get('status') == 'completed':
+        logging.info(f"Skipping {stage} stage, already completed by an earlier run")
+        return None
+    try:
+        return progress.run(stage, func, *args)
+    except Exception as e:
+        logging.error(f"Error in {stage} stage: {str(e)}")
+        return None
+
+
+def _ingest_url(payload, progress):
+    url = payload['url']
+    category = payload['category']
+    bucket_name = payload['bucket_name']
+
+    progress.start('scrape')
+    scraped_data = scrape_website(url)
+    if not scraped_data:
+        raise ValueError(f"No data scraped from {url}")
+    progress.complete('scrape', chunks=len(scraped_data))
+
+    vector_ids = _embed_and_upsert(progress, url, scraped_data)
+
+    # Save scraped data as text in Supabase
+    filename = f"{url.replace('https://', '').replace('/', '_')}.txt"
+    full_text = '\n'.join(scraped_data)
+    temp_dir = tempfile.mkdtemp()
+    temp_file_path = os.path.join(temp_dir, filename)
+    try:
+        with open(temp_file_path, 'w') as f:
+            f.write(full_text)
+        _run_optional(progress, 'store_file', store_in_supabase, temp_file_path, bucket_name, filename)
+        summary_id = _run_optional(progress, 'summarize', _store_summary, url, full_text, category)
+        _record_in_manifest(progress, bucket_name, filename, temp_file_path, vector_ids, summary_id)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {"source_id": url, "chunks": len(scraped_data), "vectors": len(vector_ids)}
+
+
+def _throughput(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+def _rounded(counts):
+    rounded = {key: round(value, 3) if isinstance(value, float) else value for key, value in counts.items()}
+    rounded["vectors_per_second"] = _throughput(counts["vectors"], counts["upsert_seconds"])
+    return rounded
+
+
+def _embed_and_upsert_window(source_id, chunks, start_index):
+    """Embed and upsert one window of a file's chunks, returning (stored ids, embed_seconds, upsert_seconds)."""
+    started = time.monotonic()
+    embeddings = get_embeddings([chunk['text'] for chunk in chunks])
+    embedded_at = time.monotonic()
+    stored_ids = []
+    if any(embedding is not None for embedding in embeddings):
+        stored_ids = store_in_pinecone(source_id, chunks, namespace="global_knowledge_base",
+                                       embeddings=embeddings, start_index=start_index)
+    return stored_ids, embedded_at - started, time.monotonic() - embedded_at
+
+
+def _ingest_file(payload, progress):
+    """
+    Stream the file through extract -> chunk -> embed -> upsert. Pages are chunked as they
+    are extracted and each window of chunks is embedded in the background, so embedding
+    starts before extraction finishes and only a few windows are held in memory.
+    """
+    file_path = payload['file_path']
+    filename = payload['filename']
+    category = payload['category']
+    bucket_name = payload['bucket_name']
+    file_extension = filename.split('.')[-1].lower()
+    # The same id the bucket sync gives this file once it is stored in the bucket
+    source_id = SyncManifest.source_id(bucket_name, filename)
+    vector_ids = []
+
+    counts = {"pages": 0, "chunks": 0, "vectors": 0, "failed": 0,
+              "extract_seconds": 0.0, "embed_seconds": 0.0, "upsert_seconds": 0.0}
+    # The extracted text is spooled to disk for the summary rather than kept in memory
+    spool_fd, spool_path = tempfile.mkstemp(suffix='.txt')
+    pending = deque()
+
+    def collect(window):
+        size, future = window
+        stored_ids, embed_seconds, upsert_seconds = future.result()
+        vector_ids.extend(stored_ids)
+        counts["vectors"] += len(stored_ids)
+        counts["failed"] += size - len(stored_ids)
+        counts["embed_seconds"] += embed_seconds
+        counts["upsert_seconds"] += upsert_seconds
+        progress.update('process', **_rounded(counts))
+
+    def pages(spool):
+        page_iter = iter_text_from_file(file_path, file_extension)
+        while True:
+            started = time.monotonic()
+            page = next(page_iter, None)
+            counts["extract_seconds"] += time.monotonic() - started
+            if page is None:
+                return
+            counts["pages"] += 1
+            spool.write(page)
+            yield page
+
+    progress.start('process', **counts)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        with os.fdopen(spool_fd, 'w') as spool:
+            window = []
+            for chunk in iter_chunks(pages(spool)):
+                window.append(chunk)
+                if len(window) < INGESTION_CHUNK_WINDOW:
+                    continue
+                if len(pending) >= INGESTION_MAX_PENDING_WINDOWS:
+                    collect(pending.popleft())
+                pending.append((len(window), executor.submit(_embed_and_upsert_window, source_id, window, counts["chunks"])))
+                counts["chunks"] += len(window)
+                window = []
+            if window:
+                pending.append((len(window), executor.submit(_embed_and_upsert_window, source_id, window, counts["chunks"])))
+                counts["chunks"] += len(window)
+            while pending:
+                collect(pending.popleft())
+
+        if not counts["chunks"]:
+            raise ValueError(f"Could not extract text from {filename}")
+        if not counts["vectors"]:
+            raise ValueError("Failed to store vectors for any chunk")
+        progress.complete('process', **_rounded(counts))
+
+        _run_optional(progress, 'store_file', store_in_supabase, file_path, bucket_name, filename)
+        # Summarized from the spool in windows, so the whole text is never in memory
+        summary_id = _run_optional(progress, 'summarize', _store_summary, source_id, spool_path, category,
+                                   generate_file_summary)
+        _record_in_manifest(progress, bucket_name, filename, file_path, vector_ids, summary_id)
+    except Exception as e:
+        if progress.stages['process']['status'] == 'running':
+            progress.fail('process', str(e))
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        os.remove(spool_path)
+
+    return {"source_id": source_id, "chunks": counts["chunks"], "vectors": counts["vectors"]}
+
+
+def run_ingestion_job(payload, progress):
+    """
+    Job handler for /add-source: scrape or extract -> chunk -> embed -> upsert,
+    then store the original in Supabase and summarize it.
+    """
+    if payload['source_type'] == 'url':
+        return _ingest_url(payload, progress)
+
+    try:
+        return _ingest_file(payload, progress)
+    finally:
+        # The upload is only needed until the job has run
+        shutil.rmtree(os.path.dirname(payload['file_path']), ignore_errors=True)
@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Job queue configuration
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Concurrent jobs per gunicorn worker
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))  # How often running jobs are marked alive and stale ones swept
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "90"))  # Running jobs with no heartbeat for this long are requeued
+
+
+class JobStore:
+    """
+    Durable job records in SQLite, shared by all gunicorn workers on the host.
+    Each job keeps its input payload, per-stage progress and timings, and its result.
+    """
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    payload TEXT NOT NULL,
+                    stages TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                )
+            ''')
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def create(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return job_id
+
+    def claim(self, job_id):
+        """Atomically move a queued job to running. Returns False if another worker got it first."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, updated_at = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, now, now, job_id)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def update(self, job_id, **fields):
+        """Update job columns; dict/list values are stored as JSON."""
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        values = [json.dumps(v) if isinstance(v, (dict, list)) else v for v in fields.values()]
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", values + [job_id])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        job = dict(row)
+        for column in ('payload', 'stages', 'result'):
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+    def heartbeat(self, job_ids):
+        """Mark running jobs as still owned by a live worker."""
+        if not job_ids:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS):
+        """Return running jobs whose worker died (no heartbeat for `stale_seconds`) to the queue."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND COALESCE(heartbeat_at, updated_at) < ?",
+                (time.time() - stale_seconds,)
+            )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def queued_jobs(self):
+        """(id, kind) of queued jobs, oldest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, kind FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        finally:
+            conn.close()
+        return [(row['id'], row['kind']) for row in rows]
+
+    def active_ids(self, kind):
+        """Ids of `kind` jobs that are queued or running in any worker."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND status IN ('queued', 'running') ORDER BY created_at", (kind,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row['id'] for row in rows]
+
+
+class JobProgress:
+    """Records per-stage status, timings and progress details for a running job."""
+
+    def __init__(self, store, job_id, stages=None):
+        self.store = store
+        self.job_id = job_id
+        self.stages = stages or {}
+        self._lock = threading.Lock()
+
+    def _save(self):
+        self.store.update(self.job_id, stages=self.stages)
+
+    def start(self, stage, **details):
+        with self._lock:
+            self.stages[stage] = {"status": "running", "started_at": time.time(), **details}
+            self._save()
+
+    def update(self, stage, **details):
+        with self._lock:
+            self.stages.setdefault(stage, {"status": "running", "started_at": time.time()}).update(details)
+            self._save()
+
+    def complete(self, stage, **details):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"started_at": time.time()})
+            entry.update(details)
+            entry["status"] = "completed"
+            entry["duration_seconds"] = round(time.time() - entry["started_at"], 3)
+            self._save()
+
+    def fail(self, stage, error):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"started_at": time.time()})
+            entry["status"] = "failed"
+            entry["error"] = error
+            entry["duration_seconds"] = round(time.time() - entry["started_at"], 3)
+            self._save()
+
+    def run(self, stage, func, *args, **kwargs):
+        """Run `func` as `stage`, recording its timing and marking it failed if it raises."""
+        self.start(stage)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.fail(stage, str(e))
+            raise
+        self.complete(stage)
+        return result
+
+
+class JobQueue:
+    """
+    Runs queued jobs on a bounded worker pool.
+    Handlers are registered per job kind and called as handler(payload, progress),
+    returning a JSON-serializable result. A kind registered with its own `max_workers`
+    runs on a separate pool, so its long jobs can't hold every shared slot. Once started, a background thread heartbeats
+    this worker's running jobs and picks up jobs stranded by workers that exited.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS):
+        self.store = store
+        self.handlers = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.executors = {}
+        self.submitted = set()
+        self.running = set()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def register(self, kind, handler, max_workers=None):
+        self.handlers[kind] = handler
+        if max_workers is not None:
+            self.executors[kind] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{kind}")
+
+    def enqueue(self, kind, payload):
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job_id = self.store.create(kind, payload)
+        self._submit(job_id, kind)
+        logging.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def _submit(self, job_id, kind):
+        with self._lock:
+            if job_id in self.submitted:
+                return
+            self.submitted.add(job_id)
+        self.executors.get(kind, self.executor).submit(self._run, job_id)
+
+    def recover(self):
+        """Resubmit jobs left queued or stranded by a worker that exited mid-job."""
+        try:
+            requeued = self.store.requeue_stale()
+            if requeued:
+                logging.info(f"Requeued {requeued} stale jobs")
+            for job_id, kind in self.store.queued_jobs():
+                self._submit(job_id, kind)
+        except Exception as e:
+            logging.error(f"Error recovering queued jobs: {str(e)}")
+
+    def _sweep(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                with self._lock:
+                    running = list(self.running)
+                self.store.heartbeat(running)
+            except Exception as e:
+                logging.error(f"Error recording job heartbeats: {str(e)}")
+            self.recover()
+
+    def start(self):
+        """Recover stranded jobs now and keep heartbeating and sweeping in the background."""
+        self.recover()
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep, name="job-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _run(self, job_id):
+        try:
+            if not self.store.claim(job_id):
+                return  # Already picked up by another worker
+            with self._lock:
+                self.running.add(job_id)
+            self._execute(job_id)
+        finally:
+            with self._lock:
+                self.submitted.discard(job_id)
+                self.running.discard(job_id)
+
+    def _execute(self, job_id):
+        job = self.store.get(job_id)
+        handler = self.handlers.get(job['kind'])
+        if handler is None:
+            self.store.update(job_id, status='failed', error=f"No handler for job kind '{job['kind']}'",
+                              finished_at=time.time())
+            return
+
+        progress = JobProgress(self.store, job_id, job['stages'])
+        try:
+            result = handler(job['payload'], progress)
+            self.store.update(job_id, status='completed', result=result, finished_at=time.time())
+            logging.info(f"Job {job_id} completed")
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
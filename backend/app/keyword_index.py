@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+
+# Keyword index configuration
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX_ENABLED", "true").lower() == "true"
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "keyword_index.db")
+MAX_QUERY_TERMS = 32
+
+# Words too common to say anything about which chunk is relevant
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i if in into is it its me my
+not of on or our so than that the their them then there these they this to was we were what when
+where which who why will with you your
+""".split())
+
+
+def query_terms(text):
+    """Distinct, lowercased search terms from a free-text question."""
+    terms = []
+    for term in re.findall(r'\w+', text.lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+class KeywordIndex:
+    """
+    BM25 keyword index over the chunks stored in Pinecone, kept in an SQLite FTS5 table.
+    Catches exact terms (product names, acronyms, client names) that dense retrieval misses.
+    A namespace only serves searches once a full sync has marked it synced; before that it
+    holds just the chunks written since the index was created.
+    """
+
+    def __init__(self, path=KEYWORD_INDEX_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    rowid INTEGER PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    UNIQUE (namespace, vector_id)
+                )
+            ''')
+            # Full-text rows share their rowid with `entries`
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text, tokenize = 'porter unicode61')
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS namespaces (
+                    namespace TEXT PRIMARY KEY,
+                    synced_at REAL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def upsert(self, namespace, vectors):
+        """Index (id, values, metadata) vectors by their metadata text, replacing earlier versions."""
+        conn = self._connect()
+        try:
+            for vector_id, _, metadata in vectors:
+                extra = json.dumps({k: v for k, v in metadata.items() if k != 'text'})
+                existing = conn.execute(
+                    "SELECT rowid FROM entries WHERE namespace = ? AND vector_id = ?", (namespace, vector_id)
+                ).fetchone()
+                if existing:
+                    rowid = existing[0]
+                    conn.execute("UPDATE entries SET metadata = ? WHERE rowid = ?", (extra, rowid))
+                    conn.execute("DELETE FROM chunks WHERE rowid = ?", (rowid,))
+                else:
+                    rowid = conn.execute(
+                        "INSERT INTO entries (namespace, vector_id, metadata) VALUES (?, ?, ?)",
+                        (namespace, vector_id, extra)
+                    ).lastrowid
+                conn.execute("INSERT INTO chunks (rowid, text) VALUES (?, ?)", (rowid, metadata.get('text', '')))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, namespace, vector_ids):
+        conn = self._connect()
+        try:
+            for vector_id in vector_ids:
+                existing = conn.execute(
+                    "SELECT rowid FROM entries WHERE namespace = ? AND vector_id = ?", (namespace, vector_id)
+                ).fetchone()
+                if existing:
+                    conn.execute("DELETE FROM chunks WHERE rowid = ?", existing)
+                    conn.execute("DELETE FROM entries WHERE rowid = ?", existing)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def ids(self, namespace):
+        conn = self._connect()
+        try:
+            return [vector_id for (vector_id,) in conn.execute(
+                "SELECT vector_id FROM entries WHERE namespace = ?", (namespace,))]
+        finally:
+            conn.close()
+
+    def mark_synced(self, namespace, synced_at):
+        """Record that the namespace fully mirrors Pinecone as of `synced_at`."""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT INTO namespaces (namespace, synced_at) VALUES (?, ?)
+                ON CONFLICT(namespace) DO UPDATE SET synced_at = excluded.synced_at
+            ''', (namespace, synced_at))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_unsynced(self, namespace):
+        """Record that the namespace may have missed a write, so it no longer serves searches until re-synced."""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE namespaces SET synced_at = NULL WHERE namespace = ?", (namespace,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def is_synced(self, namespace):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT synced_at FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None and row[0] is not None
+
+    def search(self, namespace, text, top_k=10):
+        """Return up to `top_k` chunks matching any term of `text`, best BM25 score first."""
+        terms = query_terms(text)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT entries.vector_id, bm25(chunks) AS rank, chunks.text, entries.metadata
+                FROM chunks JOIN entries ON entries.rowid = chunks.rowid
+                WHERE chunks MATCH ? AND entries.namespace = ?
+                ORDER BY rank LIMIT ?
+            ''', (match, namespace, top_k)).fetchall()
+        finally:
+            conn.close()
+        # SQLite's bm25() is lower-is-better; flip it so scores read like similarities
+        return [
+            {"id": vector_id, "score": -rank, "text": chunk_text, **json.loads(metadata)}
+            for vector_id, rank, chunk_text, metadata in rows
+        ]
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT e.namespace, COUNT(*), n.synced_at
+                FROM entries e LEFT JOIN namespaces n ON n.namespace = e.namespace
+                GROUP BY e.namespace
+            ''').fetchall()
+        finally:
+            conn.close()
+        return {
+            "enabled": True,
+            "namespaces": {
+                namespace: {"chunks": count, "synced_at": synced_at}
+                for namespace, count, synced_at in rows
+            }
+        }
+
+
+keyword_index = None
+if KEYWORD_INDEX_ENABLED:
+    try:
+        keyword_index = KeywordIndex()
+    except Exception as e:
+        logging.error(f"Error initializing keyword index, continuing without it: {str(e)}")
@@ -1,94 +1,140 @@
 import os
-import time
-from openai import OpenAI
 from dotenv import load_dotenv
 import tiktoken
 import logging
-from typing import List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional
+from app.rate_limit import RateLimiter
+from app.context_packing import pack_context
+from app.embeddings import tokenizer
+from app.http_client import create_openai_client
 
 # Load environment variables from .env
 load_dotenv()
 
 # Initialize OpenAI client with API key from environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def query_llm(dochub_texts, user_question, chat_history=None):
+client = create_openai_client()
+
+# Account rate limits for the summarization model, shared by all threads in this worker
+SUMMARY_MODEL = "gpt-5-nano"
+SUMMARY_RPM = int(os.getenv("OPENAI_SUMMARY_RPM", "500"))
+SUMMARY_TPM = int(os.getenv("OPENAI_SUMMARY_TPM", "200000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+summary_rate_limiter = RateLimiter(SUMMARY_RPM, SUMMARY_TPM)
+
+# Account rate limits for QA tool reviews, shared by all threads in this worker
+QA_MODEL = "gpt-5-mini"
+QA_RPM = int(os.getenv("OPENAI_QA_RPM", "500"))
+QA_TPM = int(os.getenv("OPENAI_QA_TPM", "200000"))
+QA_CONCURRENCY = int(os.getenv("QA_CONCURRENCY", "6"))  # Chunk reviews in flight at once per upload
+QA_MAX_COMPLETION_TOKENS = 3000
+qa_rate_limiter = RateLimiter(QA_RPM, QA_TPM)
+
+QUERY_MODEL = "gpt-5-mini"
+QUERY_MAX_COMPLETION_TOKENS = 5000
+
+def format_chat_history(history, max_messages=5):
+    """Format the last few chat messages as conversation context."""
+    if not history:
+        return ""
+    # Take the last few messages for context
+    recent_messages = history[-max_messages:]
+    formatted_history = []
+    for msg in recent_messages:
+        role = "User" if msg['role'] == 'user' else "Assistant"
+        formatted_history.append(f"{role}: {msg['content']}")
+    return "\n".join(formatted_history)
+
+def build_query_messages(dochub_context, user_question, chat_history=None):
+    """Build the chat messages for a DocHub question from packed DocHub context."""
+    system_prompt = """You are a helpful research assistant that provides comprehensive answers using internal documentation. 
+    Base your responses on the provided DocHub sources and maintain consistency with previous conversation context."""
+
+    # Format chat history if available
+    chat_context = format_chat_history(chat_history) if chat_history else ""
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": f"DocHub Sources:\n{dochub_context}" if dochub_context else "No DocHub sources available."}
+    ]
+
+    # Add chat history context if available
+    if chat_context:
+        messages.append({
+            "role": "system",
+            "content": f"Previous conversation context:\n{chat_context}"
+        })
+
+    # Add the current user question
+    messages.append({"role": "user", "content": user_question})
+    return messages
+
+def format_dochub_sources(dochub_texts):
+    """Format DocHub sources concisely for the end of an answer."""
+    dochub_sources = [
+        f"{text[:50]}..." for text in dochub_texts[:3]
+    ] if dochub_texts else []
+    if not dochub_sources:
+        return ""
+    return "\n\nDOCHUB_SOURCES:\n" + "\n".join(dochub_sources)
+
+QUERY_ERROR_MESSAGE = "I apologize, but I encountered an error processing your request. Please try a more specific question or break it into smaller parts."
+
+def packed_context(dochub_texts, context=None):
+    """Context packed by the caller, or packed here from texts in rank order."""
+    if context is not None:
+        return context
+    return pack_context([{"text": text, "score": 1.0 / (rank + 1)} for rank, text in enumerate(dochub_texts or [])])["context"]
+
+def query_llm(dochub_texts, user_question, chat_history=None, context=None):
+    """
+    Answer a question from DocHub texts. Pass `context` when the retrieved matches have
+    already been packed with app.context_packing.pack_context.
+    """
     try:
-        system_prompt = """You are a helpful research assistant that provides comprehensive answers using internal documentation. 
-        Base your responses on the provided DocHub sources and maintain consistency with previous conversation context."""
-
-        # Function to prepare chat history context
-        def format_chat_history(history, max_messages=5):
-            if not history:
-                return ""
-            # Take the last few messages for context
-            recent_messages = history[-max_messages:]
-            formatted_history = []
-            for msg in recent_messages:
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                formatted_history.append(f"{role}: {msg['content']}")
-            return "\n".join(formatted_history)
-
-        # Function to truncate context while preserving meaning
-        def prepare_context(texts, max_chars=2000):
-            if not texts:
-                return ""
-            context = []
-            total_chars = 0
-            for text in texts:
-                if total_chars + len(text) > max_chars:
-                    remaining = max_chars - total_chars
-                    if remaining > 100:
-                        context.append(text[:remaining] + "...")
-                    break
-                context.append(text)
-                total_chars += len(text)
-            return "\n\n".join(context)
-
-        # Process DocHub content with limits
-        dochub_context = prepare_context(dochub_texts, max_chars=2000)
-        
-        # Format chat history if available
-        chat_context = format_chat_history(chat_history) if chat_history else ""
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": f"DocHub Sources:\n{dochub_context}" if dochub_context else "No DocHub sources available."}
-        ]
-
-        # Add chat history context if available
-        if chat_context:
-            messages.append({
-                "role": "system",
-                "content": f"Previous conversation context:\n{chat_context}"
-            })
-
-        # Add the current user question
-        messages.append({"role": "user", "content": user_question})
+        messages = build_query_messages(packed_context(dochub_texts, context), user_question, chat_history)
 
         # Query the OpenAI model (GPT-5-mini for faster responses)
         response = client.chat.completions.create(
-            model="gpt-5-mini",
+            model=QUERY_MODEL,
             messages=messages,
-            max_completion_tokens=5000
+            max_completion_tokens=QUERY_MAX_COMPLETION_TOKENS
         )
 
-        # Format DocHub sources concisely
-        dochub_sources = [
-            f"{text[:50]}..." for text in dochub_texts[:3]
-        ] if dochub_texts else []
-
         # Combine response with sources
         main_response = response.choices[0].message.content.strip()
-        
-        if dochub_sources:
-            main_response += "\n\nDOCHUB_SOURCES:\n" + "\n".join(dochub_sources)
-
-        return main_response
+        return main_response + format_dochub_sources(dochub_texts)
 
     except Exception as e:
         logging.error(f"Error in DocHub query: {str(e)}")
-        return "I apologize, but I encountered an error processing your request. Please try a more specific question or break it into smaller parts."
+        return QUERY_ERROR_MESSAGE
+
+def stream_query_llm(dochub_texts, user_question, chat_history=None, context=None):
+    """
+    Streaming variant of query_llm.
+    Yields answer text as the completion arrives, followed by the DocHub sources suffix.
+    """
+    try:
+        messages = build_query_messages(packed_context(dochub_texts, context), user_question, chat_history)
+
+        stream = client.chat.completions.create(
+            model=QUERY_MODEL,
+            messages=messages,
+            max_completion_tokens=QUERY_MAX_COMPLETION_TOKENS,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+        sources = format_dochub_sources(dochub_texts)
+        if sources:
+            yield sources
+
+    except Exception as e:
+        logging.error(f"Error in streaming DocHub query: {str(e)}")
+        yield QUERY_ERROR_MESSAGE
 
 def check_quality_with_llm(text):
     try:
@@ -112,10 +158,11 @@ def check_quality_with_llm(text):
         ]
 
         # Query the model (GPT-5-mini with only supported parameters)
+        qa_rate_limiter.acquire(len(tokenizer.encode(text)) + QA_MAX_COMPLETION_TOKENS)
         response = client.chat.completions.create(
-            model="gpt-5-mini",
+            model=QA_MODEL,
             messages=messages,
-            max_completion_tokens=3000
+            max_completion_tokens=QA_MAX_COMPLETION_TOKENS
         )
 
         # Extract and return the improved text
@@ -125,39 +172,55 @@ def check_quality_with_llm(text):
         logging.error(f"Error in check_quality_with_llm: {str(e)}")
         return text  # Return original text if processing fails
 
+def review_chunks(chunks, max_workers=QA_CONCURRENCY):
+    """
+    Review `chunks` with check_quality_with_llm concurrently, paced by the QA rate limiter.
+    Yields (index, revised_text) as each review finishes, so callers can stream results and
+    put them back in order by index.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(check_quality_with_llm, chunk): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Drop reviews that haven't started if the consumer stops early (e.g. the client disconnected)
+        executor.shutdown(wait=False, cancel_futures=True)
+
 class SourceSummaryHandler:
     def __init__(self):
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
         self.max_chunk_tokens = 4000  # Safe limit for input tokens
-        self.delay_between_calls = 3.0  # Delay between API calls to respect rate limits
+        self.max_workers = SUMMARY_CONCURRENCY  # Summarization calls in flight at once
+        self.rate_limiter = summary_rate_limiter  # Paces calls to the account's RPM/TPM limits
 
     def count_tokens(self, text: str) -> int:
         """Count the number of tokens in a text string."""
         return len(self.tokenizer.encode(text))
 
-    def split_text_into_chunks(self, text: str) -> List[str]:
-        """Split text into chunks that respect token limits."""
-        chunks = []
-        paragraphs = text.split('\n')
+    def iter_text_chunks(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        """Group paragraphs (lines) into chunks that respect token limits, reading them lazily."""
         current_chunk = []
         current_length = 0
-        
+
         for paragraph in paragraphs:
             paragraph_tokens = self.count_tokens(paragraph)
-            
+
             if current_length + paragraph_tokens <= self.max_chunk_tokens:
                 current_chunk.append(paragraph)
                 current_length += paragraph_tokens
             else:
                 if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
+                    yield '\n'.join(current_chunk)
                 current_chunk = [paragraph]
                 current_length = paragraph_tokens
-        
+
         if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-        
-        return chunks
+            yield '\n'.join(current_chunk)
+
+    def split_text_into_chunks(self, text: str) -> List[str]:
+        """Split text into chunks that respect token limits."""
+        return list(self.iter_text_chunks(text.split('\n')))
 
     def summarize_chunk(self, chunk: str, category: str) -> Optional[str]:
         """Summarize a single chunk of text."""
@@ -176,8 +239,9 @@ class SourceSummaryHandler:
                 {"role": "user", "content": chunk}
             ]
 
+            self.rate_limiter.acquire(self.count_tokens(chunk) + 1000)
             response = client.chat.completions.create(
-                model="gpt-5-nano",  # Using gpt-5-nano for efficient summarization
+                model=SUMMARY_MODEL,  # Using gpt-5-nano for efficient summarization
                 messages=messages,
                 max_completion_tokens=1000
             )
@@ -215,8 +279,9 @@ class SourceSummaryHandler:
                 {"role": "user", "content": combined_text}
             ]
 
+            self.rate_limiter.acquire(self.count_tokens(combined_text) + 2000)
             response = client.chat.completions.create(
-                model="gpt-5-nano",
+                model=SUMMARY_MODEL,
                 messages=messages,
                 max_completion_tokens=2000
             )
@@ -225,25 +290,70 @@ class SourceSummaryHandler:
             logging.error(f"Error combining summaries: {str(e)}")
             return combined_text
 
+    def group_summaries(self, summaries: List[str]) -> List[List[str]]:
+        """Group consecutive summaries so each group fits in one combine prompt."""
+        groups = []
+        current_group = []
+        current_length = 0
+
+        for summary in summaries:
+            summary_tokens = self.count_tokens(summary)
+            # Always pair at least two summaries so every level shrinks the list
+            if len(current_group) >= 2 and current_length + summary_tokens > self.max_chunk_tokens:
+                groups.append(current_group)
+                current_group = []
+                current_length = 0
+            current_group.append(summary)
+            current_length += summary_tokens
+
+        if current_group:
+            groups.append(current_group)
+        return groups
+
+    def reduce_summaries(self, summaries: List[str], category: str) -> str:
+        """Combine summaries as a tree so long documents never overflow the combine prompt."""
+        level = 0
+        while len(summaries) > 1:
+            groups = self.group_summaries(summaries)
+            if len(groups) == 1:
+                return self.combine_summaries(groups[0], category)
+
+            level += 1
+            logging.info(f"Reduce level {level}: combining {len(summaries)} summaries in {len(groups)} groups")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                summaries = list(executor.map(lambda group: self.combine_summaries(group, category), groups))
+
+        return summaries[0]
+
+    def summarize_chunks(self, chunks: Iterable[str], category: str) -> Iterator[Optional[str]]:
+        """
+        Summarize chunks concurrently, in order. Only a few chunks are pulled ahead of the
+        calls in flight, so a lazily read document is never held in memory whole.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(self.summarize_chunk, chunk, category))
+            while pending:
+                yield pending.popleft().result()
+
     def generate_summary(self, text: str, category: str) -> str:
         """Main method to handle the complete summarization process."""
+        return self.generate_summary_from_paragraphs(text.split('\n'), category)
+
+    def generate_summary_from_paragraphs(self, paragraphs: Iterable[str], category: str) -> str:
+        """Summarize a document read as an iterable of paragraphs (lines), e.g. a file."""
         try:
-            # Split text into manageable chunks
-            chunks = self.split_text_into_chunks(text)
-            logging.info(f"Split text into {len(chunks)} chunks")
-
-            # Summarize each chunk with delay between API calls
-            chunk_summaries = []
-            for i, chunk in enumerate(chunks):
-                logging.info(f"Processing chunk {i+1}/{len(chunks)}")
-                summary = self.summarize_chunk(chunk, category)
-                if summary:
-                    chunk_summaries.append(summary)
-                time.sleep(self.delay_between_calls)  # Rate limiting delay
+            # Summarize manageable chunks concurrently; the rate limiter paces the calls
+            results = list(self.summarize_chunks(self.iter_text_chunks(paragraphs), category))
+            chunk_summaries = [summary for summary in results if summary]
+            logging.info(f"Summarized {len(chunk_summaries)}/{len(results)} chunks")
 
             # If we have multiple summaries, combine them
             if len(chunk_summaries) > 1:
-                final_summary = self.combine_summaries(chunk_summaries, category)
+                final_summary = self.reduce_summaries(chunk_summaries, category)
             elif chunk_summaries:
                 final_summary = chunk_summaries[0]
             else:
@@ -265,6 +375,16 @@ def generate_source_summary(text: str, category: str) -> str:
         logging.error(f"Error generating summary: {str(e)}")
         return f"Error generating summary: {str(e)}"
 
+def generate_file_summary(path: str, category: str) -> str:
+    """Summarize a text file, reading it in chunk-sized windows rather than all at once."""
+    handler = SourceSummaryHandler()
+    try:
+        with open(path) as f:
+            return handler.generate_summary_from_paragraphs((line.rstrip('\n') for line in f), category)
+    except Exception as e:
+        logging.error(f"Error generating summary: {str(e)}")
+        return f"Error generating summary: {str(e)}"
+
 # Helper function for error handling
 def handle_llm_error(error, context=""):
     logging.error(f"LLM Error in {context}: {str(error)}")
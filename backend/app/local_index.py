@@ -0,0 +1,327 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+import numpy as np
+
+# Local vector index configuration
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() == "true"
+LOCAL_INDEX_SERVE_QUERIES = os.getenv("LOCAL_INDEX_SERVE_QUERIES", "true").lower() == "true"
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float16")  # float16 or int8
+LOCAL_INDEX_DIMENSION = 1536
+# Opt-in: decode each worker's view to float32 in RAM (~6KB per vector, 2-4x the float16/int8 mmap, held by every
+# worker and re-decoded on every version change) for faster BLAS search than block-scanning the mmap
+LOCAL_INDEX_RESIDENT = os.getenv("LOCAL_INDEX_RESIDENT", "false").lower() == "true"
+SEARCH_BLOCK_ROWS = 8192  # Rows scored per block so queries don't materialize a float32 copy of the matrix
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of Pinecone namespaces for brute-force cosine search.
+
+    Each namespace is a memory-mapped matrix of normalized vectors (float16, or int8 with a
+    per-row scale) in `directory`. Ids, metadata and row allocation live in SQLite so every
+    gunicorn worker shares one copy; a per-namespace version tells workers when to remap.
+    With `resident`, each worker searches a float32 copy of its view rather than the mmap.
+    """
+
+    def __init__(self, directory=LOCAL_INDEX_DIR, dimension=LOCAL_INDEX_DIMENSION, dtype=LOCAL_INDEX_DTYPE,
+                 resident=LOCAL_INDEX_RESIDENT):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported local index dtype: {dtype}")
+        self.directory = directory
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.resident = resident
+        self.views = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vectors (
+                    namespace TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    metadata TEXT NOT NULL,
+                    PRIMARY KEY (namespace, id)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS free_rows (
+                    namespace TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, row)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS namespaces (
+                    namespace TEXT PRIMARY KEY,
+                    row_count INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    synced_at REAL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _matrix_path(self, namespace):
+        return os.path.join(self.directory, f"{namespace}.{self.dtype.name}")
+
+    def _scales_path(self, namespace):
+        return os.path.join(self.directory, f"{namespace}.scales")
+
+    def _namespace_state(self, conn, namespace):
+        row = conn.execute(
+            "SELECT row_count, version, synced_at FROM namespaces WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row if row else (0, 0, None)
+
+    def _open(self, path, dtype, rows, columns=None, mode='r'):
+        shape = (rows, columns) if columns else (rows,)
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _ensure_capacity(self, path, dtype, rows, columns=1):
+        needed = rows * columns * np.dtype(dtype).itemsize
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < needed:
+            # Grow geometrically so appends don't resize the file every time
+            with open(path, 'ab') as f:
+                f.truncate(max(needed, 2 * size))
+
+    def _encode(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype == np.int8:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(np.float16), None
+
+    def upsert(self, namespace, vectors):
+        """Insert or overwrite (id, values, metadata) vectors."""
+        if not vectors:
+            return
+        encoded, scales = self._encode([values for _, values, _ in vectors])
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # Serializes row allocation across workers
+            row_count, version, synced_at = self._namespace_state(conn, namespace)
+            free = [r for (r,) in conn.execute(
+                "SELECT row FROM free_rows WHERE namespace = ? ORDER BY row", (namespace,))]
+
+            rows = []
+            for vector_id, _, metadata in vectors:
+                existing = conn.execute(
+                    "SELECT row FROM vectors WHERE namespace = ? AND id = ?", (namespace, vector_id)
+                ).fetchone()
+                if existing:
+                    row = existing[0]
+                elif free:
+                    row = free.pop(0)
+                    conn.execute("DELETE FROM free_rows WHERE namespace = ? AND row = ?", (namespace, row))
+                else:
+                    row = row_count
+                    row_count += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO vectors (namespace, id, row, metadata) VALUES (?, ?, ?, ?)",
+                    (namespace, vector_id, row, json.dumps(metadata or {}))
+                )
+                rows.append(row)
+
+            self._ensure_capacity(self._matrix_path(namespace), self.dtype, row_count, self.dimension)
+            matrix = self._open(self._matrix_path(namespace), self.dtype, row_count, self.dimension, mode='r+')
+            matrix[rows] = encoded
+            matrix.flush()
+            if scales is not None:
+                self._ensure_capacity(self._scales_path(namespace), np.float32, row_count)
+                row_scales = self._open(self._scales_path(namespace), np.float32, row_count, mode='r+')
+                row_scales[rows] = scales
+                row_scales.flush()
+
+            conn.execute('''
+                INSERT OR REPLACE INTO namespaces (namespace, row_count, version, synced_at) VALUES (?, ?, ?, ?)
+            ''', (namespace, row_count, version + 1, synced_at))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def delete(self, namespace, vector_ids):
+        if not vector_ids:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row_count, version, synced_at = self._namespace_state(conn, namespace)
+            for vector_id in vector_ids:
+                existing = conn.execute(
+                    "SELECT row FROM vectors WHERE namespace = ? AND id = ?", (namespace, vector_id)
+                ).fetchone()
+                if existing:
+                    conn.execute("DELETE FROM vectors WHERE namespace = ? AND id = ?", (namespace, vector_id))
+                    conn.execute("INSERT OR IGNORE INTO free_rows (namespace, row) VALUES (?, ?)",
+                                 (namespace, existing[0]))
+            conn.execute('''
+                INSERT OR REPLACE INTO namespaces (namespace, row_count, version, synced_at) VALUES (?, ?, ?, ?)
+            ''', (namespace, row_count, version + 1, synced_at))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def ids(self, namespace):
+        conn = self._connect()
+        try:
+            return [vector_id for (vector_id,) in conn.execute(
+                "SELECT id FROM vectors WHERE namespace = ?", (namespace,))]
+        finally:
+            conn.close()
+
+    def mark_synced(self, namespace, synced_at):
+        """Record that the namespace fully mirrors Pinecone as of `synced_at`."""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT INTO namespaces (namespace, synced_at) VALUES (?, ?)
+                ON CONFLICT(namespace) DO UPDATE SET synced_at = excluded.synced_at
+            ''', (namespace, synced_at))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_unsynced(self, namespace):
+        """Record that the namespace may have missed a write, so it no longer serves queries until re-synced."""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE namespaces SET synced_at = NULL WHERE namespace = ?", (namespace,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def is_synced(self, namespace):
+        conn = self._connect()
+        try:
+            return self._namespace_state(conn, namespace)[2] is not None
+        finally:
+            conn.close()
+
+    def _view(self, namespace):
+        """This worker's mapping of a namespace, reloaded when another write has bumped its version."""
+        conn = self._connect()
+        try:
+            row_count, version, _ = self._namespace_state(conn, namespace)
+            with self._lock:
+                view = self.views.get(namespace)
+                if view and view['version'] == version:
+                    return view
+            row_ids = [None] * row_count
+            for vector_id, row in conn.execute("SELECT id, row FROM vectors WHERE namespace = ?", (namespace,)):
+                row_ids[row] = vector_id
+        finally:
+            conn.close()
+
+        view = {'version': version, 'row_ids': row_ids, 'matrix': None, 'scales': None}
+        if row_count:
+            view['valid'] = np.array([vector_id is not None for vector_id in row_ids])
+            view['matrix'] = self._open(self._matrix_path(namespace), self.dtype, row_count, self.dimension)
+            if self.dtype == np.int8:
+                view['scales'] = self._open(self._scales_path(namespace), np.float32, row_count)
+            if self.resident:
+                matrix = np.asarray(view['matrix'], dtype=np.float32)
+                if view['scales'] is not None:
+                    matrix *= view['scales'][:, None]
+                view['matrix'], view['scales'] = matrix, None
+        with self._lock:
+            self.views[namespace] = view
+        return view
+
+    def query(self, namespace, embedding, top_k=10):
+        """Return the `top_k` most similar vectors as dicts with id, score and their metadata."""
+        view = self._view(namespace)
+        if view['matrix'] is None:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        matrix = view['matrix']
+        if matrix.dtype == np.float32:
+            scores = matrix @ query
+        else:
+            scores = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+                block = matrix[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+                scores[start:start + len(block)] = block @ query
+        if view['scales'] is not None:
+            scores *= view['scales']
+        scores[~view['valid']] = -np.inf
+
+        top_k = min(top_k, int(view['valid'].sum()))
+        if top_k <= 0:
+            return []
+        top_rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+        ids = [view['row_ids'][row] for row in top_rows]
+        conn = self._connect()
+        try:
+            placeholders = ','.join('?' * len(ids))
+            metadata = dict(conn.execute(
+                f"SELECT id, metadata FROM vectors WHERE namespace = ? AND id IN ({placeholders})",
+                (namespace, *ids)
+            ).fetchall())
+        finally:
+            conn.close()
+
+        return [
+            {"id": vector_id, "score": float(scores[row]), **json.loads(metadata[vector_id])}
+            for vector_id, row in zip(ids, top_rows)
+            if vector_id in metadata  # Deleted since this worker's view was loaded
+        ]
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            namespaces = conn.execute('''
+                SELECT n.namespace, n.row_count, n.version, n.synced_at,
+                       (SELECT COUNT(*) FROM vectors v WHERE v.namespace = n.namespace)
+                FROM namespaces n
+            ''').fetchall()
+        finally:
+            conn.close()
+        return {
+            "enabled": True,
+            "dtype": self.dtype.name,
+            "serve_queries": LOCAL_INDEX_SERVE_QUERIES,
+            "namespaces": {
+                namespace: {"vectors": vectors, "rows": row_count, "version": version, "synced_at": synced_at}
+                for namespace, row_count, version, synced_at, vectors in namespaces
+            }
+        }
+
+
+local_index = None
+if LOCAL_INDEX_ENABLED:
+    try:
+        local_index = LocalVectorIndex()
+    except Exception as e:
+        logging.error(f"Error initializing local vector index, continuing without it: {str(e)}")
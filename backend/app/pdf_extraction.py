@@ -0,0 +1,72 @@
+import os
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+# PDF extraction configuration
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))  # Pages parsed per worker task
+PDF_PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "64"))  # Max pages parsed but not yet consumed
+PDF_PARALLEL_MIN_PAGES = 16  # Smaller files aren't worth the process hand-off
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Shared process pool, created on first use. Spawned workers avoid forking a threaded server."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _extract_pages(file_path, start, end):
+    """Worker task: extract the text of pages [start, end)."""
+    reader = PyPDF2.PdfReader(file_path)
+    return [reader.pages[page_num].extract_text() or "" for page_num in range(start, end)]
+
+
+def iter_pdf_pages(file_path, parallel=True):
+    """
+    Yield the text of each PDF page in order as soon as it is parsed.
+    Large files are parsed across a process pool, with at most PDF_PAGE_WINDOW pages
+    parsed ahead of the consumer so memory stays bounded.
+    """
+    reader = PyPDF2.PdfReader(file_path)
+    page_count = len(reader.pages)
+
+    if not parallel or PDF_EXTRACTION_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+    del reader
+
+    pool = _get_pool()
+    ranges = deque(
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    )
+    max_tasks_in_flight = max(1, PDF_PAGE_WINDOW // PDF_PAGES_PER_TASK)
+    in_flight = deque()
+
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_tasks_in_flight:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(_extract_pages, file_path, start, end))
+            # Consume in submission order so pages stay in document order
+            for page_text in in_flight.popleft().result():
+                yield page_text
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    logging.debug(f"Extracted {page_count} pages from {file_path} with {PDF_EXTRACTION_WORKERS} workers")
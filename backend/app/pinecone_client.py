@@ -1,9 +1,16 @@
 import os
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
-from app.scraping import get_embedding
+from app.scraping import get_embedding, get_embeddings
+from app.answer_cache import answer_cache
+import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+from app.rate_limit import AdaptiveBackoff
+from app.local_index import local_index, LOCAL_INDEX_SERVE_QUERIES
+from app.keyword_index import keyword_index
+from app.chunk_store import chunk_store
 
 # Load environment variables
 load_dotenv()
@@ -26,89 +33,379 @@ if index_name not in pc.list_indexes().names():
 # Connect to the Pinecone index
 index = pc.Index(index_name)
 
-def store_in_pinecone(source_id, chunks, namespace="global_knowledge_base", batch_size=10):
+# Upsert configuration
+PINECONE_MAX_REQUEST_BYTES = 2 * 1024 * 1024 * 9 // 10  # Stay under Pinecone's 2MB request limit
+PINECONE_MAX_REQUEST_VECTORS = 1000  # Pinecone's per-request vector limit
+PINECONE_UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4"))  # Requests in flight at once
+PINECONE_UPSERT_RETRIES = int(os.getenv("PINECONE_UPSERT_RETRIES", "5"))
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+upsert_backoff = AdaptiveBackoff()
+
+# Hybrid retrieval: dense and keyword rankings are merged with reciprocal rank fusion
+RRF_K = 60
+
+def _is_retryable(error):
+    """Throttling and transient server errors are worth retrying; anything else is not."""
+    return getattr(error, 'status', None) in RETRYABLE_STATUSES
+
+
+def _pack_upsert_requests(vectors, max_bytes=PINECONE_MAX_REQUEST_BYTES, max_vectors=PINECONE_MAX_REQUEST_VECTORS):
+    """Group (id, values, metadata) vectors into requests under Pinecone's payload limits."""
+    requests = []
+    current = []
+    current_bytes = 0
+    for vector in vectors:
+        vector_id, values, metadata = vector
+        # Estimated JSON size: ids and metadata as encoded, ~20 bytes per float value
+        size = len(vector_id) + len(json.dumps(metadata)) + 20 * len(values)
+        if current and (current_bytes + size > max_bytes or len(current) >= max_vectors):
+            requests.append(current)
+            current = []
+            current_bytes = 0
+        current.append(vector)
+        current_bytes += size
+    if current:
+        requests.append(current)
+    return requests
+
+
+def _upsert_request(vectors, namespace):
+    """Upsert one request's vectors, backing off while Pinecone is throttling. Returns the stored ids."""
+    for attempt in range(PINECONE_UPSERT_RETRIES + 1):
+        upsert_backoff.wait()
+        try:
+            index.upsert(vectors=vectors, namespace=namespace)
+            upsert_backoff.succeeded()
+            return [vector[0] for vector in vectors]
+        except Exception as e:
+            if _is_retryable(e) and attempt < PINECONE_UPSERT_RETRIES:
+                upsert_backoff.throttled()
+                logging.warning(f"Pinecone upsert throttled, retrying (attempt {attempt + 1}): {str(e)}")
+                continue
+            logging.error(f"Error during Pinecone batch upsert: {str(e)}")
+            break
+
+    if len(vectors) == 1:
+        return []
+    # Salvage what we can from a request that was rejected outright
+    stored_ids = []
+    for vector in vectors:
+        try:
+            index.upsert(vectors=[vector], namespace=namespace)
+            stored_ids.append(vector[0])
+        except Exception as e:
+            logging.error(f"Error upserting individual vector: {str(e)}")
+    return stored_ids
+
+
+def store_in_pinecone(source_id, chunks, namespace="global_knowledge_base", embeddings=None, start_index=0,
+                      max_concurrency=PINECONE_UPSERT_CONCURRENCY):
     """
-    Store embeddings and text metadata in Pinecone for each chunk with batching.
+    Store embeddings and metadata in Pinecone for each chunk. The chunk text goes to the
+    chunk store when it is enabled, and into the vector metadata otherwise.
+    Chunks are strings, or dicts from app.chunking.iter_chunks whose character offsets are
+    stored alongside the text. Vector ids are `<source_id>_chunk_<n>` where n is the chunk's
+    index in the whole document, so pass `start_index` when `chunks` is a later window of it.
+    Pass `embeddings` when they have already been generated for `chunks`.
+    Returns the ids of the vectors that were upserted.
     """
-    vectors_to_upsert = []
-    
+    stored_ids = []
+
     try:
-        for i, chunk in enumerate(chunks):
-            try:
-                # Generate embedding for the chunk
-                embedding = get_embedding(chunk)
-                if embedding is None:
-                    logging.error(f"Failed to generate embedding for chunk {i}. Skipping.")
-                    continue
-
-                # Add to batch
-                vector_id = f"{source_id}_chunk_{i}"
-                metadata = {"text": chunk}
-                vectors_to_upsert.append((vector_id, embedding, metadata))
-
-                # If batch is full or this is the last chunk, upsert
-                if len(vectors_to_upsert) >= batch_size or i == len(chunks) - 1:
-                    try:
-                        response = index.upsert(vectors=vectors_to_upsert, namespace=namespace)
-                        logging.debug(f"Upserted batch of {len(vectors_to_upsert)} vectors")
-                        vectors_to_upsert = []  # Clear the batch
-                        time.sleep(0.5)  # Add slight delay between batches
-                    except Exception as e:
-                        logging.error(f"Error during Pinecone batch upsert: {str(e)}")
-                        # If batch fails, try individual upserts
-                        for vector in vectors_to_upsert:
-                            try:
-                                index.upsert([vector], namespace=namespace)
-                                time.sleep(0.5)
-                            except Exception as ve:
-                                logging.error(f"Error upserting individual vector: {str(ve)}")
-                        vectors_to_upsert = []
+        # Generate all embeddings up front with batched, concurrent requests
+        if embeddings is None:
+            embeddings = get_embeddings([chunk_metadata(chunk)["text"] for chunk in chunks])
 
-            except Exception as e:
-                logging.error(f"Error processing chunk {i}: {str(e)}")
+        vectors = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+            if embedding is None:
+                logging.error(f"Failed to generate embedding for chunk {start_index + i}. Skipping.")
                 continue
+            vectors.append((f"{source_id}_chunk_{start_index + i}", embedding,
+                            {**chunk_metadata(chunk), "source_id": source_id}))
+
+        # Texts must be in the chunk store before their vectors can be returned by a query
+        remote_vectors = vectors
+        if chunk_store is not None:
+            try:
+                chunk_store.put_many(namespace, [(vector_id, metadata["text"]) for vector_id, _, metadata in vectors])
+                remote_vectors = [
+                    (vector_id, values, {key: value for key, value in metadata.items() if key != "text"})
+                    for vector_id, values, metadata in vectors
+                ]
+            except Exception as e:
+                logging.error(f"Error writing chunk store, keeping text in Pinecone metadata: {str(e)}")
+
+        requests = _pack_upsert_requests(remote_vectors)
+        if requests:
+            started = time.monotonic()
+            workers = max(1, min(max_concurrency, len(requests)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for ids in executor.map(lambda request: _upsert_request(request, namespace), requests):
+                    stored_ids.extend(ids)
+            elapsed = time.monotonic() - started
+            logging.debug(f"Upserted {len(stored_ids)} vectors in {len(requests)} requests "
+                          f"({len(stored_ids) / elapsed if elapsed else 0:.1f} vectors/sec)")
+
+            stored = set(stored_ids)
+            mirror_to_local_indexes('upsert', namespace, [vector for vector in vectors if vector[0] in stored])
 
     except Exception as e:
         logging.error(f"Error in store_in_pinecone: {str(e)}")
-        # Try to upsert any remaining vectors
-        if vectors_to_upsert:
+
+    invalidate_cached_answers(namespace)
+    logging.debug("Completed storing chunks in Pinecone.")
+    return stored_ids
+
+def chunk_metadata(chunk):
+    """A chunk's text, plus its source and offsets when known for highlighting."""
+    if isinstance(chunk, str):
+        return {"text": chunk}
+    return {key: chunk[key] for key in ("text", "source_id", "start_char", "end_char") if key in chunk}
+
+def attach_chunk_texts(namespace, matches):
+    """
+    Fill in the text of matches whose vectors don't carry it, in one chunk store lookup.
+    Texts the store doesn't have are fetched from the vectors' Pinecone metadata and copied
+    into the store; matches with no text anywhere are dropped and need re-ingesting.
+    """
+    missing = [match['id'] for match in matches if 'text' not in match]
+    texts = {}
+    if missing and chunk_store is not None:
+        try:
+            texts = chunk_store.get_many(namespace, missing)
+        except Exception as e:
+            logging.error(f"Error reading chunk store: {str(e)}")
+    unresolved = [vector_id for vector_id in missing if vector_id not in texts]
+    if unresolved:
+        try:
+            response = index.fetch(ids=unresolved, namespace=namespace)
+            fetched = {
+                vector_id: vector.metadata['text']
+                for vector_id, vector in response.vectors.items()
+                if vector.metadata and 'text' in vector.metadata
+            }
+        except Exception as e:
+            logging.error(f"Error fetching chunk texts from Pinecone: {str(e)}")
+            fetched = {}
+        if fetched and chunk_store is not None:
             try:
-                index.upsert(vectors=vectors_to_upsert, namespace=namespace)
+                chunk_store.put_many(namespace, list(fetched.items()))
             except Exception as e:
-                logging.error(f"Error upserting final batch: {str(e)}")
-                
-    logging.debug("Completed storing chunks in Pinecone.")
+                logging.error(f"Error writing chunk store: {str(e)}")
+        texts.update(fetched)
+        lost = len(unresolved) - len(fetched)
+        if lost:
+            logging.warning(f"{lost} matches in namespace {namespace} have no stored text; re-ingest their sources")
+    for match in matches:
+        if match['id'] in texts:
+            match['text'] = texts[match['id']]
+    return [match for match in matches if 'text' in match]
 
-def query_pinecone(user_query, namespace="global_knowledge_base"):
+def _local_indexes():
+    return [local for local in (local_index, keyword_index) if local is not None]
+
+def mirror_to_local_indexes(operation, namespace, items):
     """
-    Query the Pinecone index for the most similar vectors to the user query.
+    Apply a Pinecone write to the enabled local indexes. Mirror failures never fail the write;
+    the index is marked unsynced instead, so queries go to Pinecone until /local-index/sync runs.
+    """
+    if not items:
+        return
+    for local in _local_indexes():
+        try:
+            getattr(local, operation)(namespace, items)
+        except Exception as e:
+            logging.error(f"Error mirroring {operation} to {type(local).__name__}, "
+                          f"marking namespace {namespace} unsynced: {str(e)}")
+            try:
+                local.mark_unsynced(namespace)
+            except Exception as e:
+                logging.error(f"Error marking {type(local).__name__} unsynced: {str(e)}")
+
+def invalidate_cached_answers(namespace):
+    """Answers cached for a namespace may no longer reflect its contents after a write."""
+    if answer_cache is not None:
+        try:
+            answer_cache.invalidate(namespace)
+        except Exception as e:
+            logging.error(f"Error invalidating answer cache: {str(e)}")
+
+def list_vector_ids(prefix, namespace="global_knowledge_base"):
+    """List the ids of all vectors in a namespace that start with `prefix`."""
+    vector_ids = []
+    for page in index.list(prefix=prefix, namespace=namespace):
+        vector_ids.extend(page)
+    return vector_ids
+
+def delete_from_pinecone(vector_ids, namespace="global_knowledge_base", batch_size=1000):
+    """Delete vectors by id in batches."""
+    if not vector_ids:
+        return
+    for i in range(0, len(vector_ids), batch_size):
+        index.delete(ids=vector_ids[i:i + batch_size], namespace=namespace)
+    logging.debug(f"Deleted {len(vector_ids)} vectors from namespace {namespace}")
+    mirror_to_local_indexes('delete', namespace, vector_ids)
+    if chunk_store is not None:
+        try:
+            chunk_store.delete(namespace, vector_ids)
+        except Exception as e:
+            logging.error(f"Error deleting from chunk store: {str(e)}")
+    invalidate_cached_answers(namespace)
+
+def sync_local_index(namespace="global_knowledge_base", fetch_batch_size=100):
+    """
+    Copy every vector in a namespace from Pinecone into the local vector and keyword indexes
+    and drop local entries Pinecone no longer has. Once synced, writes keep them current.
+    """
+    targets = _local_indexes()
+    if not targets:
+        raise ValueError("No local index is enabled")
+
+    started_at = time.time()
+    remote_ids = list_vector_ids(None, namespace=namespace)
+    for i in range(0, len(remote_ids), fetch_batch_size):
+        response = index.fetch(ids=remote_ids[i:i + fetch_batch_size], namespace=namespace)
+        vectors = [
+            (vector_id, vector.values, vector.metadata or {})
+            for vector_id, vector in response.vectors.items()
+        ]
+        texts = {}
+        if chunk_store is not None:
+            texts = chunk_store.get_many(namespace, [vector_id for vector_id, _, metadata in vectors
+                                                     if 'text' not in metadata])
+        vectors = [
+            (vector_id, values, {**metadata, "text": texts[vector_id]} if vector_id in texts else metadata)
+            for vector_id, values, metadata in vectors
+            if 'text' in metadata or vector_id in texts
+        ]
+        for local in targets:
+            local.upsert(namespace, vectors)
+
+    removed = 0
+    for local in targets:
+        stale = sorted(set(local.ids(namespace)) - set(remote_ids))
+        local.delete(namespace, stale)
+        removed += len(stale)
+    for local in targets:
+        local.mark_synced(namespace, started_at)
+    logging.info(f"Synced {len(remote_ids)} vectors from namespace {namespace} into the local indexes")
+    return {"namespace": namespace, "vectors": len(remote_ids), "removed": removed}
+
+def run_local_index_sync(payload, progress):
+    """Job handler for /local-index/sync."""
+    return progress.run('sync', sync_local_index, payload.get('namespace', "global_knowledge_base"))
+
+def query_local_index(namespace, query_embedding, top_k=10, require_synced=False):
+    """Matches from the local index, or None when it can't answer for this namespace."""
+    if local_index is None:
+        return None
+    try:
+        if require_synced and not local_index.is_synced(namespace):
+            return None
+        matches = local_index.query(namespace, query_embedding, top_k=top_k)
+        return [
+            {"id": match['id'], "score": match['score'], **chunk_metadata(match)}
+            for match in matches
+            if 'text' in match
+        ] or None
+    except Exception as e:
+        logging.error(f"Error querying local index: {str(e)}")
+        return None
+
+def fuse_rankings(rankings, top_k=10, k=RRF_K):
+    """Reciprocal rank fusion: score each match by the sum of 1 / (k + rank) over the rankings it appears in."""
+    fused = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, start=1):
+            entry = fused.setdefault(match['id'], {**match, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda match: match["score"], reverse=True)[:top_k]
+
+def query_keyword_index(namespace, user_query, top_k=10):
+    """BM25 matches, or [] when the keyword index hasn't been fully synced for this namespace."""
+    if keyword_index is None:
+        return []
+    try:
+        if not keyword_index.is_synced(namespace):
+            return []
+        return [
+            {"id": match['id'], "score": match['score'], **chunk_metadata(match)}
+            for match in keyword_index.search(namespace, user_query, top_k=top_k)
+        ]
+    except Exception as e:
+        logging.error(f"Error querying keyword index: {str(e)}")
+        return []
+
+def query_pinecone_matches(user_query, namespace="global_knowledge_base", top_k=10):
+    """
+    Hybrid retrieval: dense matches fused with BM25 keyword matches, so exact terms such as
+    product names and acronyms are found even when the embedding misses them.
+    Returns the query embedding with the matches (dicts with the vector id, fused score and
+    chunk text), or None if dense retrieval fails.
+    """
+    result = query_dense_matches(user_query, namespace=namespace, top_k=top_k)
+    if result is None:
+        return None
+    keyword_matches = query_keyword_index(namespace, user_query, top_k=top_k)
+    if keyword_matches:
+        result["matches"] = fuse_rankings([result["matches"], keyword_matches], top_k=top_k)
+    return result
+
+def query_dense_matches(user_query, namespace="global_knowledge_base", top_k=10):
+    """
+    Query the Pinecone index and return the query embedding with the matches.
+    Each match is a dict with the vector id, score and chunk text.
+    Served from the local index when it fully mirrors the namespace, and falls back to it
+    when Pinecone fails. Returns None if every attempt fails.
     """
     max_retries = 3
     retry_delay = 1  # seconds
-    
+    query_embedding = None
+
     for attempt in range(max_retries):
         try:
-            query_embedding = get_embedding(user_query)
             if query_embedding is None:
-                raise ValueError("Failed to generate embedding for the user query.")
+                query_embedding = get_embedding(user_query)
+                if query_embedding is None:
+                    raise ValueError("Failed to generate embedding for the user query.")
+
+                if LOCAL_INDEX_SERVE_QUERIES:
+                    matches = query_local_index(namespace, query_embedding, top_k, require_synced=True)
+                    if matches is not None:
+                        return {"embedding": query_embedding, "matches": matches}
 
             results = index.query(
                 vector=query_embedding,
-                top_k=10,
+                top_k=top_k,
                 namespace=namespace,
                 include_metadata=True
             )
 
-            matched_texts = [
-                match['metadata']['text']
+            matches = attach_chunk_texts(namespace, [
+                {"id": match['id'], "score": match['score'], **chunk_metadata(match['metadata'] if 'metadata' in match else {})}
                 for match in results.get('matches', [])
-                if 'metadata' in match and 'text' in match['metadata']
-            ]
-            return matched_texts
+            ])
+            return {"embedding": query_embedding, "matches": matches}
 
         except Exception as e:
             logging.error(f"Query attempt {attempt + 1} failed: {str(e)}")
+            # Rather than wait on a slow or unavailable Pinecone, answer from the local mirror
+            if query_embedding is not None:
+                matches = query_local_index(namespace, query_embedding, top_k)
+                if matches is not None:
+                    logging.warning(f"Serving query for namespace {namespace} from the local index")
+                    return {"embedding": query_embedding, "matches": matches}
             if attempt < max_retries - 1:
                 time.sleep(retry_delay * (attempt + 1))
                 continue
-            return None
\ No newline at end of file
+            return None
+
+def query_pinecone(user_query, namespace="global_knowledge_base"):
+    """
+    Query the Pinecone index for the most similar vectors to the user query.
+    """
+    result = query_pinecone_matches(user_query, namespace=namespace)
+    if result is None:
+        return None
+    return [match['text'] for match in result['matches']]
@@ -0,0 +1,265 @@
+import os
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.llm import client
+from app.rate_limit import RateLimiter
+from app.embeddings import tokenizer
+from app.http_client import create_supabase_client
+from app.scrape_cache import scrape_all, SCRAPE_MIN_USEFUL_CHARS
+
+# Prospect research configuration
+RESEARCH_MODEL = "gpt-5-mini"
+RESEARCH_MAX_COMPLETION_TOKENS = 3000
+RESEARCH_RPM = int(os.getenv("OPENAI_RESEARCH_RPM", "500"))
+RESEARCH_TPM = int(os.getenv("OPENAI_RESEARCH_TPM", "200000"))
+RESEARCH_BATCH_CONCURRENCY = int(os.getenv("RESEARCH_BATCH_CONCURRENCY", "4"))  # Prospects researched at once per batch
+# About five minutes of research at the default concurrency, so a batch usually finishes before
+# gunicorn recycles its worker (max_requests); a cut-short batch resumes where it stopped
+RESEARCH_BATCH_MAX_PROSPECTS = int(os.getenv("RESEARCH_BATCH_MAX_PROSPECTS", "40"))
+RESEARCH_JOB_WORKERS = int(os.getenv("RESEARCH_JOB_WORKERS", "1"))  # Batches run at once per worker, off the shared job pool
+# Shared by single and batch research in this worker
+research_rate_limiter = RateLimiter(RESEARCH_RPM, RESEARCH_TPM)
+
+supabase = create_supabase_client()
+
+
+def prospect_fields(contact):
+    """Research inputs from a saved prospect or a raw Apollo person record."""
+    organization = contact.get('organization') or {}
+    name = contact.get('name') or " ".join(
+        part for part in (contact.get('first_name'), contact.get('last_name')) if part
+    )
+    return {
+        'name': name or None,
+        'email': contact.get('email'),
+        'title': contact.get('title'),
+        'company_name': contact.get('company_name') or contact.get('company') or organization.get('name'),
+        'linkedin_url': contact.get('linkedin_url'),
+        'company_website': contact.get('company_website') or organization.get('website_url')
+    }
+
+
+def research_sources(data):
+    """Work out the prospect's company website and scrape it and their LinkedIn profile."""
+    prospect_email = data.get('email')
+    linkedin_url = data.get('linkedin_url')
+
+    # Extract domain from email if available - this is the primary source
+    company_website = None
+    if prospect_email and '@' in prospect_email:
+        domain = prospect_email.split('@')[1].lower()
+        # Common personal email domains to skip
+        skip_domains = ['gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com', 'icloud.com', 
+                      'aol.com', 'mail.com', 'protonmail.com', 'yandex.com']
+        if domain not in skip_domains:
+            # Use the email domain as the company website
+            company_website = f"https://{domain}"
+            logging.info(f"Using email domain for company website: {company_website}")
+
+    # Only override with provided website if it's actually provided and valid
+    if data.get('company_website') and data.get('company_website') != 'None':
+        company_website = data.get('company_website')
+
+    logging.info(f"Research target - LinkedIn: {linkedin_url}, Company: {company_website}")
+
+    # Collect scraped data
+    linkedin_data = ""
+    company_data = ""
+
+    # LinkedIn, the company site and its www variant are scraped in parallel under one
+    # deadline; each is cached per site, so other prospects at the same account reuse them
+    targets = {}
+    if linkedin_url and linkedin_url != 'None':
+        # Note: LinkedIn actively blocks scraping, so this might not work
+        targets['linkedin'] = (linkedin_url, 1, 5)
+    if company_website and company_website != 'None':
+        targets['company'] = (company_website, 2, 10)
+        if 'www.' not in company_website:
+            targets['company_www'] = (company_website.replace('https://', 'https://www.'), 2, 10)
+    logging.info(f"Scraping research sources: {targets}")
+    scraped = scrape_all(targets)
+
+    if 'linkedin' in targets:
+        if scraped['linkedin'] is None:
+            linkedin_data = "LinkedIn profile not accessible due to platform restrictions. Using available information from Apollo data."
+        else:
+            linkedin_data = "\n".join(scraped['linkedin'])
+            if len(linkedin_data) < SCRAPE_MIN_USEFUL_CHARS:
+                linkedin_data = "LinkedIn profile data not accessible due to platform restrictions. Using available information from Apollo data."
+
+    if 'company' in targets:
+        if scraped['company'] is None and scraped.get('company_www') is None:
+            company_data = f"Company website {company_website} could not be fully accessed. Using available information."
+        else:
+            company_data = "\n".join(scraped['company'] or [])
+            # Fall back to the www site when the apex domain gave little
+            if len(company_data) < SCRAPE_MIN_USEFUL_CHARS and scraped.get('company_www'):
+                company_data = "\n".join(scraped['company_www'])
+            if len(company_data) < SCRAPE_MIN_USEFUL_CHARS:
+                company_data = f"Limited data available for {company_website}. Using domain-based inference."
+
+
+    return company_website, linkedin_data, company_data
+
+
+def generate_research_report(data):
+    """Scrape a prospect's sources and generate their research report. Raises if the LLM call fails."""
+    prospect_name = data.get('name')
+    prospect_email = data.get('email')
+    prospect_title = data.get('title')
+    company_name = data.get('company_name')
+    linkedin_url = data.get('linkedin_url')
+
+    company_website, linkedin_data, company_data = research_sources(data)
+
+    # Create comprehensive prompt for research report
+    research_prompt = f"""
+        Generate a comprehensive research report for a sales prospect based on the following information:
+        
+        PROSPECT INFORMATION:
+        Name: {prospect_name}
+        Title: {prospect_title}
+        Company: {company_name}
+        Email: {prospect_email}
+        Email Domain: {prospect_email.split('@')[1] if prospect_email and '@' in prospect_email else 'Unknown'}
+        LinkedIn: {linkedin_url if linkedin_url and linkedin_url != 'None' else 'Not provided'}
+        Company Website (from email): {company_website or 'Not identified'}
+        
+        IMPORTANT CONTEXT:
+        - If the email domain suggests a major company (e.g., ford.com = Ford Motor Company), use that as the primary company context
+        - The title "{prospect_title}" indicates their role and seniority level
+        - Focus on insights relevant to their specific role and industry
+        
+        LINKEDIN PROFILE DATA:
+        {linkedin_data[:2000] if linkedin_data else 'LinkedIn data not available - use role and company context for insights'}
+        
+        COMPANY WEBSITE DATA (from {company_website if company_website else 'domain'}):
+        {company_data[:3000] if company_data else 'Company website data limited - use domain and industry knowledge'}
+        
+        Please create a detailed research report with the following sections:
+        
+        1. EXECUTIVE SUMMARY
+        - Brief overview of the prospect and their company
+        - Key insights and opportunities
+        
+        2. PROFESSIONAL PROFILE
+        - Current role and responsibilities
+        - Career progression and achievements
+        - Areas of expertise
+        - Professional interests and focus areas
+        
+        3. COMPANY OVERVIEW
+        - Business description and industry
+        - Products/services offered
+        - Market position and competitive landscape
+        - Recent developments or news
+        
+        4. ENGAGEMENT STRATEGY
+        - Personalized talking points based on their background
+        - Potential pain points they might be facing
+        - Value propositions that would resonate
+        - Recommended outreach approach
+        - Best time and channel for contact
+        
+        5. KEY INSIGHTS
+        - Notable observations from the research
+        - Connection opportunities
+        - Risk factors or considerations
+        
+        Format the report in a clear, professional manner with bullet points where appropriate.
+        """
+
+    messages = [
+        {"role": "system", "content": "You are an expert sales researcher creating detailed prospect intelligence reports."},
+        {"role": "user", "content": research_prompt}
+    ]
+    research_rate_limiter.acquire(len(tokenizer.encode(research_prompt)) + RESEARCH_MAX_COMPLETION_TOKENS)
+    response = client.chat.completions.create(
+        model=RESEARCH_MODEL,
+        messages=messages,
+        max_completion_tokens=RESEARCH_MAX_COMPLETION_TOKENS
+    )
+    research_report = response.choices[0].message.content.strip()
+
+    # Create structured report object
+    return {
+        "prospect_info": {
+            "name": prospect_name,
+            "title": prospect_title,
+            "email": prospect_email,
+            "company": company_name,
+            "linkedin_url": linkedin_url
+        },
+        "company_website": company_website,
+        "research_report": research_report,
+        "linkedin_scraped": bool(linkedin_data),
+        "website_scraped": bool(company_data),
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
+
+def research_record(user_id, report):
+    """The prospect_research row for a report."""
+    return {
+        'user_id': user_id,
+        'prospect_id': report.get('prospect_info', {}).get('email', ''),
+        'prospect_name': report.get('prospect_info', {}).get('name'),
+        'prospect_email': report.get('prospect_info', {}).get('email'),
+        'prospect_title': report.get('prospect_info', {}).get('title'),
+        'company_name': report.get('prospect_info', {}).get('company'),
+        'linkedin_url': report.get('prospect_info', {}).get('linkedin_url'),
+        'company_website': report.get('company_website'),
+        'research_report': report,
+        'research_summary': report.get('research_report', '')[:500]  # First 500 chars as summary
+    }
+
+
+def run_research_batch(payload, progress):
+    """
+    Job handler: research a list of prospects concurrently and save each report to
+    prospect_research as soon as it is ready. The `research` stage lists every prospect's
+    status, saved research id and summary, so partial results can be polled. When a
+    recovered job is re-run, prospects it already saved are kept rather than researched again.
+    """
+    user_id = payload['user_id']
+    prospects = [prospect_fields(contact) for contact in payload['prospects']]
+    saved = {
+        result['index']: result
+        for result in progress.stages.get('research', {}).get('results', [])
+        if result.get('status') == 'completed' and result.get('research_id')
+    }
+    results = [
+        saved[i] if i in saved and saved[i]['email'] == prospect['email'] else
+        {"index": i, "name": prospect['name'], "email": prospect['email'], "status": "queued"}
+        for i, prospect in enumerate(prospects)
+    ]
+    pending = [result['index'] for result in results if result['status'] == "queued"]
+    counts = {"total": len(prospects), "completed": len(prospects) - len(pending), "failed": 0}
+    progress.start('research', **counts, results=results)
+
+    def research(index):
+        report = generate_research_report(prospects[index])
+        response = supabase.table('prospect_research').insert(research_record(user_id, report)).execute()
+        if not response.data:
+            raise RuntimeError("Failed to save research")
+        return response.data[0]['id'], report
+
+    # Prospects at the same company share its scrapes through the scrape cache
+    with ThreadPoolExecutor(max_workers=RESEARCH_BATCH_CONCURRENCY) as executor:
+        futures = {executor.submit(research, i): i for i in pending}
+        for future in as_completed(futures):
+            result = results[futures[future]]
+            try:
+                research_id, report = future.result()
+                result.update(status="completed", research_id=research_id,
+                              research_summary=report['research_report'][:500])
+                counts["completed"] += 1
+            except Exception as e:
+                logging.error(f"Error researching {result['name'] or result['email']}: {str(e)}")
+                result.update(status="failed", error=str(e))
+                counts["failed"] += 1
+            progress.update('research', **counts, results=results)
+
+    progress.complete('research', **counts, results=results)
+    return {**counts, "results": results}
@@ -0,0 +1,83 @@
+import random
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Refills continuously at `rate` units per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.available = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount=1, timeout=None):
+        """
+        Block until `amount` units are available, then take them and return True.
+        With a `timeout`, give up and return False once they can't be had in time.
+        """
+        # A request larger than the bucket could never be satisfied, so cap it
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return True
+                wait = (amount - self.available) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits, as published for the OpenAI API."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        """Block until one request carrying `tokens` tokens fits under both limits."""
+        self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+
+
+class AdaptiveBackoff:
+    """
+    Retry delay shared by every caller of a throttled service.
+    Each throttled response doubles the delay up to `max_delay` and each success halves it,
+    so concurrent callers slow down together and recover once the service does.
+    """
+
+    def __init__(self, initial_delay=0.5, max_delay=30.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def throttled(self):
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.initial_delay, self.delay * 2))
+
+    def succeeded(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.initial_delay else 0.0
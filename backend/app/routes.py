@@ -1,11 +1,31 @@
-from flask import Blueprint, request, jsonify
-from app.scraping import scrape_website, extract_text_from_file, chunk_text, tokenizer, get_embedding, process_source, store_in_supabase
-from app.pinecone_client import store_in_pinecone, query_pinecone
-from app.llm import query_llm, generate_source_summary
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.scraping import scrape_website, extract_text_from_file, chunk_text, tokenizer, get_embedding, store_in_supabase
+from app.pinecone_client import store_in_pinecone, query_pinecone, query_pinecone_matches, run_local_index_sync
+from app.local_index import local_index
+from app.keyword_index import keyword_index
+from app.chunk_store import chunk_store
+from app.embedding_cache import embedding_cache
+from app.answer_cache import answer_cache
+from app.jobs import JobStore, JobQueue
+from app.sync_manifest import SyncManifest
+from app.ingestion import run_ingestion_job, save_upload
+from app.llm import query_llm, stream_query_llm, generate_source_summary, QUERY_ERROR_MESSAGE
+from app.context_packing import pack_context
+from app.http_client import http_metrics, create_supabase_client
 import json
-from datetime import datetime
 from urllib.parse import urlparse
-from app.llm import check_quality_with_llm
+from app.llm import review_chunks
+from app.chunking import MAX_TOKENS, split_paragraphs, iter_chunks
+from app.diffing import diff_opcodes
+from app.scrape_cache import scrape_cache
+from app.apollo_cache import apollo_cache
+from app.apollo_client import apollo_client, ApolloQuotaExceeded
+from app.hubspot import (hubspot_request, check_hubspot_contact_by_email, check_hubspot_company_by_domain,
+                         batch_check_prospects, run_hubspot_index_sync)
+from app.hubspot_index import hubspot_index
+from app.apollo_search import (APOLLO_SEARCHES, APOLLO_MAX_PAGES, people_payload, company_payload,
+                               decode_cursor, iter_search_pages)
+from app.prospect_research import generate_research_report, research_record, run_research_batch, RESEARCH_BATCH_MAX_PROSPECTS, RESEARCH_JOB_WORKERS
 from app.file_handling import save_text_to_file
 from flask_cors import cross_origin
 from concurrent.futures import ThreadPoolExecutor
@@ -14,29 +34,32 @@ import traceback
 from sqlalchemy import select
 import base64
 import asyncio
-import threading
 import os
-from supabase import create_client, Client
+from supabase import Client
 import urllib.parse
 import nltk
 import logging
-import difflib
-import requests
 import re
 
 # Configure logging to show all debug messages
 logging.basicConfig(level=logging.DEBUG, force=True)
 
-# Add to your existing imports
-thread_local = threading.local()
-
 # Initialize Supabase client
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_SECRET")
-supabase: Client = create_client(supabase_url, supabase_key)
+supabase: Client = create_supabase_client(supabase_url, supabase_key)
 
 bp = Blueprint('main', __name__)
 
+# Durable job queue for long-running ingestion work
+job_store = JobStore()
+job_queue = JobQueue(job_store)
+job_queue.register('ingest_source', run_ingestion_job)
+job_queue.register('sync_local_index', run_local_index_sync)
+job_queue.register('research_prospects', run_research_batch, max_workers=RESEARCH_JOB_WORKERS)
+job_queue.register('sync_hubspot_index', run_hubspot_index_sync)
+job_queue.start()
+
 
 @bp.route('/auth/register', methods=['POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
@@ -195,15 +218,10 @@ file_buckets = {
     'Quantitative_Data': 'quantitative-data'
 }
 
-def get_session():
-    if not hasattr(thread_local, "session"):
-        thread_local.session = requests.Session()
-    return thread_local.session
-
-
 @bp.route('/add-source', methods=['POST'])
 @cross_origin(origins=['https://projectx-frontend-3owg.onrender.com'])
 def add_source():
+    """Queue a URL or file for ingestion and return the job id immediately."""
     logging.debug("Starting add_source route.")
     
     try:
@@ -228,107 +246,74 @@ def add_source():
             logging.error(f"Invalid category '{category}' or source type '{source_type}'. Bucket not found.")
             return jsonify({"error": "Invalid category or source type"}), 400
 
-        try:
-            if source_type == 'url' and 'content' in data:
-                url = data.get('content')
-                logging.debug(f"Scraping URL: {url} for bucket: {bucket_name}")
-                scraped_data = scrape_website(url)
-
-                if scraped_data:
-                    # Process in smaller batches for Pinecone
-                    batch_size = 50
-                    for i in range(0, len(scraped_data), batch_size):
-                        batch = scraped_data[i:i + batch_size]
-                        store_in_pinecone(url, batch, namespace="global_knowledge_base")
-
-                    # Save scraped data as text in Supabase
-                    filename = f"{url.replace('https://', '').replace('/', '_')}.txt"
-                    temp_file_path = os.path.join('/tmp', filename)
-                    full_text = '\n'.join(scraped_data)
-                    
-                    with open(temp_file_path, 'w') as f:
-                        f.write(full_text)
-
-                    try:
-                        # Store file in Supabase
-                        store_in_supabase(temp_file_path, bucket_name, filename)
-                        logging.debug(f"Successfully stored {filename} in Supabase bucket {bucket_name}")
-
-                        # Generate and store summary
-                        summary = generate_source_summary(full_text, category)
-                        if summary:
-                            supabase.table('source_summaries').insert({
-                                'source_id': url,
-                                'category': category,
-                                'summary': summary
-                            }).execute()
-                            logging.debug(f"Successfully stored summary for {url}")
-
-                    except Exception as e:
-                        logging.error(f"Error in storage operations: {str(e)}")
-                        # Continue even if storage fails
-                    
-                    finally:
-                        # Clean up
-                        if os.path.exists(temp_file_path):
-                            os.remove(temp_file_path)
-                    
-                    return jsonify({"message": "URL processed successfully"}), 200
-
-            elif source_type == 'file' and file:
-                filename = secure_filename(file.filename)
-                temp_file_path = os.path.join('/tmp', filename)
-                file.save(temp_file_path)
-
-                try:
-                    file_extension = filename.split('.')[-1].lower()
-                    # Extract text and process in chunks
-                    text = extract_text_from_file(temp_file_path, file_extension)
-                    chunks = chunk_text(text)
-
-                    # Process chunks in batches for Pinecone
-                    batch_size = 50
-                    for i in range(0, len(chunks), batch_size):
-                        batch = chunks[i:i + batch_size]
-                        store_in_pinecone(filename, batch, namespace="global_knowledge_base")
-
-                    try:
-                        # Store file in Supabase
-                        store_in_supabase(temp_file_path, bucket_name, filename)
-                        logging.debug(f"Successfully stored {filename} in Supabase bucket {bucket_name}")
-
-                        # Generate and store summary
-                        summary = generate_source_summary(text, category)
-                        if summary:
-                            supabase.table('source_summaries').insert({
-                                'source_id': filename,
-                                'category': category,
-                                'summary': summary
-                            }).execute()
-                            logging.debug(f"Successfully stored summary for {filename}")
-
-                    except Exception as e:
-                        logging.error(f"Error in storage operations: {str(e)}")
-                        # Continue even if storage fails
-
-                    return jsonify({"message": "File processed successfully"}), 200
-
-                finally:
-                    # Clean up
-                    if os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
+        payload = {
+            'source_type': source_type,
+            'category': category,
+            'bucket_name': bucket_name
+        }
 
+        if source_type == 'url' and 'content' in data:
+            payload['url'] = data.get('content')
+            logging.debug(f"Queueing URL: {payload['url']} for bucket: {bucket_name}")
+        elif source_type == 'file' and file:
+            filename = secure_filename(file.filename)
+            payload['filename'] = filename
+            payload['file_path'] = save_upload(file, filename)
+            logging.debug(f"Queueing file: {filename} for bucket: {bucket_name}")
+        else:
             return jsonify({"error": "Invalid source type or content"}), 400
 
-        except Exception as e:
-            logging.error(f"Error processing source: {str(e)}")
-            return jsonify({"error": str(e)}), 500
+        job_id = job_queue.enqueue('ingest_source', payload)
+        return jsonify({
+            "message": "Source queued for processing",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
 
     except Exception as e:
         logging.error(f"Error in add_source: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@cross_origin(origins=['https://projectx-frontend-3owg.onrender.com'])
+def get_job_status(job_id):
+    """Return the status, per-stage progress and timings of a queued job."""
+    try:
+        job = job_store.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+
+        # Uploaded file paths are internal to the server
+        job['payload'].pop('file_path', None)
+        return jsonify(job), 200
+
+    except Exception as e:
+        logging.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def get_cached_answer(retrieval, namespace, chat_history=None):
+    """Look up a cached answer for this retrieval. Follow-up questions depend on history, so skip those."""
+    if answer_cache is None or chat_history:
+        return None
+    try:
+        return answer_cache.get(namespace, retrieval['embedding'], [m['id'] for m in retrieval['matches']])
+    except Exception as e:
+        logging.error(f"Error reading answer cache: {str(e)}")
+        return None
+
+
+def cache_answer(retrieval, namespace, answer, chat_history=None):
+    """Cache a generated answer unless it is an error or depends on chat history."""
+    if answer_cache is None or chat_history or QUERY_ERROR_MESSAGE in answer:
+        return
+    try:
+        answer_cache.put(namespace, retrieval['embedding'], [m['id'] for m in retrieval['matches']], answer)
+    except Exception as e:
+        logging.error(f"Error writing answer cache: {str(e)}")
+
+
 @bp.route('/query', methods=['POST'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
 def query():
@@ -342,16 +327,28 @@ def query():
             return jsonify({"error": "User question and session ID are required"}), 400
 
         # Step 1: Query Pinecone for relevant context from DocHub
-        dochub_texts = query_pinecone(user_question, namespace="global_knowledge_base")
+        namespace = "global_knowledge_base"
+        retrieval = query_pinecone_matches(user_question, namespace=namespace)
+        dochub_texts = [match['text'] for match in retrieval['matches']] if retrieval else None
 
         # Step 2: Generate response if we have any DocHub results
         if dochub_texts:
-            response = query_llm(dochub_texts, user_question)
+            # Near-duplicate questions that retrieve the same chunks reuse the earlier answer
+            response = get_cached_answer(retrieval, namespace)
+            cached = response is not None
+            context_usage = None
+            if not cached:
+                packed = pack_context(retrieval['matches'])
+                context_usage = packed['usage']
+                response = query_llm(dochub_texts, user_question, context=packed['context'])
+                cache_answer(retrieval, namespace, response)
 
             # Remove the Supabase insert since it's already happening in the frontend
             return jsonify({
                 "answer": response,
-                "dochubSources": dochub_texts
+                "dochubSources": dochub_texts,
+                "cached": cached,
+                "contextUsage": context_usage
             }), 200
 
         logging.info("No relevant information found.")
@@ -359,7 +356,193 @@ def query():
     except Exception as e:
         logging.error(f"Failed to query data: {str(e)}")
         return jsonify({"error": f"Failed to query data: {str(e)}"}), 500
-        
+
+
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@bp.route('/query/stream', methods=['POST'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def query_stream():
+    """
+    Streaming variant of /query using Server-Sent Events.
+    Sends a `sources` event with the retrieved DocHub texts, a `context` event with the
+    prompt token budget usage, then `token` events as the completion arrives, and a final
+    `done` event carrying the full answer.
+    """
+    try:
+        data = request.json
+        user_question = data.get('userQuestion')
+        session_id = data.get('sessionId')
+        chat_history = data.get('chatHistory')
+
+        if not user_question or not session_id:
+            logging.error("User question and session ID are required")
+            return jsonify({"error": "User question and session ID are required"}), 400
+
+        # Retrieval happens before the stream opens so errors still get a normal JSON response
+        namespace = "global_knowledge_base"
+        retrieval = query_pinecone_matches(user_question, namespace=namespace)
+        dochub_texts = [match['text'] for match in retrieval['matches']] if retrieval else None
+
+        if not dochub_texts:
+            logging.info("No relevant information found.")
+            return jsonify({"answer": "No relevant information found."}), 404
+
+        cached_answer = get_cached_answer(retrieval, namespace, chat_history)
+
+        def generate():
+            yield sse_event('sources', {"dochubSources": dochub_texts})
+            if cached_answer is not None:
+                yield sse_event('token', {"content": cached_answer})
+                yield sse_event('done', {"answer": cached_answer, "cached": True})
+                return
+
+            packed = pack_context(retrieval['matches'])
+            yield sse_event('context', {"contextUsage": packed['usage']})
+            answer = []
+            for token in stream_query_llm(dochub_texts, user_question, chat_history, context=packed['context']):
+                answer.append(token)
+                yield sse_event('token', {"content": token})
+            full_answer = "".join(answer)
+            cache_answer(retrieval, namespace, full_answer, chat_history)
+            yield sse_event('done', {"answer": full_answer, "cached": False})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # Stop proxies from buffering the stream
+            }
+        )
+    except Exception as e:
+        logging.error(f"Failed to stream query: {str(e)}")
+        return jsonify({"error": f"Failed to query data: {str(e)}"}), 500
+
+
+@bp.route('/ingestion/sync-status', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def ingestion_sync_status():
+    """Report skipped/processed/failed/deleted counts from recent background bucket syncs."""
+    try:
+        limit = int(request.args.get('limit', 10))
+        return jsonify({"runs": SyncManifest().recent_runs(limit)}), 200
+    except Exception as e:
+        logging.error(f"Error reading sync status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/answer-cache/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def answer_cache_stats():
+    """Report answer cache size and hit/miss counters for this worker."""
+    try:
+        if answer_cache is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(answer_cache.stats()), 200
+    except Exception as e:
+        logging.error(f"Error reading answer cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/embedding-cache/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def embedding_cache_stats():
+    """Report embedding cache size and hit/miss counters for this worker."""
+    try:
+        if embedding_cache is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(embedding_cache.stats()), 200
+    except Exception as e:
+        logging.error(f"Error reading embedding cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/local-index/sync', methods=['POST'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def sync_local_index_route():
+    """Queue a full copy of a Pinecone namespace into the local vector and keyword indexes."""
+    try:
+        if local_index is None and keyword_index is None:
+            return jsonify({"error": "No local index is enabled"}), 400
+        namespace = (request.get_json(silent=True) or {}).get('namespace', 'global_knowledge_base')
+        job_id = job_queue.enqueue('sync_local_index', {'namespace': namespace})
+        return jsonify({
+            "message": "Local index sync queued",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
+    except Exception as e:
+        logging.error(f"Error queueing local index sync: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/local-index/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def local_index_stats():
+    """Report the local vector and keyword indexes' namespaces, sizes and sync state."""
+    try:
+        return jsonify({
+            "vector_index": local_index.stats() if local_index is not None else {"enabled": False},
+            "keyword_index": keyword_index.stats() if keyword_index is not None else {"enabled": False}
+        }), 200
+    except Exception as e:
+        logging.error(f"Error reading local index stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/chunk-store/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def chunk_store_stats():
+    """Report how many chunk texts are stored and their compressed size."""
+    try:
+        if chunk_store is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(chunk_store.stats()), 200
+    except Exception as e:
+        logging.error(f"Error reading chunk store stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/http/metrics', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def outbound_http_metrics():
+    """Report this worker's outbound requests, retries, statuses and open connections per host."""
+    try:
+        return jsonify(http_metrics()), 200
+    except Exception as e:
+        logging.error(f"Error reading HTTP metrics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/scrape-cache/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def scrape_cache_stats():
+    """Report scrape cache entries, hits, misses and fetches shared between concurrent requests."""
+    try:
+        if scrape_cache is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(scrape_cache.stats()), 200
+    except Exception as e:
+        logging.error(f"Error reading scrape cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route('/apollo/cache/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def apollo_cache_stats():
+    """Report cached Apollo searches and the hits and credits the cache has saved."""
+    try:
+        if apollo_cache is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(apollo_cache.stats()), 200
+    except Exception as e:
+        logging.error(f"Error reading Apollo cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 
 # Function to recursively list all files in a bucket
 def list_files(bucket_name, path=''):
@@ -445,23 +628,86 @@ def get_all_sources():
         return jsonify({"error": str(e)}), 500
 
 
-@bp.route('/qa-tool/upload', methods=['POST'])
-@cross_origin(origins=['https://projectx-frontend-3owg.onrender.com'])
-def upload_and_process_file():
+QA_FILE_TYPES = ['txt', 'pdf', 'docx', 'pptx']
+
+
+def save_qa_upload():
+    """Validate and save the uploaded QA file. Returns (file_path, file_type, error_response)."""
     if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+        return None, None, (jsonify({"error": "No file uploaded"}), 400)
 
     file = request.files['file']
     if not file.filename:
-        return jsonify({"error": "No file selected"}), 400
+        return None, None, (jsonify({"error": "No file selected"}), 400)
+
+    file_type = file.filename.split('.')[-1].lower()
+    if file_type not in QA_FILE_TYPES:
+        return None, None, (jsonify({"error": "Unsupported file type. Please upload PDF, DOCX, PPTX, or TXT files."}), 400)
+
+    file_path = os.path.join('/tmp', secure_filename(file.filename))
+    file.save(file_path)
+    return file_path, file_type, None
+
+
+def restore_edges(original, revised):
+    """Give a revised chunk the leading and trailing whitespace the model strips, so chunks join back up."""
+    if not original.strip():
+        return original
+    leading = original[:len(original) - len(original.lstrip())]
+    trailing = original[len(original.rstrip()):]
+    return leading + revised.strip() + trailing
+
+
+def chunk_changes(chunk, revised_chunk, offset):
+    """Changes between a chunk and its revision, positioned in the whole original text."""
+    changes = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(chunk, revised_chunk):
+        if tag in ['replace', 'insert', 'delete']:
+            changes.append({
+                'type': tag,
+                'position': offset + i1,
+                'length': i2 - i1,
+                'original': chunk[i1:i2],
+                'revised': revised_chunk[j1:j2],
+            })
+    return changes
 
-    try:
-        file_type = file.filename.split('.')[-1].lower()
-        if file_type not in ['txt', 'pdf', 'docx', 'pptx']:
-            return jsonify({"error": "Unsupported file type. Please upload PDF, DOCX, PPTX, or TXT files."}), 400
 
-        file_path = os.path.join('/tmp', secure_filename(file.filename))
-        file.save(file_path)
+def review_document(original_text):
+    """
+    Review a document chunk by chunk, concurrently. Chunks don't overlap and end on paragraph
+    breaks where possible. Yields per-chunk results (index, position, length, revised text,
+    changes) in the order the reviews finish.
+    """
+    chunks = list(iter_chunks(split_paragraphs(original_text), MAX_TOKENS, 0, align='paragraph'))
+    for index, revised in review_chunks([chunk['text'] for chunk in chunks]):
+        chunk = chunks[index]
+        revised_chunk = restore_edges(chunk['text'], revised)
+        yield {
+            'index': index,
+            'chunks': len(chunks),
+            'position': chunk['start_char'],
+            'length': chunk['end_char'] - chunk['start_char'],
+            'revised': revised_chunk,
+            'changes': chunk_changes(chunk['text'], revised_chunk, chunk['start_char'])
+        }
+
+
+def assemble_review(results):
+    """Put per-chunk review results back in document order: (revised_text, changes)."""
+    ordered = sorted(results, key=lambda result: result['index'])
+    revised_text = "".join(result['revised'] for result in ordered)
+    changes = [change for result in ordered for change in result['changes']]
+    return revised_text, changes
+
+
+@bp.route('/qa-tool/upload', methods=['POST'])
+@cross_origin(origins=['https://projectx-frontend-3owg.onrender.com'])
+def upload_and_process_file():
+    try:
+        file_path, file_type, error = save_qa_upload()
+        if error:
+            return error
 
         try:
             # Extract text while preserving structure
@@ -469,34 +715,8 @@ def upload_and_process_file():
             if not original_text:
                 return jsonify({"error": "Could not extract text from file"}), 400
 
-            # Process the text in chunks while maintaining structure
-            chunks = chunk_text(original_text)
-            revised_chunks = []
-            changes = []
-            current_position = 0
-
-            for chunk in chunks:
-                # Get LLM suggestions for improvements
-                revised_chunk = check_quality_with_llm(chunk)
-                revised_chunks.append(revised_chunk)
-
-                # Find differences between original and revised chunks
-                diff = difflib.SequenceMatcher(None, chunk, revised_chunk)
-                for tag, i1, i2, j1, j2 in diff.get_opcodes():
-                    if tag in ['replace', 'insert', 'delete']:
-                        change = {
-                            'type': tag,
-                            'position': current_position + i1,
-                            'length': i2 - i1,
-                            'original': chunk[i1:i2],
-                            'revised': revised_chunk[j1:j2],
-                        }
-                        changes.append(change)
-
-                current_position += len(chunk)
-
-            # Combine revised chunks
-            revised_text = "\n".join(revised_chunks)
+            # Review the chunks concurrently, then reassemble them in document order
+            revised_text, changes = assemble_review(review_document(original_text))
 
             # Extract formatting markers if present (for PDF/DOCX)
             formatting = extract_formatting_markers(original_text, file_type)
@@ -518,6 +738,55 @@ def upload_and_process_file():
         logging.error(f"Error processing file: {str(e)}")
         return jsonify({"error": "An error occurred while processing the file"}), 500
 
+
+@bp.route('/qa-tool/upload/stream', methods=['POST'])
+@cross_origin(origins=['https://projectx-frontend-3owg.onrender.com'])
+def upload_and_process_file_stream():
+    """
+    Streaming variant of /qa-tool/upload using Server-Sent Events.
+    Sends a `document` event with the original text and formatting, a `chunk` event with each
+    chunk's revision and changes as its review finishes (in any order), and a final `done`
+    event with the reassembled revised text and all changes in document order.
+    """
+    try:
+        file_path, file_type, error = save_qa_upload()
+        if error:
+            return error
+
+        # Extraction happens before the stream opens so errors still get a normal JSON response
+        try:
+            original_text = extract_text_from_file(file_path, file_type)
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        if not original_text:
+            return jsonify({"error": "Could not extract text from file"}), 400
+
+        def generate():
+            yield sse_event('document', {
+                "originalText": original_text,
+                "formatting": extract_formatting_markers(original_text, file_type),
+                "fileType": file_type
+            })
+            results = []
+            for result in review_document(original_text):
+                results.append(result)
+                yield sse_event('chunk', result)
+            revised_text, changes = assemble_review(results)
+            yield sse_event('done', {"revisedText": revised_text, "changes": changes, "success": True})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # Stop proxies from buffering the stream
+            }
+        )
+    except Exception as e:
+        logging.error(f"Error processing file: {str(e)}")
+        return jsonify({"error": "An error occurred while processing the file"}), 500
+
 def extract_formatting_markers(text, file_type):
     """Extract formatting information based on file type."""
     formatting = {
@@ -560,9 +829,7 @@ def extract_formatting_markers(text, file_type):
 def get_relative_changes(original_text, revised_text):
     """Calculate relative position of changes for highlighting."""
     changes = []
-    matcher = difflib.SequenceMatcher(None, original_text, revised_text)
-    
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in diff_opcodes(original_text, revised_text):
         if tag != 'equal':
             change = {
                 'type': tag,
@@ -599,7 +866,7 @@ def get_category_summaries(category):
 @bp.route('/apollo/test', methods=['GET', 'POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
 def apollo_test():
-    """Test Apollo API key and check account status"""
+    """Check the Apollo API key is configured and report current quota usage"""
     
     if request.method == 'OPTIONS':
         return '', 200
@@ -615,62 +882,20 @@ def apollo_test():
                 "api_key_configured": False
             }), 500
         
-        # Test the API key by getting account info
-        headers = {
-            'Content-Type': 'application/json',
-            'Cache-Control': 'no-cache',
-            'X-Api-Key': apollo_api_key
-        }
-        
-        # Try to get current user info to verify API key and check credits
-        test_url = 'https://api.apollo.io/v1/auth/health'
-        response = requests.get(test_url, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            # Try a minimal search to check if we can get actual data
-            search_url = 'https://api.apollo.io/api/v1/mixed_people/search'
-            search_payload = {
-                'page': 1,
-                'per_page': 1,
-                'person_titles': ['CEO']
-            }
-            
-            search_response = requests.post(search_url, json=search_payload, headers=headers, timeout=10)
-            
-            if search_response.status_code == 200:
-                search_data = search_response.json()
-                has_results = len(search_data.get('contacts', [])) > 0
-                total_found = search_data.get('pagination', {}).get('total_entries', 0)
-                
-                return jsonify({
-                    "status": "success",
-                    "message": f"Apollo API is working. Found {total_found} total matches.",
-                    "api_key_configured": True,
-                    "api_key_valid": True,
-                    "can_retrieve_data": has_results,
-                    "test_search_returned_data": has_results,
-                    "total_matches_found": total_found,
-                    "credits_info": search_data.get('credits_used', 'Unknown'),
-                    "rate_limit_info": search_data.get('rate_limit', {}),
-                    "warning": None if has_results else "API key is valid but cannot retrieve actual contact data. This usually means insufficient credits or a plan limitation."
-                }), 200
-            else:
-                return jsonify({
-                    "status": "error",
-                    "message": f"Search test failed: {search_response.status_code}",
-                    "api_key_configured": True,
-                    "api_key_valid": True,
-                    "search_error": search_response.text[:500] if search_response.text else "No error details"
-                }), 400
+        # Report the quota seen on recent Apollo responses rather than spending a search on it
+        quota = apollo_client.metrics()
+        minute = quota["windows"].get("minute")
+        if minute:
+            message = f"Apollo API key configured. {minute['remaining']} of {minute['limit']} requests left this minute."
         else:
-            return jsonify({
-                "status": "error", 
-                "message": f"API key validation failed: {response.status_code}",
-                "api_key_configured": True,
-                "api_key_valid": False,
-                "error_details": response.text[:500] if response.text else "No error details"
-            }), 400
-            
+            message = "Apollo API key configured. No Apollo requests seen yet to read quota from."
+        
+        return jsonify({
+            "status": "success",
+            "message": message,
+            "api_key_configured": True,
+            "rate_limit_info": quota
+        }), 200
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -679,6 +904,38 @@ def apollo_test():
         }), 500
 
 
+@bp.route('/apollo/metrics', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def apollo_metrics():
+    """Apollo quota usage per window and the shared request queue's state"""
+    try:
+        return jsonify(apollo_client.metrics()), 200
+    except Exception as e:
+        logging.error(f"Error getting Apollo metrics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def get_cached_search(endpoint, payload, refresh=False):
+    """Look up a cached Apollo search. Returns (response or None, cache info or None)."""
+    if apollo_cache is None or refresh:
+        return None, None
+    try:
+        return apollo_cache.get(endpoint, payload)
+    except Exception as e:
+        logging.error(f"Error reading Apollo search cache: {str(e)}")
+        return None, None
+
+
+def cache_search(endpoint, payload, response, cache_info):
+    """Cache a successful Apollo search response and return it with its cache info."""
+    if apollo_cache is not None:
+        try:
+            apollo_cache.put(endpoint, payload, response, response.get('credits_used'))
+        except Exception as e:
+            logging.error(f"Error writing Apollo search cache: {str(e)}")
+    return {**response, "cache": cache_info or {"hit": False}}
+
+
 # Simplified Apollo people search route
 @bp.route('/apollo/people-search', methods=['POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
@@ -700,33 +957,22 @@ def apollo_people_search():
             }), 500
         
         # Build Apollo API request payload - limit to 100 results and reveal contact info
-        apollo_payload = {
-            'page': 1,
-            'per_page': 100,  # Increased to 100 results as requested
-            'reveal_contact_info': True,  # This will use credits but reveal actual contact details
-        }
-        
-        # Add search parameters if provided  
-        for key in ['person_titles', 'person_seniorities', 'person_locations', 
-                   'organization_locations', 'contact_email_status', 
-                   'organization_num_employees_ranges', 'q_organization_keyword_tags', 'departments']:
-            if data.get(key) and data[key]:  # Only add if not empty
-                apollo_payload[key] = data[key]
+        apollo_payload = people_payload(data)
         
         # Make request to Apollo API - correct endpoint from docs
-        apollo_url = 'https://api.apollo.io/api/v1/mixed_people/search'
-        headers = {
-            'Content-Type': 'application/json',
-            'Cache-Control': 'no-cache',
-            'X-Api-Key': apollo_api_key,
-            'Accept': 'application/json'
-        }
+        apollo_url = APOLLO_SEARCHES['people'][0]
+        
+        # Identical searches within the TTL are served from the cache without spending credits
+        cached, cache_info = get_cached_search('people', apollo_payload, data.get('refresh'))
+        if cached is not None:
+            logging.info(f"Apollo people search served from cache")
+            return jsonify({**cached, "cache": cache_info}), 200
         
         # Log the request for debugging
         logging.info(f"Apollo API Request URL: {apollo_url}")
         logging.info(f"Apollo API Request Payload: {apollo_payload}")
         
-        apollo_response = requests.post(apollo_url, json=apollo_payload, headers=headers, timeout=30)
+        apollo_response = apollo_client.post(apollo_url, apollo_api_key, apollo_payload)
         
         if apollo_response.status_code == 200:
             apollo_data = apollo_response.json()
@@ -758,12 +1004,12 @@ def apollo_people_search():
             # Add credit usage info to response
             credits_used = apollo_data.get('credits_used', 0)
             
-            return jsonify({
+            return jsonify(cache_search('people', apollo_payload, {
                 "contacts": contacts,
                 "total_contacts": apollo_data.get('total_contacts', 0),
                 "pagination": pagination,
                 "credits_used": credits_used
-            }), 200
+            }, cache_info)), 200
         else:
             error_message = f"Apollo API error: {apollo_response.status_code}"
             try:
@@ -779,6 +1025,12 @@ def apollo_people_search():
                 "contacts": []
             }), 400
             
+    except ApolloQuotaExceeded as e:
+        return jsonify({
+            "error": str(e),
+            "retry_after": e.retry_after,
+            "contacts": []
+        }), 429
     except Exception as e:
         return jsonify({
             "error": f"Internal server error: {str(e)}",
@@ -786,6 +1038,74 @@ def apollo_people_search():
         }), 500
 
 
+def stream_search_pages(search, payload, data):
+    """NDJSON response streaming a paginated Apollo search, resuming from the request's cursor."""
+    apollo_api_key = os.environ.get('APOLLO_API_KEY')
+    if not apollo_api_key:
+        return jsonify({"error": "Apollo API key not configured"}), 500
+
+    start_page = 1
+    if data.get('cursor'):
+        try:
+            start_page = decode_cursor(data['cursor'], search, payload)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    try:
+        max_pages = max(1, min(int(data.get('pages') or APOLLO_MAX_PAGES), APOLLO_MAX_PAGES))
+    except (TypeError, ValueError):
+        return jsonify({"error": "pages must be an integer"}), 400
+
+    def generate():
+        for item in iter_search_pages(search, payload, apollo_api_key, start_page, max_pages):
+            yield json.dumps(item) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop proxies from buffering the stream
+        }
+    )
+
+
+@bp.route('/apollo/people-search/stream', methods=['POST', 'OPTIONS'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def apollo_people_search_stream():
+    """
+    Paginated people search streamed as NDJSON. Takes the people-search filters plus
+    `pages` (how many pages to fetch) and an optional `cursor` from a previous stream.
+    Pages are fetched concurrently and written in page order as `page` lines holding the
+    contacts not seen on an earlier page; a final `done` line carries the next cursor.
+    """
+    
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        data = request.get_json() or {}
+        return stream_search_pages('people', people_payload(data), data)
+    except Exception as e:
+        logging.error(f"Error streaming Apollo people search: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
+@bp.route('/apollo/company-search/stream', methods=['POST', 'OPTIONS'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def apollo_company_search_stream():
+    """Paginated company search streamed as NDJSON; see /apollo/people-search/stream."""
+    
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        data = request.get_json() or {}
+        return stream_search_pages('companies', company_payload(data), data)
+    except Exception as e:
+        logging.error(f"Error streaming Apollo company search: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
 # Simplified Apollo company search route
 @bp.route('/apollo/company-search', methods=['POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
@@ -807,40 +1127,22 @@ def apollo_company_search():
             }), 500
         
         # Build Apollo API request payload - limit to 50 results
-        apollo_payload = {
-            'page': 1,
-            'per_page': 50,  # Limit to 50 results to conserve credits
-            'reveal_contact_info': True,  # Reveal organization contact details
-        }
-        
-        # Add search parameters if provided  
-        for key in ['q_organization_name', 'organization_locations', 'organization_num_employees_ranges',
-                   'q_organization_keyword_tags', 'currently_using_any_of_technology_uids']:
-            if data.get(key) and data[key]:  # Only add if not empty
-                apollo_payload[key] = data[key]
-        
-        # Handle revenue range specially
-        if data.get('revenue_range'):
-            revenue_range = data['revenue_range']
-            if revenue_range.get('min'):
-                apollo_payload['revenue_range[min]'] = revenue_range['min']
-            if revenue_range.get('max'):
-                apollo_payload['revenue_range[max]'] = revenue_range['max']
+        apollo_payload = company_payload(data)
         
         # Make request to Apollo API - correct endpoint from docs
-        apollo_url = 'https://api.apollo.io/api/v1/mixed_companies/search'
-        headers = {
-            'Content-Type': 'application/json',
-            'Cache-Control': 'no-cache',
-            'X-Api-Key': apollo_api_key,
-            'Accept': 'application/json'
-        }
+        apollo_url = APOLLO_SEARCHES['companies'][0]
+        
+        # Identical searches within the TTL are served from the cache without spending credits
+        cached, cache_info = get_cached_search('companies', apollo_payload, data.get('refresh'))
+        if cached is not None:
+            logging.info(f"Apollo companies search served from cache")
+            return jsonify({**cached, "cache": cache_info}), 200
         
         # Log the request for debugging
         logging.info(f"Apollo API Request URL: {apollo_url}")
         logging.info(f"Apollo API Request Payload: {apollo_payload}")
         
-        apollo_response = requests.post(apollo_url, json=apollo_payload, headers=headers, timeout=30)
+        apollo_response = apollo_client.post(apollo_url, apollo_api_key, apollo_payload)
         
         if apollo_response.status_code == 200:
             apollo_data = apollo_response.json()
@@ -872,12 +1174,12 @@ def apollo_company_search():
             # Add credit usage info to response
             credits_used = apollo_data.get('credits_used', 0)
             
-            return jsonify({
+            return jsonify(cache_search('companies', apollo_payload, {
                 "organizations": organizations,
                 "total_organizations": apollo_data.get('total_organizations', 0),
                 "pagination": pagination,
                 "credits_used": credits_used
-            }), 200
+            }, cache_info)), 200
         else:
             error_message = f"Apollo API error: {apollo_response.status_code}"
             try:
@@ -893,6 +1195,12 @@ def apollo_company_search():
                 "organizations": []
             }), 400
             
+    except ApolloQuotaExceeded as e:
+        return jsonify({
+            "error": str(e),
+            "retry_after": e.retry_after,
+            "organizations": []
+        }), 429
     except Exception as e:
         return jsonify({
             "error": f"Internal server error: {str(e)}",
@@ -1021,157 +1329,8 @@ def research_prospect():
         data = request.json
         logging.info(f"Research prospect request: {data}")
         
-        prospect_name = data.get('name')
-        prospect_email = data.get('email')
-        prospect_title = data.get('title')
-        company_name = data.get('company_name')
-        linkedin_url = data.get('linkedin_url')
-        
-        # Extract domain from email if available - this is the primary source
-        company_website = None
-        if prospect_email and '@' in prospect_email:
-            domain = prospect_email.split('@')[1].lower()
-            # Common personal email domains to skip
-            skip_domains = ['gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com', 'icloud.com', 
-                          'aol.com', 'mail.com', 'protonmail.com', 'yandex.com']
-            if domain not in skip_domains:
-                # Use the email domain as the company website
-                company_website = f"https://{domain}"
-                logging.info(f"Using email domain for company website: {company_website}")
-                # Also try www version if main domain fails
-                company_website_alt = f"https://www.{domain}"
-        
-        # Only override with provided website if it's actually provided and valid
-        if data.get('company_website') and data.get('company_website') != 'None':
-            company_website = data.get('company_website')
-        
-        logging.info(f"Research target - LinkedIn: {linkedin_url}, Company: {company_website}")
-        
-        # Collect scraped data
-        linkedin_data = ""
-        company_data = ""
-        
-        # Scrape LinkedIn if URL provided (Note: LinkedIn has anti-scraping measures)
-        if linkedin_url and linkedin_url != 'None':
-            try:
-                logging.info(f"Attempting to scrape LinkedIn: {linkedin_url}")
-                # Note: LinkedIn actively blocks scraping, so this might not work
-                linkedin_chunks = scrape_website(linkedin_url, max_depth=1, max_chunks=5)
-                linkedin_data = "\n".join(linkedin_chunks) if linkedin_chunks else ""
-                if not linkedin_data or len(linkedin_data) < 100:
-                    linkedin_data = "LinkedIn profile data not accessible due to platform restrictions. Using available information from Apollo data."
-            except Exception as e:
-                logging.error(f"Error scraping LinkedIn: {str(e)}")
-                linkedin_data = "LinkedIn profile not accessible due to platform restrictions. Using available information from Apollo data."
-        
-        # Scrape company website if available
-        if company_website and company_website != 'None':
-            try:
-                logging.info(f"Scraping company website: {company_website}")
-                company_chunks = scrape_website(company_website, max_depth=2, max_chunks=10)
-                company_data = "\n".join(company_chunks) if company_chunks else ""
-                
-                # If main domain fails, try with www
-                if (not company_data or len(company_data) < 100) and 'www.' not in company_website:
-                    company_website_alt = company_website.replace('https://', 'https://www.')
-                    logging.info(f"Retrying with www: {company_website_alt}")
-                    company_chunks = scrape_website(company_website_alt, max_depth=2, max_chunks=10)
-                    company_data = "\n".join(company_chunks) if company_chunks else company_data
-                    
-                if not company_data or len(company_data) < 100:
-                    company_data = f"Limited data available for {company_website}. Using domain-based inference."
-            except Exception as e:
-                logging.error(f"Error scraping company website {company_website}: {str(e)}")
-                company_data = f"Company website {company_website} could not be fully accessed. Using available information."
-        
-        # Generate research report using LLM
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Create comprehensive prompt for research report
-        research_prompt = f"""
-        Generate a comprehensive research report for a sales prospect based on the following information:
-        
-        PROSPECT INFORMATION:
-        Name: {prospect_name}
-        Title: {prospect_title}
-        Company: {company_name}
-        Email: {prospect_email}
-        Email Domain: {prospect_email.split('@')[1] if prospect_email and '@' in prospect_email else 'Unknown'}
-        LinkedIn: {linkedin_url if linkedin_url and linkedin_url != 'None' else 'Not provided'}
-        Company Website (from email): {company_website or 'Not identified'}
-        
-        IMPORTANT CONTEXT:
-        - If the email domain suggests a major company (e.g., ford.com = Ford Motor Company), use that as the primary company context
-        - The title "{prospect_title}" indicates their role and seniority level
-        - Focus on insights relevant to their specific role and industry
-        
-        LINKEDIN PROFILE DATA:
-        {linkedin_data[:2000] if linkedin_data else 'LinkedIn data not available - use role and company context for insights'}
-        
-        COMPANY WEBSITE DATA (from {company_website if company_website else 'domain'}):
-        {company_data[:3000] if company_data else 'Company website data limited - use domain and industry knowledge'}
-        
-        Please create a detailed research report with the following sections:
-        
-        1. EXECUTIVE SUMMARY
-        - Brief overview of the prospect and their company
-        - Key insights and opportunities
-        
-        2. PROFESSIONAL PROFILE
-        - Current role and responsibilities
-        - Career progression and achievements
-        - Areas of expertise
-        - Professional interests and focus areas
-        
-        3. COMPANY OVERVIEW
-        - Business description and industry
-        - Products/services offered
-        - Market position and competitive landscape
-        - Recent developments or news
-        
-        4. ENGAGEMENT STRATEGY
-        - Personalized talking points based on their background
-        - Potential pain points they might be facing
-        - Value propositions that would resonate
-        - Recommended outreach approach
-        - Best time and channel for contact
-        
-        5. KEY INSIGHTS
-        - Notable observations from the research
-        - Connection opportunities
-        - Risk factors or considerations
-        
-        Format the report in a clear, professional manner with bullet points where appropriate.
-        """
-        
         try:
-            response = client.chat.completions.create(
-                model="gpt-5-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert sales researcher creating detailed prospect intelligence reports."},
-                    {"role": "user", "content": research_prompt}
-                ],
-                max_completion_tokens=3000
-            )
-            
-            research_report = response.choices[0].message.content.strip()
-            
-            # Create structured report object
-            report_data = {
-                "prospect_info": {
-                    "name": prospect_name,
-                    "title": prospect_title,
-                    "email": prospect_email,
-                    "company": company_name,
-                    "linkedin_url": linkedin_url
-                },
-                "company_website": company_website,
-                "research_report": research_report,
-                "linkedin_scraped": bool(linkedin_data),
-                "website_scraped": bool(company_data),
-                "generated_at": datetime.utcnow().isoformat()
-            }
+            report_data = generate_research_report(data)
             
             return jsonify({
                 "success": True,
@@ -1194,6 +1353,44 @@ def research_prospect():
         }), 500
 
 
+@bp.route('/apollo/research-batch', methods=['POST', 'OPTIONS'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def research_prospects_batch():
+    """
+    Queue research for a list of prospects (saved prospects or Apollo people records).
+    Reports are saved to prospect_research as they complete; poll the returned status_url
+    for per-prospect progress, research ids and summaries.
+    """
+    
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        data = request.json
+        user_id = data.get('user_id')
+        prospects = data.get('prospects')
+        
+        if not user_id or not isinstance(prospects, list) or not prospects:
+            return jsonify({"error": "User ID and a list of prospects required"}), 400
+        if len(prospects) > RESEARCH_BATCH_MAX_PROSPECTS:
+            return jsonify({"error": f"At most {RESEARCH_BATCH_MAX_PROSPECTS} prospects per batch"}), 400
+        
+        job_id = job_queue.enqueue('research_prospects', {'user_id': user_id, 'prospects': prospects})
+        return jsonify({
+            "success": True,
+            "message": f"Researching {len(prospects)} prospects",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
+        
+    except Exception as e:
+        logging.error(f"Error queueing research batch: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Internal server error: {str(e)}"
+        }), 500
+
+
 @bp.route('/research/save', methods=['POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
 def save_research():
@@ -1210,19 +1407,7 @@ def save_research():
         if not user_id or not report:
             return jsonify({"error": "User ID and report data required"}), 400
         
-        # Extract key fields for database
-        save_data = {
-            'user_id': user_id,
-            'prospect_id': report.get('prospect_info', {}).get('email', ''),
-            'prospect_name': report.get('prospect_info', {}).get('name'),
-            'prospect_email': report.get('prospect_info', {}).get('email'),
-            'prospect_title': report.get('prospect_info', {}).get('title'),
-            'company_name': report.get('prospect_info', {}).get('company'),
-            'linkedin_url': report.get('prospect_info', {}).get('linkedin_url'),
-            'company_website': report.get('company_website'),
-            'research_report': report,
-            'research_summary': report.get('research_report', '')[:500]  # First 500 chars as summary
-        }
+        save_data = research_record(user_id, report)
         
         # Save to Supabase
         response = supabase.table('prospect_research').insert(save_data).execute()
@@ -1309,180 +1494,52 @@ def delete_research(research_id):
         }), 500
 
 
-# HubSpot Integration Functions
-def hubspot_request(url, payload=None, method='POST'):
-    """Make HubSpot API request using Personal Access Key with Bearer authentication"""
-    hubspot_api_key = os.environ.get('HUBSPOT_API_KEY')
-    if not hubspot_api_key:
-        return None, {'error': 'HubSpot API key not configured'}
-    
-    # Strip any whitespace or quotes that might have been added
-    original_key = hubspot_api_key
-    hubspot_api_key = hubspot_api_key.strip().strip('"').strip("'")
-    
-    # Debug key format
-    logging.info(f"HubSpot key first 10 chars: {hubspot_api_key[:10]}...")
-    logging.info(f"HubSpot key last 4 chars: ...{hubspot_api_key[-4:]}")
-    logging.info(f"HubSpot key length: {len(hubspot_api_key)}")
-    
-    # HubSpot Personal Access Keys can have different formats:
-    # - Older format: starts with 'pat-'
-    # - Newer format: starts with 'CiRu' or other prefixes (100+ chars)
-    # Both use Bearer authentication
-    
-    # Use Bearer authentication for all HubSpot API keys
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {hubspot_api_key}'
-    }
-    
-    if hubspot_api_key.startswith('pat-'):
-        logging.info("Using Bearer authentication with older Personal Access Key format")
-    elif hubspot_api_key.startswith('CiRu'):
-        logging.info("Using Bearer authentication with newer Personal Access Key format")
-    else:
-        logging.info("Using Bearer authentication with HubSpot API key")
-    
+def schedule_hubspot_index_sync():
+    """
+    Queue an index sync when one is due and none is already queued or running; the claim
+    makes sure only one worker queues it.
+    """
+    if hubspot_index is None:
+        return
     try:
-        logging.info(f"Making HubSpot request to: {url}")
-        logging.info(f"Authorization header being sent: Bearer {hubspot_api_key[:10]}...{hubspot_api_key[-4:]}")
-        
-        if method == 'POST':
-            response = requests.post(url, json=payload, headers=headers, timeout=15)
-        else:
-            response = requests.get(url, headers=headers, timeout=15)
-        
-        logging.info(f"HubSpot API response: {response.status_code}")
-        
-        if response.status_code == 200:
-            logging.info("HubSpot request successful")
-            return response, None
-        else:
-            error_text = response.text[:500]
-            logging.error(f"HubSpot API failed: {response.status_code} - {error_text}")
-            return None, {'error': f'HubSpot API error: {response.status_code} - {error_text}'}
-            
+        if job_queue.store.active_ids('sync_hubspot_index'):
+            return  # A slow sync outlasting the interval mustn't pile up more behind it
+        if hubspot_index.claim_sync():
+            job_queue.enqueue('sync_hubspot_index', {})
     except Exception as e:
-        logging.error(f"HubSpot request exception: {str(e)}")
-        return None, {'error': f'Request failed: {str(e)}'}
+        logging.error(f"Error scheduling HubSpot index sync: {str(e)}")
 
 
-def check_hubspot_contact_by_email(email):
-    """Check if a contact exists in HubSpot by email"""
+@bp.route('/hubspot/index/sync', methods=['POST'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def sync_hubspot_index_route():
+    """Queue a HubSpot index sync; pass {"full": true} to reload every contact and company."""
     try:
-        # HubSpot API endpoint to search for contacts  
-        url = "https://api.hubapi.com/crm/v3/objects/contacts/search"
-        
-        # Search for contact by email
-        search_payload = {
-            'filterGroups': [
-                {
-                    'filters': [
-                        {
-                            'propertyName': 'email',
-                            'operator': 'EQ',
-                            'value': email
-                        }
-                    ]
-                }
-            ],
-            'properties': ['email', 'firstname', 'lastname', 'jobtitle', 'company', 'createdate'],
-            'limit': 1
-        }
-        
-        response, error = hubspot_request(url, search_payload, 'POST')
-        
-        if error:
-            return {'exists': False, 'error': error.get('error')}
-        
-        if response and response.status_code == 200:
-            data = response.json()
-            results = data.get('results', [])
-            
-            if results:
-                contact = results[0]
-                properties = contact.get('properties', {})
-                return {
-                    'exists': True,
-                    'contact_id': contact.get('id'),
-                    'email': properties.get('email'),
-                    'first_name': properties.get('firstname'),
-                    'last_name': properties.get('lastname'),
-                    'job_title': properties.get('jobtitle'),
-                    'company': properties.get('company'),
-                    'created_date': properties.get('createdate'),
-                    'hubspot_url': f"https://app.hubspot.com/contacts/{contact.get('id')}"
-                }
-            else:
-                return {'exists': False}
-        else:
-            error_text = response.text if response else 'No response'
-            logging.error(f"HubSpot API error: {response.status_code if response else 'No status'} - {error_text}")
-            return {'exists': False, 'error': f'HubSpot API error: {response.status_code if response else "No response"}'}
-            
+        if hubspot_index is None:
+            return jsonify({"error": "HubSpot index is not enabled"}), 400
+        full = bool((request.get_json(silent=True) or {}).get('full'))
+        job_id = job_queue.enqueue('sync_hubspot_index', {'full': full})
+        return jsonify({
+            "message": "HubSpot index sync queued",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
     except Exception as e:
-        logging.error(f"Error checking HubSpot contact: {str(e)}")
-        return {'exists': False, 'error': str(e)}
+        logging.error(f"Error queueing HubSpot index sync: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
 
-def check_hubspot_company_by_domain(domain):
-    """Check if a company exists in HubSpot by domain"""
+@bp.route('/hubspot/index/stats', methods=['GET'])
+@cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
+def hubspot_index_stats():
+    """Report the HubSpot index's record counts, sync state and how many checks it answered."""
     try:
-        # HubSpot API endpoint to search for companies
-        url = "https://api.hubapi.com/crm/v3/objects/companies/search"
-        
-        # Clean domain (remove protocol, www, etc.)
-        clean_domain = domain.lower().replace('https://', '').replace('http://', '').replace('www.', '').split('/')[0]
-        
-        # Search for company by domain
-        search_payload = {
-            'filterGroups': [
-                {
-                    'filters': [
-                        {
-                            'propertyName': 'domain',
-                            'operator': 'EQ',
-                            'value': clean_domain
-                        }
-                    ]
-                }
-            ],
-            'properties': ['name', 'domain', 'industry', 'numberofemployees', 'createdate'],
-            'limit': 1
-        }
-        
-        response, error = hubspot_request(url, search_payload, 'POST')
-        
-        if error:
-            return {'exists': False, 'error': error.get('error')}
-        
-        if response and response.status_code == 200:
-            data = response.json()
-            results = data.get('results', [])
-            
-            if results:
-                company = results[0]
-                properties = company.get('properties', {})
-                return {
-                    'exists': True,
-                    'company_id': company.get('id'),
-                    'name': properties.get('name'),
-                    'domain': properties.get('domain'),
-                    'industry': properties.get('industry'),
-                    'employee_count': properties.get('numberofemployees'),
-                    'created_date': properties.get('createdate'),
-                    'hubspot_url': f"https://app.hubspot.com/contacts/{company.get('id')}/company"
-                }
-            else:
-                return {'exists': False}
-        else:
-            error_text = response.text if response else 'No response'
-            logging.error(f"HubSpot API error: {response.status_code if response else 'No status'} - {error_text}")
-            return {'exists': False, 'error': f'HubSpot API error: {response.status_code if response else "No response"}'}
-            
+        if hubspot_index is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify(hubspot_index.stats()), 200
     except Exception as e:
-        logging.error(f"Error checking HubSpot company: {str(e)}")
-        return {'exists': False, 'error': str(e)}
+        logging.error(f"Error reading HubSpot index stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
 
 @bp.route('/hubspot/check-prospect', methods=['POST', 'OPTIONS'])
@@ -1501,6 +1558,8 @@ def check_hubspot_prospect():
         if not prospect_type or not prospect_data:
             return jsonify({"error": "Type and data required"}), 400
         
+        schedule_hubspot_index_sync()
+        
         if prospect_type == 'person':
             email = prospect_data.get('email')
             if not email or email == 'email_not_unlocked@domain.com':
@@ -1547,7 +1606,7 @@ def check_hubspot_prospect():
 @bp.route('/hubspot/batch-check', methods=['POST', 'OPTIONS'])
 @cross_origin(origins='https://projectx-frontend-3owg.onrender.com')
 def batch_check_hubspot():
-    """Check multiple prospects in HubSpot (batch operation)"""
+    """Check multiple prospects in HubSpot with batched, concurrent lookups"""
     
     if request.method == 'OPTIONS':
         return '', 200
@@ -1559,40 +1618,8 @@ def batch_check_hubspot():
         if not prospects:
             return jsonify({"error": "No prospects provided"}), 400
         
-        results = {}
-        
-        for prospect in prospects:
-            prospect_id = prospect.get('id')
-            prospect_type = prospect.get('type', 'person')
-            prospect_data = prospect.get('data')
-            
-            if not prospect_id or not prospect_data:
-                continue
-            
-            try:
-                if prospect_type == 'person':
-                    email = prospect_data.get('email')
-                    if email and email != 'email_not_unlocked@domain.com':
-                        result = check_hubspot_contact_by_email(email)
-                        results[prospect_id] = result
-                    else:
-                        results[prospect_id] = {'exists': False, 'error': 'No valid email'}
-                        
-                elif prospect_type == 'company':
-                    domain = prospect_data.get('website_url') or prospect_data.get('primary_domain')
-                    if domain:
-                        result = check_hubspot_company_by_domain(domain)
-                        results[prospect_id] = result
-                    else:
-                        results[prospect_id] = {'exists': False, 'error': 'No domain available'}
-                        
-                # Add small delay to avoid rate limiting
-                import time
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logging.error(f"Error checking prospect {prospect_id}: {str(e)}")
-                results[prospect_id] = {'exists': False, 'error': str(e)}
+        schedule_hubspot_index_sync()
+        results = batch_check_prospects(prospects)
         
         return jsonify({
             'success': True,
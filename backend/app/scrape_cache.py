@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+from app.scraping import scrape_website
+from app.rate_limit import TokenBucket
+
+# Scrape cache configuration
+SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() == "true"
+SCRAPE_CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", "scrape_cache.db")
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "86400"))  # Seconds a scraped site is reused
+SCRAPE_CACHE_EMPTY_TTL = int(os.getenv("SCRAPE_CACHE_EMPTY_TTL", "900"))  # Blocked or empty sites are retried sooner
+SCRAPE_MIN_USEFUL_CHARS = 100  # Less text than this is a blocked or empty page, not content
+SCRAPE_FETCH_WORKERS = int(os.getenv("SCRAPE_FETCH_WORKERS", "8"))  # Scrapes in flight at once per worker
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "25"))  # Seconds research waits for all of its scrapes
+LINKEDIN_SCRAPES_PER_MINUTE = int(os.getenv("LINKEDIN_SCRAPES_PER_MINUTE", "10"))  # LinkedIn blocks bursts quickly
+
+
+def is_useful(chunks):
+    """Whether scraped chunks hold real content rather than a blocked, login or empty page."""
+    return len("\n".join(chunks)) >= SCRAPE_MIN_USEFUL_CHARS
+
+
+class ScrapeCache:
+    """
+    Scraped page chunks keyed by site and crawl limits, shared by all gunicorn workers
+    through SQLite. Concurrent misses for the same key in one worker share a single fetch.
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, ttl=SCRAPE_CACHE_TTL, empty_ttl=SCRAPE_CACHE_EMPTY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.in_flight = {}
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scrapes (
+                    key TEXT PRIMARY KEY,
+                    chunks TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Return the cached chunks for `key`, or None when missing or expired."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT chunks, fetched_at FROM scrapes WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        chunks = json.loads(row[0])
+        ttl = self.ttl if is_useful(chunks) else self.empty_ttl
+        return chunks if time.time() - row[1] <= ttl else None
+
+    def put(self, key, chunks):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO scrapes (key, chunks, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(chunks), now)
+            )
+            conn.execute("DELETE FROM scrapes WHERE fetched_at < ?", (now - max(self.ttl, self.empty_ttl),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_or_fetch(self, key, fetch):
+        """Return cached chunks for `key`, or call `fetch()` once however many callers miss at the same time."""
+        chunks = self.get(key)
+        if chunks is not None:
+            with self._lock:
+                self.hits += 1
+            return chunks
+
+        with self._lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            chunks = fetch()
+            self.put(key, chunks)
+            future.set_result(chunks)
+            return chunks
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self.in_flight[key]
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM scrapes").fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": True,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+            }
+
+
+scrape_cache = None
+if SCRAPE_CACHE_ENABLED:
+    try:
+        scrape_cache = ScrapeCache()
+    except Exception as e:
+        logging.error(f"Error initializing scrape cache, continuing without it: {str(e)}")
+
+# Shared by every request so one slow site can't hold more than its share of threads
+fetch_pool = ThreadPoolExecutor(max_workers=SCRAPE_FETCH_WORKERS)
+
+# Per-provider limits on fresh scrapes (cache hits are free), matched on the host's registered domain
+host_limits = {
+    'linkedin.com': TokenBucket(LINKEDIN_SCRAPES_PER_MINUTE / 60.0, max(1, LINKEDIN_SCRAPES_PER_MINUTE // 6))
+}
+
+
+def _host_limit(url):
+    host = urlparse(url if '://' in url else f"https://{url}").netloc.lower()
+    for domain, bucket in host_limits.items():
+        if host == domain or host.endswith('.' + domain):
+            return bucket
+    return None
+
+
+def scrape_key(url, max_depth, max_chunks):
+    """Cache key for a crawl: host and path without scheme or trailing slash, plus the crawl limits."""
+    parsed = urlparse(url if '://' in url else f"https://{url}")
+    return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}|{max_depth}|{max_chunks}"
+
+
+def is_cached(url, max_depth=2, max_chunks=10):
+    return scrape_cache is not None and scrape_cache.get(scrape_key(url, max_depth, max_chunks)) is not None
+
+
+def cached_scrape(url, max_depth=2, max_chunks=10, paced=False):
+    """
+    scrape_website through the scrape cache, paced by the host's rate limit on a miss.
+    Pass `paced` when the caller has already taken the host's rate-limit token.
+    """
+    def fetch():
+        bucket = None if paced else _host_limit(url)
+        if bucket is not None:
+            bucket.acquire()
+        return scrape_website(url, max_depth=max_depth, max_chunks=max_chunks) or []
+
+    if scrape_cache is None:
+        return fetch()
+    return scrape_cache.get_or_fetch(scrape_key(url, max_depth, max_chunks), fetch)
+
+
+def scrape_all(targets, deadline=SCRAPE_DEADLINE):
+    """
+    Scrape {name: (url, max_depth, max_chunks)} targets in parallel and wait at most
+    `deadline` seconds for all of them. Returns {name: chunks}, with None for targets that
+    failed or missed the deadline. Late scrapes keep running and still fill the cache.
+    Uncached targets on rate-limited hosts wait for their token in the calling thread, never
+    in the shared pool, and are skipped if none frees up before the deadline.
+    """
+    started = time.monotonic()
+    futures = {}
+    paced = {}
+    for name, target in targets.items():
+        bucket = _host_limit(target[0])
+        if bucket is None or is_cached(*target):
+            futures[name] = fetch_pool.submit(cached_scrape, *target)
+        else:
+            paced[name] = bucket
+    for name, bucket in paced.items():
+        if bucket.acquire(timeout=max(0.0, deadline - (time.monotonic() - started))):
+            futures[name] = fetch_pool.submit(cached_scrape, *targets[name], paced=True)
+    done, _ = wait(futures.values(), timeout=max(0.0, deadline - (time.monotonic() - started)))
+
+    results = {}
+    for name, target in targets.items():
+        url = target[0]
+        future = futures.get(name)
+        if future is None:
+            logging.warning(f"Skipped scraping {url}: its host's rate limit had no slot before the deadline")
+            results[name] = None
+        elif future not in done:
+            logging.warning(f"Scraping {url} missed the {deadline}s deadline")
+            results[name] = None
+        elif future.exception() is not None:
+            logging.error(f"Error scraping {url}: {str(future.exception())}")
+            results[name] = None
+        else:
+            results[name] = future.result()
+    return results
@@ -1,12 +1,12 @@
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
+from app.http_client import create_openai_client
 
 # Load environment variables from .env
 load_dotenv()
 
 # Initialize OpenAI client with API key from environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = create_openai_client()
 
 def summarize_text(text, max_length=500):
     """
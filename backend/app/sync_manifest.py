@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+
+# Manifest of bucket objects already ingested by BackgroundIngestion
+SYNC_MANIFEST_PATH = os.getenv("SYNC_MANIFEST_PATH", "sync_manifest.db")
+
+
+class SyncManifest:
+    """
+    Persistent record of ingested bucket objects: what version of each object was processed
+    and which vectors and summary it produced.
+    """
+
+    @staticmethod
+    def source_id(bucket, name):
+        """
+        Source id of a bucket object, shared by /add-source and the bucket sync. It prefixes
+        the object's vector ids, so it includes the bucket: the same name can be in several.
+        """
+        return f"{bucket}/{name}"
+
+    def __init__(self, path=SYNC_MANIFEST_PATH):
+        self.path = path
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS objects (
+                    bucket TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    last_modified TEXT,
+                    etag TEXT,
+                    size INTEGER,
+                    content_hash TEXT,
+                    vector_ids TEXT NOT NULL DEFAULT '[]',
+                    summary_id TEXT,
+                    synced_at REAL NOT NULL,
+                    PRIMARY KEY (bucket, name)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at REAL NOT NULL,
+                    finished_at REAL NOT NULL,
+                    stats TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_entry(row):
+        entry = dict(row)
+        entry['vector_ids'] = json.loads(entry['vector_ids'])
+        return entry
+
+    def entries(self, bucket):
+        """Return {name: entry} for every object recorded for a bucket."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM objects WHERE bucket = ?", (bucket,)).fetchall()
+        finally:
+            conn.close()
+        return {row['name']: self._row_to_entry(row) for row in rows}
+
+    def buckets_with(self, name):
+        """Buckets whose recorded objects include `name`."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT bucket FROM objects WHERE name = ?", (name,)).fetchall()
+        finally:
+            conn.close()
+        return [row['bucket'] for row in rows]
+
+    def record(self, bucket, name, last_modified=None, etag=None, size=None, content_hash=None,
+               vector_ids=None, summary_id=None):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO objects
+                    (bucket, name, last_modified, etag, size, content_hash, vector_ids, summary_id, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (bucket, name, last_modified, etag, size, content_hash,
+                  json.dumps(vector_ids or []), summary_id, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def remove(self, bucket, name):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM objects WHERE bucket = ? AND name = ?", (bucket, name))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def record_run(self, started_at, stats):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO sync_runs (started_at, finished_at, stats) VALUES (?, ?, ?)",
+                (started_at, time.time(), json.dumps(stats))
+            )
+            # Only recent history is useful
+            conn.execute("DELETE FROM sync_runs WHERE id NOT IN (SELECT id FROM sync_runs ORDER BY id DESC LIMIT 100)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def recent_runs(self, limit=10):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM sync_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [{**dict(row), 'stats': json.loads(row['stats'])} for row in rows]
@@ -1,7 +1,6 @@
 import os
 import logging
 from googleapiclient.discovery import build
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from dotenv import load_dotenv
@@ -42,7 +41,6 @@ def search_and_scrape(query, num_results=2):  # Reduced from 3 to 2
         ).execute()
 
         web_contents = []
-        session = requests.Session()
 
         for item in result.get('items', []):
             url = item.get('link')
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark the QA tool's word-level diff engine against difflib.SequenceMatcher.
+
+Generates a synthetic document, applies scattered word edits and typo fixes like an
+editing pass would, then times both engines on QA-sized chunks and on whole documents.
+Reports seconds per MB and how many changes each engine hands to the frontend.
+"""
+
+import sys
+import time
+import random
+import difflib
+import argparse
+
+from app.diffing import diff_opcodes
+
+CHUNK_CHARS = 6000  # About one 1500-token QA chunk
+
+
+def make_document(size, rng):
+    """Prose-like text from a Zipf-ish vocabulary, with sentences and paragraphs."""
+    vocabulary = [''.join(rng.choice('etaoinshrdlucmfwyp') for _ in range(rng.randint(2, 10)))
+                  for _ in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    words = []
+    length = 0
+    while length < size:
+        sentence = rng.choices(vocabulary, weights, k=rng.randint(8, 25))
+        sentence[0] = sentence[0].capitalize()
+        text = ' '.join(sentence) + ('.\n\n' if rng.random() < 0.2 else '. ')
+        words.append(text)
+        length += len(text)
+    return ''.join(words)[:size]
+
+
+def revise(text, rng, word_rate, typo_rate):
+    """Replace a fraction of words and fix single-character 'typos', like an editing pass."""
+    words = text.split(' ')
+    for i, word in enumerate(words):
+        roll = rng.random()
+        if roll < word_rate:
+            words[i] = rng.choice(['improved', 'clearer', 'concise', 'additionally', 'however,'])
+        elif roll < word_rate + typo_rate and len(word) > 3:
+            position = rng.randrange(len(word))
+            words[i] = word[:position] + rng.choice('aeiou') + word[position + 1:]
+    return ' '.join(words)
+
+
+def changes(opcodes):
+    return sum(1 for opcode in opcodes if opcode[0] != 'equal')
+
+
+def run(label, pairs, engine):
+    start = time.perf_counter()
+    total_changes = sum(changes(engine(original, revised)) for original, revised in pairs)
+    elapsed = time.perf_counter() - start
+    megabytes = sum(len(original) for original, _ in pairs) / 1_000_000
+    print(f"  {label:<18} {elapsed:8.3f}s  {elapsed / megabytes:8.2f}s/MB  {total_changes:7d} changes")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1_000_000, help='Document size in characters')
+    parser.add_argument('--word-rate', type=float, default=0.03, help='Fraction of words rewritten')
+    parser.add_argument('--typo-rate', type=float, default=0.02, help='Fraction of words with a character fixed')
+    parser.add_argument('--whole-size', type=int, default=200_000,
+                        help='Largest whole document given to SequenceMatcher (it slows down sharply)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    original = make_document(args.size, rng)
+    revised = revise(original, rng, args.word_rate, args.typo_rate)
+    print(f"📄 {len(original) / 1_000_000:.2f}MB document, {args.word_rate:.0%} words rewritten, "
+          f"{args.typo_rate:.0%} typos fixed\n")
+
+    sequence_matcher = lambda a, b: difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+    # The QA pipeline diffs each chunk against its revision
+    chunk_pairs = []
+    for start in range(0, len(original), CHUNK_CHARS):
+        chunk = original[start:start + CHUNK_CHARS]
+        chunk_pairs.append((chunk, revise(chunk, rng, args.word_rate, args.typo_rate)))
+    print(f"Per chunk ({len(chunk_pairs)} chunks of {CHUNK_CHARS} chars):")
+    char_time = run("SequenceMatcher", chunk_pairs, sequence_matcher)
+    word_time = run("diff_opcodes", chunk_pairs, diff_opcodes)
+    print(f"  🚀 Speedup: {char_time / word_time:.1f}x\n")
+
+    # get_relative_changes diffs whole documents
+    whole = [(original[:args.whole_size], revised[:args.whole_size])]
+    print(f"Whole document ({args.whole_size / 1_000_000:.2f}MB prefix):")
+    char_time = run("SequenceMatcher", whole, sequence_matcher)
+    word_time = run("diff_opcodes", whole, diff_opcodes)
+    print(f"  🚀 Speedup: {char_time / word_time:.1f}x\n")
+
+    print(f"Whole document ({len(original) / 1_000_000:.2f}MB):")
+    run("diff_opcodes", [(original, revised)], diff_opcodes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batched embedding pipeline against a local fake embeddings server.
+
+Compares the old one-request-per-chunk behaviour with get_embeddings().
+The fake server sleeps a fixed latency per request plus a small per-input cost,
+so the numbers reflect round trips rather than real model time.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSION = 1536
+
+
+def make_handler(request_latency, per_input_latency):
+    class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+            time.sleep(request_latency + per_input_latency * len(inputs))
+
+            payload = json.dumps({
+                'object': 'list',
+                'model': body.get('model'),
+                'data': [
+                    {'object': 'embedding', 'index': i, 'embedding': [0.001] * EMBEDDING_DIMENSION}
+                    for i in range(len(inputs))
+                ],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+            }).encode()
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeEmbeddingsHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=300, help='Number of chunks to embed')
+    parser.add_argument('--latency', type=float, default=0.15, help='Fake server latency per request (s)')
+    parser.add_argument('--per-input', type=float, default=0.002, help='Fake server latency per input (s)')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency, args.per_input))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Point the OpenAI client at the fake server before the app modules create it
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    # Both runs embed the same chunks, so the embedding cache would hide the difference
+    os.environ['EMBEDDING_CACHE_ENABLED'] = 'false'
+
+    from app.embeddings import get_embedding, get_embeddings, tokenizer
+
+    # Roughly 1500-token chunks, matching chunk_text's output
+    sample = "LRMG leadership development programme quarterly review. " * 170
+    chunks = [f"{i} {sample}" for i in range(args.chunks)]
+    print(f"📦 {len(chunks)} chunks of ~{len(tokenizer.encode(chunks[0]))} tokens\n")
+
+    start = time.perf_counter()
+    serial = [get_embedding(chunk) for chunk in chunks]
+    serial_time = time.perf_counter() - start
+    print(f"Serial get_embedding:  {serial_time:7.2f}s")
+
+    start = time.perf_counter()
+    batched = get_embeddings(chunks)
+    batched_time = time.perf_counter() - start
+    print(f"Batched get_embeddings: {batched_time:6.2f}s")
+
+    server.shutdown()
+
+    if any(e is None for e in serial + batched):
+        print("❌ Some embeddings failed")
+        return 1
+
+    print(f"\n🚀 Speedup: {serial_time / batched_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 # gunicorn_config.py
+import os
+
 bind = "0.0.0.0:8000"
-workers = 2
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))  # app.hubspot splits HubSpot's search limit across these
 threads = 2
 worker_class = 'gthread'
 worker_connections = 1000
@@ -4,7 +4,7 @@ from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from dotenv import load_dotenv
-from supabase import create_client
+from app.http_client import create_supabase_client
 import os
 
 # Load environment variables
@@ -26,7 +26,7 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 300  # 5 minutes
 # Initialize Supabase client
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_SECRET")
-app.supabase = create_client(supabase_url, supabase_key)
+app.supabase = create_supabase_client(supabase_url, supabase_key)
 
 # Configure CORS - Allow both production and local development
 CORS(app, resources={
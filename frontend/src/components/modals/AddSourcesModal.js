@@ -38,6 +38,10 @@ axios.defaults.baseURL = 'https://projectx-53gn.onrender.com';
 const MAX_CONCURRENT_UPLOADS = 10;
 const MAX_FILE_SIZE = 100 * 1024 * 1024; // 100MB per file
 const ALLOWED_FILE_TYPES = '.pdf,.csv,.docx,.eml';
+const JOB_POLL_INTERVAL = 2000; // ms between ingestion job status checks
+const JOB_POLL_TIMEOUT = 30 * 60 * 1000; // Stop waiting on a job after 30 minutes
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
 
 export default function AddSourcesModal({ onSourceAdded, onClose }) {
   const { session } = useContext(AuthContext);
@@ -103,6 +107,27 @@ export default function AddSourcesModal({ onSourceAdded, onClose }) {
     return results;
   };
 
+  // /add-source only queues the source; poll its job until ingestion finishes
+  const waitForJob = async (jobId, index) => {
+    const startedAt = Date.now();
+    while (Date.now() - startedAt < JOB_POLL_TIMEOUT) {
+      const { data: job } = await axios.get(`/jobs/${jobId}`, {
+        headers: {
+          'Authorization': `Bearer ${session?.access_token}`,
+        }
+      });
+      if (job.status === 'completed') {
+        return job.result;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed');
+      }
+      setUploadProgress(prev => ({ ...prev, [index]: job.status === 'running' ? 75 : 50 }));
+      await sleep(JOB_POLL_INTERVAL);
+    }
+    throw new Error('Timed out waiting for processing to finish');
+  };
+
   // Upload handlers
   const uploadFile = async (file, index) => {
     const formData = new FormData();
@@ -119,13 +144,16 @@ export default function AddSourcesModal({ onSourceAdded, onClose }) {
           'Content-Type': 'multipart/form-data',
         },
         onUploadProgress: (progressEvent) => {
-          const percentCompleted = Math.round((progressEvent.loaded * 100) / progressEvent.total);
+          // The upload is the first half; processing the file is the rest
+          const percentCompleted = Math.round((progressEvent.loaded * 50) / progressEvent.total);
           setUploadProgress(prev => ({ ...prev, [index]: percentCompleted }));
         }
       });
 
+      const result = await waitForJob(response.data.job_id, index);
       setUploadStatus(prev => ({ ...prev, [index]: 'success' }));
-      return response.data;
+      setUploadProgress(prev => ({ ...prev, [index]: 100 }));
+      return result;
     } catch (error) {
       setUploadStatus(prev => ({ ...prev, [index]: 'error' }));
       throw error;
@@ -149,9 +177,10 @@ export default function AddSourcesModal({ onSourceAdded, onClose }) {
         }
       });
 
+      const result = await waitForJob(response.data.job_id, index);
       setUploadStatus(prev => ({ ...prev, [index]: 'success' }));
       setUploadProgress(prev => ({ ...prev, [index]: 100 }));
-      return response.data;
+      return result;
     } catch (error) {
       setUploadStatus(prev => ({ ...prev, [index]: 'error' }));
       throw error;
@@ -203,7 +232,11 @@ export default function AddSourcesModal({ onSourceAdded, onClose }) {
     }
     
     if (failureCount > 0) {
-      setError(`${failureCount} item(s) failed to process. Please check the logs and try again.`);
+      const reasons = [...new Set(results
+        .filter(r => r.status === 'rejected')
+        .map(r => r.reason?.response?.data?.error || r.reason?.message)
+        .filter(Boolean))];
+      setError(`${failureCount} item(s) failed to process${reasons.length ? `: ${reasons.join('; ')}` : ''}. Please try again.`);
     }
   };
 